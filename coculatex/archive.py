@@ -0,0 +1,267 @@
+"""
+Module contains the writers of the project archives.
+
+The rendered files and the theme assets are streamed straight into
+the zip or the gzipped tar archive. The gzipped tar is written as
+the concatenation of the gzip members (one member per file), which is
+the valid gzip stream, therefore the compressed members of the unchanged
+theme assets are reused from `cache.ArchiveMemberCache`.
+"""
+import abc
+import gzip
+import logging
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from coculatex import metrics
+
+
+LOG = logging.getLogger(__name__)
+
+_COMPRESS_LEVEL = 9
+
+
+class _Archive(abc.ABC):
+    """
+    The base writer of the archive.
+
+    The metric `BYTES_WRITTEN` counts the uncompressed bytes
+    of the files added to the archive.
+    """
+
+    def __init__(self, fileobj):
+        """Init the archive written to the file object `fileobj`."""
+        self.fileobj = fileobj
+
+    @abc.abstractmethod
+    def add_bytes(self, name, data, mode=0o644):
+        """Add the file `name` with `bytes` of `data`."""
+
+    @abc.abstractmethod
+    def add_file(self, path, name):
+        """Add the regular file `path` as `name`."""
+
+    @abc.abstractmethod
+    def add_directory(self, path, name):
+        """Add the entry of the directory `path` as `name`."""
+
+    def add_path(self, path, name):
+        """Add the file or the directory `path` recursively as `name`."""
+        if not os.path.isdir(path):
+            self.add_file(path, name)
+            return
+        self.add_directory(path, name)
+        for child in sorted(os.listdir(path)):
+            self.add_path(os.path.join(path, child), name + '/' + child)
+
+    def close(self):
+        """Finish the archive."""
+
+    def __enter__(self):
+        """Enter the context of the archive."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Finish the archive."""
+        self.close()
+
+
+class ZipArchive(_Archive):
+    """
+    The writer of the zip archive.
+
+    The members are compressed by `zipfile`; it cannot store
+    the precompressed data, therefore the members are not reused.
+    """
+
+    def __init__(self, fileobj):
+        """Init the archive written to the file object `fileobj`."""
+        super().__init__(fileobj)
+        self.zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED,
+                                   compresslevel=_COMPRESS_LEVEL)
+
+    def add_bytes(self, name, data, mode=0o644):
+        """Add the file `name` with `bytes` of `data`."""
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = (0o100000 | mode) << 16
+        self.zip.writestr(info, data)
+        metrics.BYTES_WRITTEN.inc(len(data))
+
+    def add_file(self, path, name):
+        """Add the regular file `path` as `name`."""
+        self.zip.write(path, name)
+        metrics.FILES_COPIED.inc()
+        metrics.BYTES_WRITTEN.inc(os.path.getsize(path))
+
+    def add_directory(self, path, name):
+        """Add the entry of the directory `path` as `name`."""
+        self.zip.write(path, name)
+
+    def close(self):
+        """Write the central directory."""
+        self.zip.close()
+
+
+class TarGzArchive(_Archive):
+    """
+    The writer of the gzipped tar archive.
+
+    Every tar member (the header, the data and the padding) is written
+    as the separate gzip member, the compressed members of the files
+    are taken from `member_cache` if it is passed.
+    """
+
+    def __init__(self, fileobj, member_cache=None):
+        """Init the archive written to the file object `fileobj`."""
+        super().__init__(fileobj)
+        self.member_cache = member_cache
+        self.offset = 0
+
+    @staticmethod
+    def _header(info):
+        """Return `bytes` of the tar header of `info`."""
+        return info.tobuf(tarfile.GNU_FORMAT, 'utf-8', 'surrogateescape')
+
+    @staticmethod
+    def _padding(size):
+        """Return the padding of the data of `size` bytes to the block."""
+        return b'\0' * (-size % tarfile.BLOCKSIZE)
+
+    def _write(self, member, size):
+        """Write the compressed `member` of `size` uncompressed bytes."""
+        self.fileobj.write(member)
+        self.offset += size
+
+    def add_bytes(self, name, data, mode=0o644):
+        """Add the file `name` with `bytes` of `data`."""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = mode
+        raw = self._header(info) + data + self._padding(len(data))
+        self._write(gzip.compress(raw, _COMPRESS_LEVEL, mtime=0), len(raw))
+        metrics.BYTES_WRITTEN.inc(len(data))
+
+    def add_file(self, path, name):
+        """Add the regular file `path` as `name`."""
+        stat = os.stat(path)
+        info = tarfile.TarInfo(name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = stat.st_mode & 0o7777
+        header = self._header(info)
+        size = len(header) + info.size + len(self._padding(info.size))
+        key = None
+        if self.member_cache is not None:
+            key = self.member_cache.make_key(path, header)
+            member = self.member_cache.get_bytes(key)
+            metrics.CACHE_REQUESTS.inc(
+                cache='archive', result='miss' if member is None else 'hit')
+            if member is not None:
+                self._write(member, size)
+                metrics.FILES_COPIED.inc()
+                metrics.BYTES_WRITTEN.inc(info.size)
+                return
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) != info.size:
+            LOG.debug('The file %s is changed while it is read', path)
+            info.size = len(data)
+            header = self._header(info)
+            size = len(header) + info.size + len(self._padding(info.size))
+            key = None
+        member = gzip.compress(header + data + self._padding(len(data)),
+                               _COMPRESS_LEVEL, mtime=0)
+        if key is not None:
+            self.member_cache.put_bytes(key, member)
+        self._write(member, size)
+        metrics.FILES_COPIED.inc()
+        metrics.BYTES_WRITTEN.inc(info.size)
+
+    def add_directory(self, path, name):
+        """Add the entry of the directory `path` as `name`."""
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.DIRTYPE
+        info.mtime = int(os.path.getmtime(path))
+        info.mode = 0o755
+        header = self._header(info)
+        self._write(gzip.compress(header, _COMPRESS_LEVEL, mtime=0),
+                    len(header))
+
+    def close(self):
+        """Write the end of the archive padded to the record."""
+        end = 2 * tarfile.BLOCKSIZE
+        end += -(self.offset + end) % tarfile.RECORDSIZE
+        self._write(gzip.compress(b'\0' * end, _COMPRESS_LEVEL, mtime=0),
+                    end)
+
+
+_FORMATS = (('.zip', ZipArchive),
+            ('.tar.gz', TarGzArchive),
+            ('.tgz', TarGzArchive))
+
+
+class ArchiveFile:
+    """
+    The archive written to the path.
+
+    The archive is written to the temporary file which replaces
+    the path when the archive is finished successfully.
+    The path `-` is stdout, the gzipped tar is written to it.
+    """
+
+    def __init__(self, path, member_cache=None):
+        """Init the archive of the path."""
+        self.path = path
+        self.member_cache = member_cache
+        self.temp_path = None
+        self.file = None
+        self.archive = None
+
+    def __enter__(self):
+        """Open the archive."""
+        if self.path == '-':
+            self.archive = TarGzArchive(sys.stdout.buffer, self.member_cache)
+            return self.archive
+        for extension, archive_class in _FORMATS:
+            if self.path.lower().endswith(extension):
+                break
+        else:
+            raise ValueError('The format of the archive {} is unknown, '
+                             'the known extensions: {}'.format(
+                                 self.path, ', '.join(
+                                     extension for extension, _ in _FORMATS)))
+        descriptor, self.temp_path = tempfile.mkstemp(
+            prefix='.{}.'.format(os.path.basename(self.path)),
+            dir=os.path.dirname(os.path.abspath(self.path)))
+        self.file = os.fdopen(descriptor, 'wb')
+        if archive_class is TarGzArchive:
+            self.archive = TarGzArchive(self.file, self.member_cache)
+        else:
+            self.archive = archive_class(self.file)
+        return self.archive
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Finish the archive or discard it on the error."""
+        success = exc_type is None
+        try:
+            if success:
+                self.archive.close()
+        except BaseException:
+            success = False
+            raise
+        finally:
+            if self.file is None:
+                sys.stdout.buffer.flush()
+            else:
+                self.file.close()
+                if success:
+                    os.chmod(self.temp_path, 0o644)
+                    os.replace(self.temp_path, self.path)
+                    LOG.debug('The archive %s is written', self.path)
+                else:
+                    os.unlink(self.temp_path)
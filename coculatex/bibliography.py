@@ -0,0 +1,228 @@
+"""
+Module contains the extraction of the cited bibliography entries.
+
+The bibliography file is indexed once (the index is cached by
+the path, the mtime and the size of the file), the sources
+of the project are scanned for the citation keys and only the cited
+entries (with their crossrefs) are written to the project.
+Two formats are supported: BibTeX (`@article{key, ...}`) and
+the lists of `\\bibitem{key}` (`\\RBibitem{key}`) used by amsbib.
+"""
+import json
+import logging
+import os
+import re
+from coculatex import (
+    cache,
+    files)
+
+
+LOG = logging.getLogger(__name__)
+
+_CITE_RE = re.compile(
+    r'\\[a-zA-Z]*cite[a-zA-Z]*\*?\s*(?:\[[^\]]*\]\s*){0,2}\{([^}]*)\}')
+
+_COMMENT_RE = re.compile(r'(?<!\\)%.*')
+
+_BIBTEX_ENTRY_RE = re.compile(rb'@\s*([a-zA-Z]+)\s*([{(])')
+
+_BIBTEX_KEY_RE = re.compile(rb'\s*([^,\s{}()]+)\s*,')
+
+_CROSSREF_RE = re.compile(rb'crossref\s*=\s*[{"]\s*([^}"\s]+)\s*[}"]',
+                          re.IGNORECASE)
+
+_BIBITEM_RE = re.compile(
+    rb'^[ \t]*\\(?:RBibitem|bibitem)\s*(?:\[[^\]]*\]\s*)?\{([^}]+)\}',
+    re.MULTILINE)
+
+_END_BIBITEMS_RE = re.compile(rb'^[ \t]*\\end\s*\{thebibliography\}',
+                              re.MULTILINE)
+
+_KEEP_ENTRY_TYPES = (b'string', b'preamble')
+
+# the name of the parser of the cached indexes, it is changed with
+# the format of the index
+_INDEX_PARSER = 'bibliography-2'
+
+
+def find_citations(paths, texts=()):
+    """
+    Find the citation keys in the LaTeX files `paths` and `texts`.
+
+    `texts` are the LaTeX strings which are not written to the files.
+    Return `set` of the keys or None if all the entries are cited
+    (`\\nocite{*}`).
+    """
+    def lines():
+        """Iterate over the lines of the files."""
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8',
+                          errors='replace') as file:
+                    yield from file
+            except OSError as error:
+                LOG.debug('Cannot scan the file %s for citations: %s',
+                          path, error)
+        for text in texts:
+            yield from text.splitlines()
+    return find_text_citations(lines())
+
+
+def find_text_citations(lines):
+    """
+    Find the citation keys in the iterable of the LaTeX lines.
+
+    Return `set` of the keys or None if all the entries are cited.
+    """
+    keys = set()
+    for line in lines:
+        line = _COMMENT_RE.sub('', line)
+        for match in _CITE_RE.finditer(line):
+            for key in match.group(1).split(','):
+                key = key.strip()
+                if key == '*':
+                    LOG.debug('All the entries are cited')
+                    return None
+                if key:
+                    keys.add(key)
+    LOG.debug('The citation keys: %s', keys)
+    return keys
+
+
+def _closing_position(data, start, opening):
+    """Return the position after the bracket closing the `opening` one."""
+    closing = b'}' if opening == b'{' else b')'
+    depth = 1
+    position = start
+    while position < len(data):
+        char = data[position:position + 1]
+        if char == b'{' or char == opening:
+            depth += 1
+        elif char == b'}' or char == closing:
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return len(data)
+
+
+def make_index(path):
+    """
+    Index the bibliography file `path`.
+
+    Return `dict` with the format of the file, the list of the entries
+    (key, start, end, crossref) and the list of the spans (start, end)
+    which are always kept (`@string`, `@preamble`, the header and
+    the trailer of the `\\bibitem` list). The last `\\bibitem` ends
+    at `\\end{thebibliography}`.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    entries = []
+    keep = []
+    if _BIBTEX_ENTRY_RE.search(data):
+        position = 0
+        while True:
+            match = _BIBTEX_ENTRY_RE.search(data, position)
+            if not match:
+                break
+            end = _closing_position(data, match.end(), match.group(2))
+            entry_type = match.group(1).lower()
+            position = end
+            if entry_type in _KEEP_ENTRY_TYPES:
+                keep.append((match.start(), end))
+                continue
+            if entry_type == b'comment':
+                continue
+            key = _BIBTEX_KEY_RE.match(data, match.end())
+            if not key:
+                continue
+            crossref = _CROSSREF_RE.search(data, match.end(), end)
+            entries.append((
+                key.group(1).decode('utf-8', 'replace'),
+                match.start(), end,
+                crossref.group(1).decode('utf-8', 'replace')
+                if crossref else None))
+        index_format = 'bibtex'
+    else:
+        matches = list(_BIBITEM_RE.finditer(data))
+        if matches:
+            keep.append((0, matches[0].start()))
+            trailer = _END_BIBITEMS_RE.search(data, matches[-1].end())
+            end = trailer.start() if trailer else len(data)
+            keep.append((end, len(data)))
+        for match, following in zip(matches, matches[1:] + [None]):
+            entries.append((match.group(1).decode('utf-8', 'replace'),
+                            match.start(),
+                            following.start() if following else end,
+                            None))
+        index_format = 'bibitem'
+    LOG.debug('The bibliography %s (%s) has %d entries',
+              path, index_format, len(entries))
+    return {'format': index_format, 'entries': entries, 'keep': keep}
+
+
+def select_entries(index, keys):
+    """
+    Select the spans of the entries cited by `keys` and their crossrefs.
+
+    The spans are in the order of the file.
+    """
+    by_key = {key.lower(): (start, end, crossref)
+              for key, start, end, crossref in index['entries']}
+    selected = set()
+    pending = [key.lower() for key in keys]
+    while pending:
+        key = pending.pop()
+        if key in selected or key not in by_key:
+            continue
+        selected.add(key)
+        crossref = by_key[key][2]
+        if crossref:
+            pending.append(crossref.lower())
+    spans = list(index['keep']) + [by_key[key][:2] for key in selected]
+    return sorted(spans)
+
+
+def write_cited_entries(bib_path, output_path, keys):
+    """
+    Write the entries of `bib_path` cited by `keys` to `output_path`.
+
+    The file is written only if the bibliography or the set of the keys
+    changed since the last extraction. If `keys` is None the whole file
+    is written. Return True if the file is written.
+    """
+    stat = os.stat(bib_path)
+    stamp = {'source': [os.path.abspath(bib_path),
+                        stat.st_mtime_ns, stat.st_size],
+             'keys': None if keys is None else sorted(keys)}
+    stamp_path = os.path.join(
+        os.path.dirname(output_path),
+        '.{}.cited.json'.format(os.path.basename(output_path)))
+    try:
+        with open(stamp_path, 'r', encoding='utf-8') as file:
+            if (json.load(file) == stamp
+                    and os.path.exists(output_path)):
+                LOG.debug('The cited entries of %s are not changed',
+                          output_path)
+                return False
+    except (OSError, ValueError):
+        pass
+    data = extract_cited_entries(bib_path, keys)
+    files.atomic_write(output_path, data)
+    files.atomic_write(stamp_path, json.dumps(stamp))
+    LOG.debug('The cited entries of %s are written to %s',
+              bib_path, output_path)
+    return True
+
+
+def extract_cited_entries(bib_path, keys):
+    """Return `bytes` of the entries of `bib_path` cited by `keys`."""
+    with open(bib_path, 'rb') as file:
+        data = file.read()
+    if keys is None:
+        return data
+    index = cache.load_parsed_file(bib_path, make_index, kind='bibliography',
+                                   parser_name=_INDEX_PARSER)
+    return b'\n'.join(data[start:end].rstrip()
+                      for start, end in select_entries(index, keys)) + b'\n'
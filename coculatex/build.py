@@ -0,0 +1,338 @@
+"""Module contains the compilation of the generated LaTeX projects."""
+import hashlib
+import json
+import logging
+import os
+import re
+import shlex
+import signal
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from coculatex import (
+    cache,
+    config,
+    files,
+    metrics)
+
+
+LOG = logging.getLogger(__name__)
+
+BUILD_SECONDS = metrics.REGISTRY.histogram(
+    'coculatex_build_seconds',
+    'The duration of the compilation of the project.',
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+
+BUILDS = metrics.REGISTRY.counter(
+    'coculatex_builds_total',
+    'The number of the compilations by the status.',
+    ('status',))
+
+BuildResult = namedtuple('build_result',
+                         'root status returncode elapsed log_path')
+
+_MAGIC_RE = re.compile(r'^%\s*!TEX\s+([\w-]+)\s*=\s*(.*?)\s*$',
+                       re.IGNORECASE)
+
+_COMMENT_RE = re.compile(r'(?<!\\)%.*')
+
+_INPUT_RE = re.compile(
+    r'\\(?:input|include|subfile|bibliography|addbibresource|'
+    r'includegraphics|usepackage|RequirePackage|documentclass|LoadClass)'
+    r'\*?\s*(?:\[[^\]]*\]\s*)?\{([^}]*)\}')
+
+# the extensions tried for the inputs referenced without them
+_INPUT_EXTENSIONS = ('.tex', '.sty', '.cls', '.bib', '.pdf', '.png', '.jpg',
+                     '.jpeg', '.eps')
+
+# the inputs scanned for the references
+_SCANNED_EXTENSIONS = ('.tex', '.sty', '.cls')
+
+
+def read_tex_magic(root_path):
+    """
+    Read the `%!TEX` magic comments from the head of the file `root_path`.
+
+    Return `dict`, the repeated values of `options` are joined.
+    """
+    magic = {}
+    with open(root_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            match = _MAGIC_RE.match(stripped)
+            if not match:
+                if stripped.startswith('%'):
+                    continue
+                break
+            name, value = match.group(1).lower(), match.group(2)
+            if name == 'options' and name in magic:
+                magic[name] += ' ' + value
+            else:
+                magic[name] = value
+    LOG.debug('The magic comments of %s: %s', root_path, magic)
+    return magic
+
+
+def make_command(root_path, magic, program=None, latexmk=None):
+    """
+    Make the command line which compiles the file `root_path`.
+
+    The program and the options are taken from `magic`,
+    `program` overrides the magic program, the precompiled format
+    (`-fmt`) is dropped then, because it is dumped by the magic
+    program and the root file loads its preamble itself without it.
+    If `latexmk` is the path to the latexmk executable then it runs
+    the program.
+    """
+    magic_program = magic.get('program') or config.BUILD_DEFAULT_PROGRAM
+    program = program or magic_program
+    options = shlex.split(magic.get('options', ''))
+    if program != magic_program:
+        options = [option for option in options
+                   if not option.lstrip('-').startswith('fmt')]
+    jobname = magic.get('jobname')
+    if jobname:
+        options.append('-jobname={}'.format(jobname))
+    source = os.path.basename(root_path)
+    if latexmk:
+        return [latexmk, '-pdf', '-interaction=nonstopmode',
+                '-pdflatex={} %O %S'.format(
+                    ' '.join(shlex.quote(item)
+                             for item in [program] + options)),
+                source]
+    return ([program, '-interaction=nonstopmode', '-halt-on-error']
+            + options + [source])
+
+
+def project_inputs(root_path):
+    """
+    Return the sorted `list` of the input files of the project `root_path`.
+
+    The inputs are the root file, the files of its directory with
+    the magic comment `root` pointing at it and the existing files
+    referenced by them (`\\input`, `\\include`, `\\usepackage`,
+    the bibliographies, the graphics, ...) recursively, so the other
+    projects of the same directory are not its inputs.
+    """
+    root_path = os.path.abspath(root_path)
+    directory = os.path.dirname(root_path)
+    pending = [root_path]
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError as error:
+        LOG.debug('Cannot list the project directory %s: %s',
+                  directory, error)
+        names = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if not name.endswith('.tex') or path == root_path:
+            continue
+        try:
+            root = read_tex_magic(path).get('root')
+        except (OSError, UnicodeDecodeError):
+            continue
+        if root and os.path.normpath(
+                os.path.join(directory, root)) == root_path:
+            pending.append(path)
+    inputs = set()
+    while pending:
+        path = pending.pop()
+        if path in inputs:
+            continue
+        inputs.add(path)
+        if not path.endswith(_SCANNED_EXTENSIONS):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as file:
+                lines = file.readlines()
+        except OSError as error:
+            LOG.debug('Cannot scan the file %s for inputs: %s', path, error)
+            continue
+        for line in lines:
+            for match in _INPUT_RE.finditer(_COMMENT_RE.sub('', line)):
+                for name in match.group(1).split(','):
+                    reference = _find_input(directory, name.strip())
+                    if reference is not None:
+                        pending.append(reference)
+    return sorted(inputs)
+
+
+def _find_input(directory, name):
+    """Return the path of the existing input file `name` or None."""
+    if not name:
+        return None
+    path = os.path.normpath(os.path.join(directory, name))
+    for candidate in [path] + [path + extension
+                               for extension in _INPUT_EXTENSIONS]:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def project_digest(root_path, command):
+    """
+    Return the digest of the inputs of the project `root_path`.
+
+    The files of `project_inputs` are hashed with the command.
+    """
+    directory = os.path.dirname(os.path.abspath(root_path))
+    digest = hashlib.sha256()
+    digest.update(cache.canonical_dump(command).encode('utf-8'))
+    for file_path in project_inputs(root_path):
+        try:
+            file_hash = cache.file_digest(file_path)
+        except OSError as error:
+            LOG.debug('Cannot hash the file %s: %s', file_path, error)
+            continue
+        digest.update(os.path.relpath(file_path, directory)
+                      .encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(file_hash.encode('ascii'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def _stamp_path(root_path, jobname):
+    """Return the path to the file with the state of the last build."""
+    return os.path.join(os.path.dirname(os.path.abspath(root_path)),
+                        '.{}.build.json'.format(jobname))
+
+
+def _run(command, directory, timeout):
+    """
+    Run `command` in `directory` and return (output, returncode).
+
+    The command is started in the new session, on the timeout
+    the whole process group is killed (latexmk starts the TeX program
+    as its child) and `subprocess.TimeoutExpired` is raised.
+    """
+    with subprocess.Popen(command,
+                          cwd=directory,
+                          stdin=subprocess.DEVNULL,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          start_new_session=True) as process:
+        try:
+            output, _ = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            LOG.debug('Kill the process group %s of %s',
+                      process.pid, command)
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError as error:
+                LOG.debug('Cannot kill the process group %s: %s',
+                          process.pid, error)
+            output, _ = process.communicate()
+            raise subprocess.TimeoutExpired(command, timeout, output)
+    return output, process.returncode
+
+
+def build_project(root_path,
+                  program=None,
+                  latexmk=None,
+                  timeout=None,
+                  force=False):
+    """
+    Compile the project of the root file `root_path`.
+
+    The compilation is skipped if the inputs of the project are not
+    changed since the last successful build, unless `force` is True.
+    Return `BuildResult`.
+    """
+    root_path = os.path.abspath(root_path)
+    directory = os.path.dirname(root_path)
+    try:
+        magic = read_tex_magic(root_path)
+    except (OSError, UnicodeDecodeError) as error:
+        LOG.error('Cannot read the root file %s: %s', root_path, error)
+        BUILDS.inc(status='error')
+        return BuildResult(root_path, 'error', None, 0.0, None)
+    jobname = magic.get('jobname') or os.path.splitext(
+        os.path.basename(root_path))[0]
+    command = make_command(root_path, magic, program, latexmk)
+    LOG.debug('The command for %s: %s', root_path, command)
+    stamp_path = _stamp_path(root_path, jobname)
+    log_path = os.path.join(directory, jobname + '.build.log')
+    digest = project_digest(root_path, command)
+    if not force:
+        try:
+            with open(stamp_path, 'r', encoding='utf-8') as file:
+                stamp = json.load(file)
+        except (OSError, ValueError):
+            stamp = {}
+        if stamp.get('digest') == digest and stamp.get('returncode') == 0:
+            LOG.debug('The project %s is not changed, skip it', root_path)
+            BUILDS.inc(status='skipped')
+            return BuildResult(root_path, 'skipped', 0, 0.0, log_path)
+    start = time.perf_counter()
+    try:
+        output, returncode = _run(command, directory, timeout)
+        status = 'ok' if returncode == 0 else 'failed'
+    except subprocess.TimeoutExpired as error:
+        output = error.output or b''
+        returncode = None
+        status = 'timeout'
+    except OSError as error:
+        output = str(error).encode('utf-8')
+        returncode = None
+        status = 'error'
+    elapsed = time.perf_counter() - start
+    BUILD_SECONDS.observe(elapsed)
+    BUILDS.inc(status=status)
+    LOG.debug('The build of %s has status %s (%.3f s)',
+              root_path, status, elapsed)
+    try:
+        files.atomic_write(log_path, b'$ ' + ' '.join(
+            shlex.quote(item) for item in command).encode('utf-8')
+                           + b'\n' + output)
+        files.atomic_write(stamp_path, json.dumps({
+            'digest': digest,
+            'command': command,
+            'returncode': returncode,
+            'status': status,
+            'elapsed': elapsed}))
+    except OSError as error:
+        LOG.error('Cannot write the build log of %s: %s', root_path, error)
+    return BuildResult(root_path, status, returncode, elapsed, log_path)
+
+
+def find_roots(path):
+    """
+    Find the root files of the projects for `path`.
+
+    If `path` is a file then it is the root file, if it is a directory
+    then its `.tex` files with the magic comments and without
+    the `root` magic comment are the root files.
+    """
+    if not os.path.isdir(path):
+        return [path]
+    roots = []
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if not name.endswith('.tex') or not os.path.isfile(file_path):
+            continue
+        try:
+            magic = read_tex_magic(file_path)
+        except (OSError, UnicodeDecodeError) as error:
+            LOG.debug('Cannot read the file %s: %s', file_path, error)
+            continue
+        if magic and 'root' not in magic:
+            roots.append(file_path)
+    return roots
+
+
+def build_projects(roots, jobs=None, **kwargs):
+    """
+    Compile the projects of `roots` in the pool of `jobs` workers.
+
+    `kwargs` are passed to `build_project`.
+    Return the list of `BuildResult` in the order of `roots`.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    LOG.debug('Build %d projects by %d workers', len(roots), jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            lambda root: build_project(root, **kwargs), roots))
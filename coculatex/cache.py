@@ -0,0 +1,508 @@
+"""Module contains the on-disk caches of the program."""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+import yaml
+from coculatex import (
+    config,
+    files,
+    metrics)
+
+
+LOG = logging.getLogger(__name__)
+
+_LOCK_FILE_NAME = '.lock'
+_PRUNE_STAMP_FILE_NAME = '.pruned'
+
+# digests of theme files: path -> ((mtime_ns, size), digest)
+_FILE_DIGESTS = {}
+
+
+def canonical_dump(value):
+    """Dump `value` to the canonical (stable) `str` representation."""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False,
+                      separators=(',', ':'), default=repr)
+
+
+def file_digest(path):
+    """
+    Return the sha256 hex digest of the content of the file `path`.
+
+    The digest is memoized in the process by the mtime and the size
+    of the file.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _FILE_DIGESTS.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    _FILE_DIGESTS[path] = (signature, digest.hexdigest())
+    return _FILE_DIGESTS[path][1]
+
+
+def directory_digest(path, extensions=None):
+    """
+    Return the digest of all the files of the directory `path`.
+
+    If `extensions` is passed then only the files with these extensions
+    are hashed.
+    """
+    digest = hashlib.sha256()
+    for directory, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if extensions and not name.lower().endswith(extensions):
+                continue
+            file_path = os.path.join(directory, name)
+            try:
+                file_hash = file_digest(file_path)
+            except OSError as error:
+                LOG.debug('Cannot hash the file %s: %s', file_path, error)
+                continue
+            digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(file_hash.encode('ascii'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class DirectoryCache:
+    """
+    The cache which stores the entries in the directory.
+
+    The entries are stored in the directory `path` as the files named by
+    their keys. The writes are atomic, therefore the cache can be shared
+    by the concurrent processes; the eviction holds the exclusive lock.
+    The modification time of the entry marks its last use.
+    """
+
+    extension = '.entry'
+
+    def __init__(self, path, max_size, max_age):
+        """Init the cache for the directory `path`."""
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        LOG.debug('Define the %s for the path %s (max size %s, max age %s)',
+                  self.__class__.__name__, path, max_size, max_age)
+
+    def _entry_path(self, key):
+        """Return the path to the entry of `key`."""
+        return os.path.join(self.path, key[:2], key + self.extension)
+
+    def _entries(self):
+        """Iterate over the pairs (path, stat) of the entries."""
+        try:
+            buckets = os.listdir(self.path)
+        except FileNotFoundError:
+            return
+        for bucket in buckets:
+            bucket_path = os.path.join(self.path, bucket)
+            if not os.path.isdir(bucket_path):
+                continue
+            for name in os.listdir(bucket_path):
+                if not name.endswith(self.extension):
+                    continue
+                entry_path = os.path.join(bucket_path, name)
+                try:
+                    yield entry_path, os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+
+    def get_bytes(self, key):
+        """Return the cached `bytes` of `key` or None."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as file:
+                data = file.read()
+        except (FileNotFoundError, OSError) as error:
+            LOG.debug('Cache miss for the key %s: %s', key, error)
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError as error:
+            LOG.debug('Cannot touch the cache entry %s: %s',
+                      entry_path, error)
+        LOG.debug('Cache hit for the key %s', key)
+        return data
+
+    def put_bytes(self, key, data):
+        """Store `bytes` of `data` for `key`."""
+        entry_path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            with files.file_lock(os.path.join(self.path, _LOCK_FILE_NAME),
+                                 shared=True):
+                files.atomic_write(entry_path, data)
+        except OSError as error:
+            LOG.debug('Cannot store the cache entry %s: %s',
+                      entry_path, error)
+            return
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        """Prune the cache if it was not pruned for a long time."""
+        stamp_path = os.path.join(self.path, _PRUNE_STAMP_FILE_NAME)
+        try:
+            last_prune = os.path.getmtime(stamp_path)
+        except OSError:
+            last_prune = 0
+        if time.time() - last_prune < config.CACHE_PRUNE_INTERVAL:
+            return
+        try:
+            files.atomic_write(stamp_path, '')
+        except OSError as error:
+            LOG.debug('Cannot write the prune stamp %s: %s',
+                      stamp_path, error)
+            return
+        self.prune()
+
+    def _remove(self, entry_path):
+        """Remove the entry `entry_path`."""
+        os.unlink(entry_path)
+
+    def stats(self):
+        """Return `dict` with the statistics of the cache."""
+        entries = 0
+        size = 0
+        oldest = None
+        newest = None
+        for _, stat in self._entries():
+            entries += 1
+            size += stat.st_size
+            oldest = (stat.st_mtime if oldest is None
+                      else min(oldest, stat.st_mtime))
+            newest = (stat.st_mtime if newest is None
+                      else max(newest, stat.st_mtime))
+        return {'path': self.path,
+                'entries': entries,
+                'size': size,
+                'max_size': self.max_size,
+                'max_age': self.max_age,
+                'oldest': oldest,
+                'newest': newest}
+
+    def prune(self, max_size=None, max_age=None):
+        """
+        Evict the entries of the cache.
+
+        The entries unused for more than `max_age` seconds are removed,
+        then the least recently used entries are removed while the size
+        of the cache exceeds `max_size` bytes.
+        Return the number of removed entries.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        max_age = self.max_age if max_age is None else max_age
+        removed = 0
+        try:
+            os.makedirs(self.path, exist_ok=True)
+        except OSError as error:
+            LOG.debug('Cannot make the cache directory %s: %s',
+                      self.path, error)
+            return removed
+        with files.file_lock(os.path.join(self.path, _LOCK_FILE_NAME)):
+            now = time.time()
+            entries = sorted(self._entries(),
+                             key=lambda entry: entry[1].st_mtime)
+            size = sum(stat.st_size for _, stat in entries)
+            for entry_path, stat in entries:
+                if now - stat.st_mtime <= max_age and size <= max_size:
+                    continue
+                try:
+                    self._remove(entry_path)
+                except OSError as error:
+                    LOG.debug('Cannot remove the cache entry %s: %s',
+                              entry_path, error)
+                    continue
+                size -= stat.st_size
+                removed += 1
+        LOG.debug('%d entries are removed from %s', removed, self.path)
+        return removed
+
+
+class RenderCache(DirectoryCache):
+    """
+    The content-addressed cache of the rendered templates.
+
+    The key is made of the root template, the Jinja2 settings and
+    the variables referenced by the templates. The templates loaded
+    by the rendering (`extends`, `include`, `import`) are known only
+    after it, therefore their digests are stored in the entry and checked
+    when the entry is loaded. The names of the referenced variables are
+    cached in the same way (see `make_usage_key`).
+    """
+
+    extension = '.tex'
+
+    def __init__(self, path,
+                 max_size=config.RENDER_CACHE_MAX_SIZE,
+                 max_age=config.RENDER_CACHE_MAX_AGE):
+        """Init the cache for the directory `path`."""
+        super().__init__(path, max_size, max_age)
+
+    @staticmethod
+    def make_key(root_path, jinja2_config, variables):
+        """
+        Make the key of the rendering.
+
+        The key is the hash of the content of the root template
+        `root_path`, the Jinja2 settings and the variables.
+        """
+        digest = hashlib.sha256()
+        digest.update(file_digest(root_path).encode('ascii'))
+        digest.update(os.path.basename(root_path).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(canonical_dump(jinja2_config).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(canonical_dump(variables).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_usage_key(root_path, jinja2_config):
+        """
+        Make the key of the variables referenced by the root template.
+
+        The entry of the key holds `list` of the names of the variables.
+        """
+        digest = hashlib.sha256(b'usage\0')
+        digest.update(file_digest(root_path).encode('ascii'))
+        digest.update(os.path.basename(root_path).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(canonical_dump(jinja2_config).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached data of `key` or None.
+
+        None is returned if any of the templates loaded by the rendering
+        changed too.
+        """
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            entry = json.loads(data.decode('utf-8'))
+            for path, path_digest in entry['dependencies'].items():
+                if file_digest(path) != path_digest:
+                    LOG.debug('The template %s of the entry %s is changed',
+                              path, key)
+                    return None
+            return entry['data']
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            LOG.debug('The cache entry %s is broken: %s', key, error)
+        except OSError as error:
+            LOG.debug('The template of the entry %s is not read: %s',
+                      key, error)
+        return None
+
+    def put(self, key, data, dependencies=()):
+        """
+        Store `data` for `key`.
+
+        `data` is `str` or any value serializable to JSON,
+        `dependencies` are the paths of the templates loaded
+        by the rendering.
+        """
+        try:
+            entry = {'dependencies': {path: file_digest(path)
+                                      for path in dependencies},
+                     'data': data}
+        except OSError as error:
+            LOG.debug('The templates of the entry %s are not read: %s',
+                      key, error)
+            return
+        self.put_bytes(key, json.dumps(entry, ensure_ascii=False)
+                       .encode('utf-8'))
+
+
+class FragmentCache(DirectoryCache):
+    """
+    The cache of the rendered fragments of the templates.
+
+    The fragments are the bodies of the blocks `cache` of
+    `templates.FragmentCacheExtension`, they are keyed by the template,
+    the digest of the body and the arguments of the block.
+    """
+
+    extension = '.tex'
+
+    def __init__(self, path,
+                 max_size=config.FRAGMENT_CACHE_MAX_SIZE,
+                 max_age=config.FRAGMENT_CACHE_MAX_AGE):
+        """Init the cache for the directory `path`."""
+        super().__init__(path, max_size, max_age)
+
+    @staticmethod
+    def make_key(template_name, body_digest, arguments):
+        """Make the key of the fragment."""
+        return hashlib.sha256(canonical_dump(
+            [template_name, body_digest, arguments]).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        """Return `str` of the cached fragment or None."""
+        data = self.get_bytes(key)
+        return None if data is None else data.decode('utf-8')
+
+    def put(self, key, data):
+        """Store `str` of the fragment for `key`."""
+        self.put_bytes(key, data.encode('utf-8'))
+
+
+class ArchiveMemberCache(DirectoryCache):
+    """
+    The cache of the compressed members of the archives.
+
+    The members are keyed by the path, the mtime and the size
+    of the file and the header of the member.
+    """
+
+    extension = '.gz'
+
+    def __init__(self, path,
+                 max_size=config.ARCHIVE_CACHE_MAX_SIZE,
+                 max_age=config.ARCHIVE_CACHE_MAX_AGE):
+        """Init the cache for the directory `path`."""
+        super().__init__(path, max_size, max_age)
+
+    @staticmethod
+    def make_key(path, header):
+        """Make the key of the file `path` stored with `bytes` `header`."""
+        stat = os.stat(path)
+        digest = hashlib.sha256('{}\0{}\0{}\0'.format(
+            os.path.abspath(path), stat.st_mtime_ns,
+            stat.st_size).encode('utf-8'))
+        digest.update(header)
+        return digest.hexdigest()
+
+
+class YamlCache(DirectoryCache):
+    """
+    The cache of the parsed YAML data.
+
+    The files are keyed by their path, mtime and size, the strings
+    are keyed by their hash. The parsed values are stored pickled,
+    the loaded entries are memoized in the process too.
+    """
+
+    extension = '.pickle'
+
+    def __init__(self, path,
+                 max_size=config.YAML_CACHE_MAX_SIZE,
+                 max_age=config.YAML_CACHE_MAX_AGE):
+        """Init the cache for the directory `path`."""
+        super().__init__(path, max_size, max_age)
+        self.memory = {}
+
+    def _load(self, key, parse, kind):
+        """Return the value of `key`, `parse()` makes it on the miss."""
+        data = self.memory.get(key)
+        if data is None:
+            data = self.get_bytes(key)
+        if data is not None:
+            try:
+                value = pickle.loads(data)
+            except (pickle.UnpicklingError, EOFError, AttributeError,
+                    ImportError, IndexError, TypeError) as error:
+                LOG.debug('The cache entry %s is broken: %s', key, error)
+            else:
+                self.memory[key] = data
+                metrics.CACHE_REQUESTS.inc(cache=kind, result='hit')
+                return value
+        metrics.CACHE_REQUESTS.inc(cache=kind, result='miss')
+        with metrics.YAML_PARSE_SECONDS.time():
+            value = parse()
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            LOG.debug('Cannot pickle the value of %s: %s', key, error)
+            return value
+        self.memory[key] = data
+        self.put_bytes(key, data)
+        return value
+
+    def load_file(self, path, loader, kind='yaml'):
+        """Load the YAML file `path` by the `loader` class."""
+        def parse(path):
+            """Parse the file."""
+            with open(path, 'r', encoding='utf-8') as file:
+                return yaml.load(file, Loader=loader)
+        return self.load_parsed_file(path, parse, kind, loader.__name__)
+
+    def load_parsed_file(self, path, parse, kind, parser_name=None):
+        """
+        Load the file `path` parsed by the function `parse(path)`.
+
+        The entries of the different parsers of the same file are
+        distinguished by `parser_name` (default is the name of `kind`).
+        """
+        stat = os.stat(path)
+        key = hashlib.sha256('file\0{}\0{}\0{}\0{}'.format(
+            parser_name or kind, os.path.abspath(path), stat.st_mtime_ns,
+            stat.st_size).encode('utf-8')).hexdigest()
+        return self._load(key, lambda: parse(path), kind)
+
+    def load_string(self, text, loader, kind='yaml'):
+        """Load the YAML string `text` by the `loader` class."""
+        key = hashlib.sha256('string\0{}\0{}'.format(
+            loader.__name__, text).encode('utf-8')).hexdigest()
+        return self._load(key, lambda: yaml.load(text, Loader=loader), kind)
+
+
+_YAML_CACHE = None
+
+_FRAGMENT_CACHE = None
+
+
+def set_yaml_cache(yaml_cache):
+    """Set the `YamlCache` used by the YAML loads, None disables it."""
+    global _YAML_CACHE  # pylint: disable=global-statement
+    _YAML_CACHE = yaml_cache
+
+
+def set_fragment_cache(fragment_cache):
+    """Set the `FragmentCache` of the `cache` blocks, None disables it."""
+    global _FRAGMENT_CACHE  # pylint: disable=global-statement
+    _FRAGMENT_CACHE = fragment_cache
+
+
+def get_fragment_cache():
+    """Return the `FragmentCache` of the `cache` blocks or None."""
+    return _FRAGMENT_CACHE
+
+
+def load_yaml_file(path, loader=yaml.SafeLoader, kind='yaml'):
+    """Load the YAML file `path` through the cache if it is set."""
+    if _YAML_CACHE is not None:
+        return _YAML_CACHE.load_file(path, loader, kind)
+    with open(path, 'r', encoding='utf-8') as file, \
+            metrics.YAML_PARSE_SECONDS.time():
+        return yaml.load(file, Loader=loader)
+
+
+def load_parsed_file(path, parse, kind, parser_name=None):
+    """
+    Load the file `path` parsed by `parse(path)` through the cache.
+
+    The parsed value must be picklable. See `YamlCache.load_parsed_file`
+    for `parser_name`.
+    """
+    if _YAML_CACHE is not None:
+        return _YAML_CACHE.load_parsed_file(path, parse, kind, parser_name)
+    return parse(path)
+
+
+def load_yaml_string(text, loader=yaml.SafeLoader, kind='yaml'):
+    """Load the YAML string `text` through the cache if it is set."""
+    if _YAML_CACHE is not None and text:
+        return _YAML_CACHE.load_string(text, loader, kind)
+    with metrics.YAML_PARSE_SECONDS.time():
+        return yaml.load(text, Loader=loader)
@@ -0,0 +1,217 @@
+"""
+Module contains the detection of the projects changed in git.
+
+The changed files are asked from the local git (`git diff --name-only`),
+the tree is not walked. The projects are the YAML configs with
+the directives `theme` and `project-name` and the applied sources
+(with the `%!TEX root` magic and the YAML header). The project is
+affected if its config, its source or any file of its theme changed.
+Only the changed files and the configs next to the changed sources
+are loaded unless a theme changed, then all the tracked projects are.
+"""
+import logging
+import os
+import subprocess
+from collections import namedtuple
+import yaml
+from coculatex import (
+    build,
+    cache,
+    templates)
+
+
+LOG = logging.getLogger(__name__)
+
+Project = namedtuple('Project', 'config_file input theme dependencies')
+
+
+class GitError(Exception):
+    """Raise if the git command fails."""
+
+
+def _git(path, *arguments):
+    """Run the git command in the directory `path` and return stdout."""
+    command = ['git', '-C', path] + list(arguments)
+    LOG.debug('Run the command: %s', command)
+    try:
+        process = subprocess.run(command,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE,
+                                 check=False)
+    except OSError as error:
+        raise GitError('Cannot run git: {}'.format(error))
+    if process.returncode:
+        raise GitError(process.stderr.decode('utf-8', 'replace').strip())
+    return process.stdout.decode('utf-8', 'surrogateescape')
+
+
+def _paths(toplevel, output):
+    """Return the absolute paths of the NUL-separated git output."""
+    return {os.path.join(toplevel, name)
+            for name in output.split('\0') if name}
+
+
+def git_toplevel(path):
+    """Return the top level directory of the repository of `path`."""
+    return os.path.realpath(
+        _git(path, 'rev-parse', '--show-toplevel').strip())
+
+
+def changed_files(path, since=None, staged=False):
+    """
+    Return `set` of the absolute paths changed in the repository of `path`.
+
+    If `staged` is set then the changes of the index are returned,
+    otherwise the working tree is compared with the revision `since`
+    and the untracked (not ignored) files are added.
+    """
+    toplevel = git_toplevel(path)
+    if staged:
+        changed = _paths(toplevel, _git(toplevel, 'diff', '--cached',
+                                        '--name-only', '-z'))
+    else:
+        try:
+            _git(toplevel, 'rev-parse', '--verify', '--quiet',
+                 '{}^{{commit}}'.format(since))
+        except GitError:
+            raise GitError('The revision {} is not found in {}'.format(
+                since, toplevel))
+        changed = _paths(toplevel, _git(toplevel, 'diff', '--name-only',
+                                        '-z', since, '--'))
+        changed |= _paths(toplevel, _git(toplevel, 'ls-files', '--others',
+                                         '--exclude-standard', '-z'))
+    LOG.debug('The changed files of %s: %s', toplevel, changed)
+    return changed
+
+
+def tracked_files(path, patterns=('*.yaml', '*.tex')):
+    """Return `set` of the files of the index under `path`."""
+    toplevel = git_toplevel(path)
+    path = os.path.realpath(path)
+    files = _paths(toplevel, _git(toplevel, 'ls-files', '-z', '--cached',
+                                  '--others', '--exclude-standard',
+                                  '--', *patterns))
+    return {name for name in files
+            if name == path or name.startswith(path + os.sep)}
+
+
+def _load_project(path):
+    """Return `Project` of the file `path` or None."""
+    if path.endswith('.yaml'):
+        try:
+            values = cache.load_yaml_file(path, kind='project')
+        except (OSError, yaml.YAMLError) as error:
+            LOG.debug('Cannot load the config %s: %s', path, error)
+            return None
+        if not (isinstance(values, dict)
+                and values.get('theme') and values.get('project-name')):
+            return None
+        source = os.path.join(os.path.dirname(path),
+                              values['project-name'] + '.source.tex')
+        return Project(path, None, str(values['theme']), {path, source})
+    try:
+        if 'root' not in build.read_tex_magic(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            values, _ = templates.extract_variables(file)
+    except (OSError, UnicodeDecodeError, yaml.YAMLError) as error:
+        LOG.debug('Cannot read the source %s: %s', path, error)
+        return None
+    if not (isinstance(values, dict)
+            and values.get('theme') and values.get('project-name')):
+        return None
+    return Project(None, path, str(values['theme']), {path})
+
+
+def _candidate_files(path, changed):
+    """
+    Return `set` of the files under `path` which can be changed projects.
+
+    These are the changed configs and sources and the configs
+    in the directories of the changed sources.
+    """
+    path = os.path.realpath(path)
+    candidates = set()
+    for name in changed:
+        if not (name == path or name.startswith(path + os.sep)):
+            continue
+        if name.endswith('.yaml'):
+            candidates.add(name)
+        elif name.endswith('.tex'):
+            candidates.add(name)
+            directory = os.path.dirname(name)
+            try:
+                candidates.update(os.path.join(directory, sibling)
+                                  for sibling in os.listdir(directory)
+                                  if sibling.endswith('.yaml'))
+            except OSError as error:
+                LOG.debug('Cannot list the directory %s: %s',
+                          directory, error)
+    return candidates
+
+
+def find_projects(path, changed=None):
+    """
+    Return `list` of the projects in the repository under `path`.
+
+    If `changed` is passed then only the projects of these files
+    are searched (see `_candidate_files`) instead of all the tracked files.
+    """
+    if changed is None:
+        files = tracked_files(path)
+    else:
+        files = _candidate_files(path, changed)
+    projects = []
+    for name in sorted(files):
+        project = _load_project(name)
+        if project:
+            projects.append(project)
+    # the sources of the config projects are applied with their configs
+    configured = set()
+    for project in projects:
+        if project.config_file:
+            configured |= project.dependencies
+    projects = [project for project in projects
+                if project.config_file or project.input not in configured]
+    LOG.debug('The projects of %s: %s', path, projects)
+    return projects
+
+
+def theme_changes(changed, themes_path):
+    """Return `set` of the names of the themes with the changed files."""
+    themes_path = os.path.realpath(themes_path)
+    themes = set()
+    for name in changed:
+        if name.startswith(themes_path + os.sep):
+            themes.add(os.path.relpath(name, themes_path).split(os.sep)[0])
+    return themes
+
+
+def affected_projects(path, themes_path, since=None, staged=False):
+    """
+    Return `list` of the projects under `path` affected by the changes.
+
+    The changes of the themes are asked from the repository of
+    `themes_path` too if it is the other repository, the revision
+    `since` must exist in both the repositories. The themes which are
+    not in a repository are considered unchanged.
+    """
+    changed = changed_files(path, since, staged)
+    try:
+        themes_toplevel = git_toplevel(themes_path)
+    except GitError as error:
+        LOG.debug('The themes path %s is not in a repository: %s',
+                  themes_path, error)
+        themes_toplevel = None
+    if themes_toplevel and themes_toplevel != git_toplevel(path):
+        try:
+            changed |= changed_files(themes_path, since, staged)
+        except GitError as error:
+            raise GitError('The themes repository {}: {}'.format(
+                themes_toplevel, error))
+    themes = theme_changes(changed, themes_path)
+    LOG.debug('The changed themes: %s', themes)
+    return [project
+            for project in find_projects(path, None if themes else changed)
+            if project.dependencies & changed
+            or project.theme.split('.')[0] in themes]
@@ -0,0 +1,315 @@
+"""
+Module contains the completion of the command line in the shells.
+
+The shell scripts (see `script`) run this module on every completion,
+so it imports neither jinja2 nor yaml. The names of the themes and
+the subthemes and the options of the commands are read from the table
+in the cache directory made by `coculatex completion refresh`
+(see `write_table`). The stale table is still used while it is
+refreshed in the background, only the missing table is made at once.
+
+Usage:
+    python -m coculatex.completion <index of the current word> <words>
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from coculatex import (
+    __version__ as VERSION,
+    config,
+    files)
+
+
+LOG = logging.getLogger(__name__)
+
+SHELLS = ('bash', 'zsh', 'fish')
+
+# the destinations of the arguments completed by the theme names
+THEME_DESTINATIONS = ('theme',)
+
+_PROGRAM = 'coculatex'
+
+_SCRIPTS = {
+    'bash': '''\
+_{name}_complete() {{
+    local IFS=$'\\n'
+    COMPREPLY=($({command} "$COMP_CWORD" "${{COMP_WORDS[@]}}" 2>/dev/null))
+}}
+complete -o default -F _{name}_complete {program}
+''',
+    'zsh': '''\
+#compdef {program}
+_{name}_complete() {{
+    local -a candidates
+    candidates=("${{(@f)$({command} $((CURRENT - 1)) "${{words[@]}}" \\
+        2>/dev/null)}}")
+    if (( ${{#candidates[@]}} )) && [[ -n "${{candidates[1]}}" ]]; then
+        compadd -- "${{candidates[@]}}"
+    else
+        _files
+    fi
+}}
+compdef _{name}_complete {program}
+''',
+    'fish': '''\
+function __{name}_complete
+    set -l words (commandline -opc) (commandline -ct)
+    set -l candidates ({command} (math (count $words) - 1) $words \\
+        2>/dev/null)
+    if test (count $candidates) -gt 0
+        printf '%s\\n' $candidates
+    else
+        __fish_complete_path (commandline -ct)
+    end
+end
+complete -c {program} -f -a '(__{name}_complete)'
+''',
+}
+
+
+def script(shell, program=_PROGRAM):
+    """Return the completion script of `program` for the `shell`."""
+    command = '{} -m {}'.format(_quote(sys.executable), __name__)
+    return _SCRIPTS[shell].format(command=command, program=program,
+                                  name=program.replace('-', '_'))
+
+
+def _quote(value):
+    """Quote `value` for the shell scripts."""
+    return "'{}'".format(value.replace("'", "'\\''"))
+
+
+def parser_spec(parser):
+    """
+    Return `dict` of the options and the commands of the argparse `parser`.
+
+    `options` maps the option strings to the number of their values,
+    their choices and their destinations, `positionals` lists
+    the destinations of the positional arguments and `commands` maps
+    the names of the subcommands to their specs.
+    """
+    spec = {'options': {}, 'positionals': [], 'commands': {}}
+    for action in parser._actions:
+        if action.option_strings:
+            if action.help == '==SUPPRESS==':
+                continue
+            value = {'nargs': 0 if action.nargs == 0 else 1,
+                     'choices': (list(action.choices)
+                                 if action.choices else None),
+                     'dest': action.dest}
+            for option in action.option_strings:
+                spec['options'][option] = value
+        elif action.choices and isinstance(action.choices, dict):
+            # the subparsers action
+            for name, subparser in action.choices.items():
+                spec['commands'][name] = parser_spec(subparser)
+        else:
+            spec['positionals'].append({
+                'dest': action.dest,
+                'choices': list(action.choices) if action.choices else None,
+                'many': action.nargs in ('*', '+')})
+    return spec
+
+
+def table_path(cache_path, themes_path):
+    """Return the path of the name table of the themes in `themes_path`."""
+    return files.cache_file_path(
+        cache_path, config.COMPLETION_CACHE_SUBDIRECTORY, themes_path)
+
+
+def _themes_mtime(themes_path):
+    """Return the modification time of `themes_path` or None."""
+    try:
+        return os.stat(themes_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def write_table(path, themes_path, themes, spec):
+    """
+    Write the name table to the file `path`.
+
+    `themes` maps the names of the themes to the lists of their
+    subthemes, `spec` is the result of `parser_spec`.
+    """
+    table = {'version': VERSION,
+             'themes_path': themes_path,
+             'themes_mtime': _themes_mtime(themes_path),
+             'created': time.time(),
+             'themes': themes,
+             'spec': spec}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    files.atomic_write(path, json.dumps(table, sort_keys=True))
+    LOG.debug('The completion table %s is written', path)
+
+
+def read_table(path):
+    """Return the name table of the file `path` or None."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            table = json.load(file)
+    except (OSError, ValueError) as error:
+        LOG.debug('Cannot read the completion table %s: %s', path, error)
+        return None
+    return table if isinstance(table, dict) else None
+
+
+def is_stale(table, themes_path, max_age=config.COMPLETION_TABLE_MAX_AGE):
+    """
+    Return True if the name `table` must be refreshed.
+
+    It is stale if it is made by the other version, the themes are
+    added or removed or it is older than `max_age` seconds (the
+    subthemes are added without the change of `themes_path`).
+    """
+    return (table.get('version') != VERSION
+            or table.get('themes_mtime') != _themes_mtime(themes_path)
+            or time.time() - table.get('created', 0) > max_age)
+
+
+def refresh(themes_path, cache_path, wait=False):
+    """
+    Refresh the name table by the main program.
+
+    If `wait` is True then wait for it at most
+    `config.COMPLETION_REFRESH_TIMEOUT` seconds, otherwise it runs
+    in the background.
+    """
+    command = [sys.executable, '-m', 'coculatex.main',
+               '--themes-path', themes_path, '--cache-path', cache_path,
+               'completion', 'refresh']
+    LOG.debug('Run the command: %s', command)
+    try:
+        if wait:
+            subprocess.run(command, stdin=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL,
+                           timeout=config.COMPLETION_REFRESH_TIMEOUT,
+                           check=False)
+        else:
+            subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL,
+                             start_new_session=True)
+    except (OSError, subprocess.SubprocessError) as error:
+        LOG.debug('Cannot refresh the completion table: %s', error)
+
+
+def load_table(themes_path, cache_path):
+    """Return the fresh or the stale name table, make the missing one."""
+    path = table_path(cache_path, themes_path)
+    table = read_table(path)
+    if table is None:
+        refresh(themes_path, cache_path, wait=True)
+        return read_table(path)
+    if is_stale(table, themes_path):
+        refresh(themes_path, cache_path)
+    return table
+
+
+def _option_value(words, names, default):
+    """Return the value of the global option `names` in `words`."""
+    for index, word in enumerate(words[:-1]):
+        if word in names:
+            return words[index + 1]
+    return default
+
+
+def complete_themes(prefix, themes):
+    """Return `list` of the theme and the dotted subtheme names."""
+    if '.' in prefix:
+        theme = prefix.split('.', 1)[0]
+        return ['{}.{}'.format(theme, subtheme)
+                for subtheme in themes.get(theme, ())
+                if '{}.{}'.format(theme, subtheme).startswith(prefix)]
+    names = sorted(name for name in themes if name.startswith(prefix))
+    if len(names) == 1:
+        names += ['{}.{}'.format(names[0], subtheme)
+                  for subtheme in themes[names[0]]]
+    return names
+
+
+def _complete_value(prefix, dest, choices, themes):
+    """Return the candidates of the value of the argument `dest`."""
+    if choices:
+        return [choice for choice in map(str, choices)
+                if choice.startswith(prefix)]
+    if dest in THEME_DESTINATIONS:
+        return complete_themes(prefix, themes)
+    # the paths and the free values are completed by the shell
+    return []
+
+
+def complete(words, index, table):
+    """
+    Return `list` of the candidates of the word `index` of `words`.
+
+    `words` are the words of the command line without the program.
+    """
+    spec = table['spec']
+    themes = table.get('themes', {})
+    prefix = words[index] if index < len(words) else ''
+    positional = 0
+    skip = False
+    for word in words[:index]:
+        if skip:
+            skip = False
+            continue
+        if word.startswith('-') and word != '-':
+            option = spec['options'].get(word.split('=', 1)[0])
+            skip = bool(option and option['nargs'] and '=' not in word)
+            continue
+        if word in spec['commands'] and not positional:
+            spec = spec['commands'][word]
+            continue
+        positional += 1
+    if skip:
+        option = spec['options'][words[index - 1]]
+        return _complete_value(prefix, option['dest'], option['choices'],
+                               themes)
+    if prefix.startswith('-'):
+        return sorted(option for option in spec['options']
+                      if option.startswith(prefix))
+    if spec['commands'] and not positional:
+        return sorted(name for name in spec['commands']
+                      if name.startswith(prefix))
+    positionals = spec['positionals']
+    if not positionals:
+        return []
+    argument = positionals[min(positional, len(positionals) - 1)]
+    if positional >= len(positionals) and not argument['many']:
+        return []
+    return _complete_value(prefix, argument['dest'], argument['choices'],
+                           themes)
+
+
+def main(argv=None):
+    """Print the candidates of the completion of the command line."""
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        index = int(argv[0])
+    except (IndexError, ValueError):
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    # the first word is the program
+    words = argv[2:]
+    index -= 1
+    if index < 0:
+        return 0
+    themes_path = os.path.realpath(os.path.expanduser(_option_value(
+        words, ('--themes-path', '-t'), config.THEMES_DIRECTORY)))
+    cache_path = os.path.realpath(os.path.expanduser(_option_value(
+        words, ('--cache-path',), config.CACHE_DIRECTORY)))
+    table = load_table(themes_path, cache_path)
+    if table is None:
+        return 1
+    for candidate in complete(words, index, table):
+        print(candidate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
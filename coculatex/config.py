@@ -14,7 +14,8 @@ Jinja2Config = namedtuple(
     'jinja2',
     ('BLOCK_START_STRING BLOCK_END_STRING VARIABLE_START_STRING '
      'VARIABLE_END_STRING COMMENT_START_STRING COMMENT_END_STRING '
-     'LINE_STATEMENT_PREFIX LINE_COMMENT_PREFIX TRIM_BLOCKS AUTOESCAPE'))
+     'LINE_STATEMENT_PREFIX LINE_COMMENT_PREFIX TRIM_BLOCKS AUTOESCAPE '
+     'EXTENSIONS'))
 
 
 JINJA2_DEFAULT_CONFIG = Jinja2Config(
@@ -27,7 +28,8 @@ JINJA2_DEFAULT_CONFIG = Jinja2Config(
     LINE_STATEMENT_PREFIX=r'%%',
     LINE_COMMENT_PREFIX=r'%#',
     TRIM_BLOCKS=True,
-    AUTOESCAPE=False)
+    AUTOESCAPE=False,
+    EXTENSIONS=('coculatex.templates.FragmentCacheExtension',))
 
 
 # ------------LaTeX Template Config--------------------------------------------
@@ -57,6 +59,87 @@ LTM_FILE_EXTENSION = 'ltm'
 
 VERSION_STRING_TEMPLATE = "CoCuLaTeX {version} by Ivan Chizhov"
 
+# ------------Cache Config-----------------------------------------------------
+
+CACHE_DIRECTORY = os.path.realpath(os.path.join(
+    os.path.expanduser(os.environ.get('XDG_CACHE_HOME', '~/.cache')),
+    'coculatex'))
+
+RENDER_CACHE_SUBDIRECTORY = 'renders'
+
+RENDER_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+RENDER_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+YAML_CACHE_SUBDIRECTORY = 'yaml'
+
+YAML_CACHE_MAX_SIZE = 64 * 1024 * 1024  # bytes
+
+YAML_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+ARCHIVE_CACHE_SUBDIRECTORY = 'archives'
+
+ARCHIVE_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+ARCHIVE_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+FRAGMENT_CACHE_SUBDIRECTORY = 'fragments'
+
+FRAGMENT_CACHE_MAX_SIZE = 64 * 1024 * 1024  # bytes
+
+FRAGMENT_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+# the number of the fragments kept in the memory of the process
+FRAGMENT_MEMORY_MAX_ENTRIES = 1024
+
+# the database of the job queue (relative to the current directory)
+JOB_QUEUE_DATABASE = 'coculatex-jobs.sqlite3'
+
+JOB_LEASE = 10 * 60  # seconds
+
+JOB_MAX_ATTEMPTS = 3
+
+CACHE_PRUNE_INTERVAL = 60 * 60  # seconds
+
+MIRROR_SUBDIRECTORY = 'mirrors'
+
+# the mirrored themes are compared with the origin after this time
+MIRROR_REVALIDATE_INTERVAL = 5 * 60  # seconds
+
+SEARCH_INDEX_SUBDIRECTORY = 'search'
+
+CHECK_RESULTS_SUBDIRECTORY = 'checks'
+
+COMPLETION_CACHE_SUBDIRECTORY = 'completion'
+
+# the name table of the completion is refreshed in the background
+# when it is older
+COMPLETION_TABLE_MAX_AGE = 10 * 60  # seconds
+
+COMPLETION_REFRESH_TIMEOUT = 10  # seconds
+
+# ------------Build Config-----------------------------------------------------
+
+BUILD_DEFAULT_PROGRAM = 'pdflatex'
+
+FORMAT_CACHE_SUBDIRECTORY = 'formats'
+
+FORMAT_FILE_EXTENSION = '.fmt'
+
+FORMAT_CACHE_MAX_SIZE = 1024 * 1024 * 1024  # bytes
+
+FORMAT_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+# the extensions of the theme files which the preamble can load
+FORMAT_INPUT_EXTENSIONS = ('.cfg', '.cls', '.clo', '.def', '.fd', '.sty',
+                           '.tex')
+
+# the line of the theme which ends the part of the preamble
+# shared by all the projects
+STATIC_PREAMBLE_END = '%!COCULATEX static-preamble-end'
+
+PREAMBLE_FILE_SUFFIX = '.preamble.tex'
+
 
 def config_iter(config):
     """
@@ -0,0 +1,201 @@
+"""
+Module contains the lazy data sources of the parameters.
+
+The parameter can reference the external data file instead of the
+inline YAML value:
+
+    results:
+      data_file: results.csv  # the path relative to the config file
+      format: csv  # optional, it is guessed by the extension
+
+The file is opened only when the template uses the parameter,
+the iteration over it streams the rows (CSV), the lines (JSONL)
+or the documents (YAML).
+"""
+import csv
+import json
+import logging
+import os
+import yaml
+
+
+LOG = logging.getLogger(__name__)
+
+DATA_FILE_KEY = 'data_file'
+
+_SOURCE_KEYS = {DATA_FILE_KEY, 'format', 'encoding'}
+
+_MISSING = object()
+
+_FORMATS = {'.csv': 'csv',
+            '.jsonl': 'jsonl',
+            '.ndjson': 'jsonl',
+            '.json': 'json',
+            '.yaml': 'yaml',
+            '.yml': 'yaml'}
+
+
+def is_data_file_reference(value):
+    """Return True if `value` is the reference to the data file."""
+    return (isinstance(value, dict)
+            and DATA_FILE_KEY in value
+            and isinstance(value[DATA_FILE_KEY], str)
+            and set(value) <= _SOURCE_KEYS)
+
+
+class DataSource:
+    """
+    The lazy data loaded from the file.
+
+    The iteration streams the items of the file, the other operations
+    (the indexing, the attributes, `str`) load the whole data once.
+    """
+
+    def __init__(self, path, data_format=None, encoding='utf-8'):
+        """Init the data source of the file `path`."""
+        self.path = path
+        self.format = data_format or _FORMATS.get(
+            os.path.splitext(path)[1].lower(), 'yaml')
+        self.encoding = encoding
+        self._value = None
+        self._loaded = False
+
+    def __iter__(self):
+        """Iterate over the items of the data without loading it."""
+        LOG.debug('Stream the data file %s (%s)', self.path, self.format)
+        with open(self.path, 'r', encoding=self.encoding,
+                  newline='' if self.format == 'csv' else None) as file:
+            if self.format == 'csv':
+                yield from csv.DictReader(file)
+            elif self.format == 'jsonl':
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+            elif self.format == 'json':
+                yield from _items(json.load(file))
+            else:
+                documents = yaml.safe_load_all(file)
+                first = next(documents, None)
+                second = next(documents, None)
+                if second is None:
+                    # the single document is the sequence of the items
+                    yield from _items(first)
+                    return
+                yield first
+                yield second
+                yield from documents
+
+    def __len__(self):
+        """Count the items by the streaming."""
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        """Return True if the data has any item."""
+        items = iter(self)
+        try:
+            return next(items, _MISSING) is not _MISSING
+        finally:
+            items.close()
+
+    def load(self):
+        """Load the whole data."""
+        if not self._loaded:
+            LOG.debug('Load the whole data file %s', self.path)
+            if self.format in ('json', 'yaml'):
+                with open(self.path, 'r', encoding=self.encoding) as file:
+                    self._value = (json.load(file) if self.format == 'json'
+                                   else yaml.safe_load(file))
+            else:
+                self._value = list(self)
+            self._loaded = True
+        return self._value
+
+    def __getitem__(self, key):
+        """Get the item of the loaded data."""
+        return self.load()[key]
+
+    def __contains__(self, item):
+        """Check the item is in the data."""
+        return any(item == value for value in self)
+
+    def __getattr__(self, name):
+        """Get the attribute of the loaded data."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = self.load()
+        if isinstance(value, dict) and name in value:
+            return value[name]
+        return getattr(value, name)
+
+    def __str__(self):
+        """Return the string of the loaded data."""
+        return str(self.load())
+
+    def __repr__(self):
+        """Return the representation which changes with the file."""
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        return 'DataSource({!r}, {!r}, {!r})'.format(
+            self.path, self.format, signature)
+
+    def __getstate__(self):
+        """Pickle the source without the loaded data."""
+        return {'path': self.path,
+                'format': self.format,
+                'encoding': self.encoding}
+
+    def __setstate__(self, state):
+        """Unpickle the source."""
+        self.__init__(state['path'], state['format'], state['encoding'])
+
+
+def _items(value):
+    """Iterate over the items of the sequence or over the single value."""
+    if isinstance(value, list):
+        yield from value
+    elif value is not None:
+        yield value
+
+
+def resolve(value, base_path):
+    """
+    Replace the references to the data files by `DataSource`.
+
+    The relative paths are relative to `base_path`.
+    The containers are processed recursively, `value` is not changed.
+    """
+    if is_data_file_reference(value):
+        path = os.path.join(base_path,
+                            os.path.expanduser(value[DATA_FILE_KEY]))
+        LOG.debug('The parameter references the data file %s', path)
+        return DataSource(path,
+                          value.get('format'),
+                          value.get('encoding', 'utf-8'))
+    if isinstance(value, dict):
+        return {key: resolve(item, base_path) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, base_path) for item in value]
+    return value
+
+
+def make_paths_absolute(value, base_path):
+    """
+    Make the paths of the references to the data files absolute.
+
+    The relative paths are relative to `base_path`.
+    The containers are processed recursively, `value` is not changed.
+    """
+    if is_data_file_reference(value):
+        value = dict(value)
+        value[DATA_FILE_KEY] = os.path.realpath(os.path.join(
+            base_path, os.path.expanduser(value[DATA_FILE_KEY])))
+        return value
+    if isinstance(value, dict):
+        return {key: make_paths_absolute(item, base_path)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [make_paths_absolute(item, base_path) for item in value]
+    return value
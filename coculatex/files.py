@@ -0,0 +1,169 @@
+"""Module contains helpers for the safe work with files."""
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX platform
+    fcntl = None
+
+
+LOG = logging.getLogger(__name__)
+
+# the temporary files are created with the mode 0600, the written files
+# get the mode of the replaced file or the default one
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# the lock files of the paths, they are not left in the output directories
+LOCK_DIRECTORY = os.path.join(
+    tempfile.gettempdir(),
+    'coculatex-locks-{}'.format(getattr(os, 'getuid', lambda: 'user')()))
+
+
+def atomic_write(path, data, encoding='utf-8'):
+    """
+    Write `data` to the file `path` atomically.
+
+    The data is written to the temporary file in the same directory
+    which is renamed to `path` after that, so the readers see either
+    the old content of the file or the new one, never a partial one.
+    `data` is `str` (encoded by `encoding`) or `bytes`.
+    """
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    temp_path = _make_temp_file(path)
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.chmod(temp_path, _file_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    LOG.debug('The file %s is written atomically (%d bytes)',
+              path, len(data))
+
+
+def atomic_copy(src, dst):
+    """
+    Copy the file `src` to `dst` atomically.
+
+    The mode and the times of `src` are copied too (see `shutil.copy2`).
+    """
+    temp_path = _make_temp_file(dst)
+    try:
+        shutil.copy2(src, temp_path)
+        os.replace(temp_path, dst)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    LOG.debug('The file %s is copied to %s atomically', src, dst)
+    return dst
+
+
+def write_changed(path, data):
+    """
+    Write `bytes` of `data` to the file `path` if its content differs.
+
+    The unchanged file keeps its modification time, so it is not
+    rebuilt. The file is replaced atomically under its lock, so
+    the concurrent writers do not mix their outputs.
+    Return True if the file is written.
+    """
+    with file_lock(lock_path(path)):
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as file:
+                    if file.read() == data:
+                        LOG.debug('The file %s is unchanged', path)
+                        return False
+        except OSError:
+            pass
+        atomic_write(path, data)
+    return True
+
+
+def lock_path(path):
+    """
+    Return the path of the lock file of the file `path`.
+
+    The lock files are in `LOCK_DIRECTORY` named by the hash of
+    the real path, so they lock the applies of the same host only.
+    """
+    os.makedirs(LOCK_DIRECTORY, mode=0o700, exist_ok=True)
+    return os.path.join(LOCK_DIRECTORY,
+                        path_digest(os.path.realpath(path)) + '.lock')
+
+
+def path_digest(path):
+    """Return the hexadecimal SHA-1 digest of the string `path`."""
+    return hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def cache_file_path(cache_path, subdirectory, themes_path):
+    """
+    Return the path of the JSON file of the themes in `themes_path`.
+
+    The file is in `subdirectory` of the cache directory `cache_path`
+    and is named by the digest of `themes_path`.
+    """
+    return os.path.join(cache_path, subdirectory,
+                        path_digest(themes_path) + '.json')
+
+
+def file_signature(path):
+    """Return the modification time and the size of `path` or None."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _make_temp_file(path):
+    """Make the temporary file next to `path` and return its path."""
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.',
+        prefix='.{}.'.format(os.path.basename(path)),
+        suffix='.tmp')
+    os.close(descriptor)
+    return temp_path
+
+
+def _file_mode(path):
+    """Return the mode of the existing file `path` or the default mode."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold the advisory lock of the file `path` in the context.
+
+    The lock file is created if it does not exist. If `shared` is True
+    then the shared lock is taken, otherwise the exclusive one.
+    On the platforms without `fcntl` the lock does nothing.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as file:
+        fcntl.flock(file.fileno(),
+                    fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,205 @@
+"""
+Module contains the queue of the batch jobs.
+
+The queue is the SQLite database, it can be on the storage shared
+by several hosts (the default rollback journal is used, because WAL
+does not work on the network file systems). Every job is the action
+(`apply` or `build`) of one target path. The workers claim the jobs
+for the lease time and renew the lease while the job runs, the job
+of the dead worker is claimed again when its lease expires. The failed
+jobs are retried until the maximal number of the attempts, the done
+jobs are kept, so adding the same targets again processes only
+the rest of them.
+"""
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+
+LOG = logging.getLogger(__name__)
+
+ACTIONS = ('apply', 'build')
+
+STATES = ('pending', 'running', 'done', 'failed')
+
+Job = namedtuple('Job', 'id action target attempts')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    action TEXT NOT NULL,
+    target TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    updated REAL,
+    UNIQUE (action, target)
+)
+'''
+
+
+def worker_name():
+    """Return the name of the worker process unique across the hosts."""
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+class JobQueue:
+    """The queue of the jobs in the SQLite database `path`."""
+
+    def __init__(self, path, timeout=60.0):
+        """Init the queue, `timeout` is the wait for the locked database."""
+        self.path = path
+        self.timeout = timeout
+        with self._connect() as connection:
+            connection.execute(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open the connection in the context of the write transaction."""
+        connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                     isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def add(self, action, targets):
+        """Add the jobs of `action` for `targets`, return the added number."""
+        if action not in ACTIONS:
+            raise ValueError('The action `{}` is unknown, the known actions: '
+                             '{}'.format(action, ', '.join(ACTIONS)))
+        now = time.time()
+        added = 0
+        with self._connect() as connection:
+            for target in targets:
+                added += connection.execute(
+                    'INSERT OR IGNORE INTO jobs (action, target, updated) '
+                    'VALUES (?, ?, ?)', (action, target, now)).rowcount
+        LOG.debug('%d jobs of %s are added to %s', added, action, self.path)
+        return added
+
+    def claim(self, owner, lease, max_attempts=None):
+        """
+        Claim the next job for `lease` seconds.
+
+        The pending jobs and the running jobs with the expired lease are
+        claimed, the least attempted first. The expired jobs attempted
+        `max_attempts` times (they may kill the worker) are failed.
+        Return `Job` or None if there are no such jobs.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            if max_attempts is not None:
+                connection.execute(
+                    'UPDATE jobs SET state = \'failed\', owner = NULL, '
+                    'error = \'the lease expired\', updated = ? '
+                    'WHERE state = \'running\' AND lease_expires < ? '
+                    'AND attempts >= ?', (now, now, max_attempts))
+            row = connection.execute(
+                'SELECT id, action, target, attempts FROM jobs '
+                'WHERE state = \'pending\' '
+                'OR (state = \'running\' AND lease_expires < ?) '
+                'ORDER BY attempts, id LIMIT 1', (now,)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE jobs SET state = \'running\', owner = ?, '
+                'lease_expires = ?, attempts = attempts + 1, updated = ? '
+                'WHERE id = ?', (owner, now + lease, now, row[0]))
+        job = Job(row[0], row[1], row[2], row[3] + 1)
+        LOG.debug('The job %s is claimed by %s', job, owner)
+        return job
+
+    def renew(self, job, owner, lease):
+        """Extend the lease of the `job`, return False if it is lost."""
+        now = time.time()
+        with self._connect() as connection:
+            return bool(connection.execute(
+                'UPDATE jobs SET lease_expires = ?, updated = ? '
+                'WHERE id = ? AND owner = ? AND state = \'running\'',
+                (now + lease, now, job.id, owner)).rowcount)
+
+    def finish(self, job, owner, error=None, max_attempts=1):
+        """
+        Finish the `job` claimed by `owner`.
+
+        The job is done if there is no `error`, otherwise it is pending
+        again until it is attempted `max_attempts` times.
+        Return False if the lease of the job is lost.
+        """
+        if error is None:
+            state = 'done'
+        elif job.attempts < max_attempts:
+            state = 'pending'
+        else:
+            state = 'failed'
+        with self._connect() as connection:
+            updated = connection.execute(
+                'UPDATE jobs SET state = ?, error = ?, owner = NULL, '
+                'lease_expires = NULL, updated = ? '
+                'WHERE id = ? AND owner = ? AND state = \'running\'',
+                (state, error, time.time(), job.id, owner)).rowcount
+        LOG.debug('The job %s is %s: %s', job, state, error)
+        return bool(updated)
+
+    @contextlib.contextmanager
+    def hold(self, job, owner, lease):
+        """Renew the lease of the `job` in the background in the context."""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(lease / 3):
+                try:
+                    if not self.renew(job, owner, lease):
+                        LOG.error('The lease of the job %s is lost', job)
+                        return
+                except sqlite3.Error as error:
+                    LOG.error('Cannot renew the lease of the job %s: %s',
+                              job, error)
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def retry(self, states=('failed',)):
+        """Make the jobs of `states` pending again, return their number."""
+        with self._connect() as connection:
+            return connection.execute(
+                'UPDATE jobs SET state = \'pending\', attempts = 0, '
+                'error = NULL, owner = NULL, lease_expires = NULL, '
+                'updated = ? WHERE state IN ({})'.format(
+                    ', '.join('?' * len(states))),
+                (time.time(),) + tuple(states)).rowcount
+
+    def progress(self):
+        """Return `dict` of the numbers of the jobs by the states."""
+        counts = dict.fromkeys(STATES, 0)
+        with self._connect() as connection:
+            for state, count in connection.execute(
+                    'SELECT state, COUNT(*) FROM jobs GROUP BY state'):
+                counts[state] = count
+        return counts
+
+    def failures(self):
+        """Return `list` of the failed jobs and their errors."""
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT action, target, attempts, error FROM jobs '
+                'WHERE state = \'failed\' ORDER BY id').fetchall()
@@ -0,0 +1,86 @@
+"""
+Module contains the walking over the library of the themes.
+
+The theme is the directory with the config `config.THEME_CONFIG_FILE_NAME`,
+its subthemes are the configs named by its `subthemes` (`.yaml` is
+added to the names without it). The values of the subtheme are merged
+with the values of the theme like by the loading of the theme:
+the `parameters` and the `include_files` are updated, the other
+values are replaced.
+"""
+import logging
+import os
+from coculatex import config
+
+
+LOG = logging.getLogger(__name__)
+
+# the values of the subtheme which update the values of the theme
+MERGED_VALUES = ('parameters', 'include_files')
+
+
+def list_themes(themes_path):
+    """
+    Return the sorted `list` of the names of the themes in `themes_path`.
+
+    Raise `OSError` if the directory cannot be listed.
+    """
+    return sorted(name for name in os.listdir(themes_path)
+                  if os.path.isdir(os.path.join(themes_path, name)))
+
+
+def subtheme_config_file(config_file):
+    """Return the name of the config file of the subtheme or None."""
+    if not isinstance(config_file, str):
+        return None
+    if not config_file.endswith('.yaml'):
+        config_file += '.yaml'
+    return config_file
+
+
+def merge_subtheme(values, subtheme_values):
+    """Return the `values` of the theme merged with the subtheme ones."""
+    subtheme_values = dict(subtheme_values)
+    merged = dict(values)
+    for key in MERGED_VALUES:
+        if (isinstance(values.get(key), dict)
+                and isinstance(subtheme_values.get(key), dict)):
+            merged[key] = dict(values[key])
+            merged[key].update(subtheme_values.pop(key))
+    merged.update(subtheme_values)
+    return merged
+
+
+def walk_theme(theme, load, report=None):
+    """
+    Iterate over the `theme` and its subthemes.
+
+    `load(name, config_file)` returns `dict` of the config file
+    (relative to the theme directory) of the (sub)theme `name` or None
+    if it cannot be loaded. `report(name, config_file, message)` is
+    called for the wrong subthemes of the theme config.
+    Yield the tuples (name, config file, values), the names of
+    the subthemes are dotted and their values are merged.
+    """
+    report = report or (lambda name, config_file, message: LOG.debug(
+        'The subtheme %s of %s is skipped: %s', name, config_file, message))
+    values = load(theme, config.THEME_CONFIG_FILE_NAME)
+    if values is None:
+        return
+    yield theme, config.THEME_CONFIG_FILE_NAME, values
+    subthemes = values.get(config.THEME_SUBTHEMES) or {}
+    if not isinstance(subthemes, dict):
+        report(theme, config.THEME_CONFIG_FILE_NAME,
+               'the subthemes are not a mapping')
+        return
+    for name, config_file in subthemes.items():
+        subtheme = '{}.{}'.format(theme, name)
+        config_file = subtheme_config_file(config_file)
+        if config_file is None:
+            report(subtheme, config.THEME_CONFIG_FILE_NAME,
+                   'the config of the subtheme is not a path')
+            continue
+        subtheme_values = load(subtheme, config_file)
+        if subtheme_values is not None:
+            yield subtheme, config_file, merge_subtheme(values,
+                                                        subtheme_values)
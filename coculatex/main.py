@@ -18,15 +18,44 @@ Make LaTeX preambules from root file using template
     >latextm --variables <path_to_variables_file> <path_to_root_file>
     >latextm -v <path_to_variables_file> <path_to_root_file>
 """
+import io
 import os
+import sys
+import csv
+import json
+import time
+import shlex
 import shutil
 import logging
+import sqlite3
+import tarfile
 import argparse
+import functools
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor)
 import yaml
 import jinja2
 # import colorama
 from coculatex import (
+    archive,
+    bibliography,
+    build,
+    cache,
+    changes,
+    completion,
+    datasource,
+    files,
+    jobs,
+    library,
+    metrics,
+    mirror,
+    preamble,
+    profiler,
+    search,
+    sweep,
     templates,
+    validation,
     config,
     exceptions)
 from coculatex import __version__ as VERSION
@@ -58,8 +87,9 @@ def __list_themes(themes_path, detail=False):
         LOG.debug('The path to the config file of the theme `%s`: %s',
                   name, config_file)
         try:
-            with open(config_file, 'r', encoding='utf8') as file:
-                theme_config = yaml.load(file, Loader=yaml.FullLoader)
+            theme_config = cache.load_yaml_file(config_file,
+                                                loader=yaml.FullLoader,
+                                                kind='theme')
         except (IOError, PermissionError) as error:
             LOG.debug('I cannot read the file %s: %s', config_file, error)
             continue
@@ -104,8 +134,8 @@ def __list_subthemes(themes_path, theme_name, detail=False):
 
         try:
             subtheme_config = theme_config.copy()
-            with open(config_path, 'r', encoding='utf8') as file:
-                subtheme_config.update(yaml.load(file, Loader=yaml.FullLoader))
+            subtheme_config.update(cache.load_yaml_file(
+                config_path, loader=yaml.FullLoader, kind='theme'))
         except (IOError, PermissionError) as error:
             LOG.debug('I cannot read the file %s: %s', config_path, error)
             continue
@@ -126,6 +156,109 @@ def __list_subthemes(themes_path, theme_name, detail=False):
             __print_theme_info(name)
 
 
+def __theme_names(themes_path):
+    """
+    Return `dict` of the names of the themes and their subthemes.
+
+    Only the configs of the themes are loaded, the subthemes are
+    the keys of their `subthemes`.
+    """
+    def load(name, config_file):
+        if config_file != config.THEME_CONFIG_FILE_NAME:
+            # only the names of the subthemes are needed
+            return {}
+        path = os.path.join(themes_path, name, config_file)
+        try:
+            theme_config = cache.load_yaml_file(path,
+                                                loader=yaml.FullLoader,
+                                                kind='theme')
+        except (IOError, PermissionError, yaml.YAMLError) as error:
+            LOG.debug('I cannot load the config %s: %s', path, error)
+            return None
+        return theme_config if isinstance(theme_config, dict) else {}
+
+    names = {}
+    try:
+        theme_names = library.list_themes(themes_path)
+    except OSError as error:
+        LOG.debug('I cannot list the themes of %s: %s', themes_path, error)
+        theme_names = []
+    for theme in theme_names:
+        walked = [name for name, _, _ in library.walk_theme(theme, load)]
+        if walked:
+            names[theme] = sorted(name.split('.', 1)[1]
+                                  for name in walked[1:])
+    return names
+
+
+def command_search(args):
+    """Handle the action `search`."""
+    index_path = None
+    if not args.no_cache:
+        index_path = search.index_path(
+            os.path.realpath(os.path.expanduser(args.cache_path)),
+            args.themes_path)
+    index = search.SearchIndex(args.themes_path, index_path)
+    if index_path is None:
+        index.update()
+    else:
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with files.file_lock(files.lock_path(index_path)):
+                index.load()
+                if not args.cached and index.update():
+                    index.save()
+        except OSError as error:
+            LOG.error('Cannot update the search index: %s', error)
+    results = index.search(args.terms, args.limit or None)
+    if args.json:
+        print(json.dumps([result._asdict() for result in results],
+                         indent=2, ensure_ascii=False))
+        return
+    for result in results:
+        print('{:>8.2f}  {}'.format(result.score, result.name))
+        if result.description:
+            print('          {}'.format(result.description))
+
+
+def command_check_themes(args):
+    """Handle the action `check-themes`."""
+    themes = sorted({theme.split('.')[0] for theme in args.themes})
+    if not themes:
+        try:
+            themes = library.list_themes(args.themes_path)
+        except OSError as error:
+            LOG.error('Cannot list the themes of %s: %s',
+                      args.themes_path, error)
+            exit(1)
+    path = None
+    if not args.no_cache:
+        path = validation.results_path(
+            os.path.realpath(os.path.expanduser(args.cache_path)),
+            args.themes_path)
+    reports = validation.check_themes(args.themes_path, themes, path,
+                                      args.jobs)
+    problems = [problem for report in reports for problem in report.problems]
+    if args.json:
+        print(json.dumps({'themes': len(reports),
+                          'cached': sum(report.cached for report in reports),
+                          'problems': [problem._asdict()
+                                       for problem in problems]},
+                         indent=2, ensure_ascii=False))
+    else:
+        for problem in problems:
+            location = problem.path
+            if problem.line:
+                location += ':{}'.format(problem.line)
+            print('{}: {}: {}'.format(location, problem.theme,
+                                      problem.message))
+        print('{} themes are checked ({} unchanged), {} problems'.format(
+            len(reports), sum(report.cached for report in reports),
+            len(problems)), file=sys.stderr)
+    if problems:
+        exit(1)
+
+
 def __print_theme_info(theme_name,
                        version=None,
                        description=None):
@@ -172,18 +305,53 @@ def command_init(args):
         output_path = os.getcwd()
         LOG.debug('The output path is not setted, It is used the current path')
     LOG.debug('The output path is %s', output_path)
-    theme_config, theme_path = __load_theme(args.theme, args.themes_path)
+    output_file, content, theme_path, theme_config = __make_project_config(
+        args.theme, args.themes_path, project_name, output_path, args.embed)
+    if not os.path.exists(output_path):
+        LOG.debug('The path `%s` is not exist. Make them.', output_path)
+        try:
+            os.makedirs(output_path)
+        except (IOError, PermissionError) as error:
+            LOG.error('Cannot make the path %s: %s', output_path, error)
+    try:
+        with open(output_file, 'w', encoding='utf-8') as file:
+            file.write(content)
+    except (IOError, PermissionError) as error:
+        LOG.error('Sorry! I cannot write the output file %s. '
+                  'Please, check the correctness and the '
+                  'existence of the path and '
+                  'the permissions it.\n'
+                  'The error: %s', output_path, error)
+    return output_file, theme_path, theme_config.get('example', None)
+
+
+def __make_project_config(theme_name,
+                          themes_path,
+                          project_name,
+                          output_path,
+                          embed):
+    """
+    Make the configuration of the new project of the theme.
+
+    If `embed` is set then the configuration is the header of the source
+    file, otherwise it is the YAML file.
+    Return the tuple (the path of the configuration file, its content,
+    the path of the theme, the config of the theme).
+    """
+    theme_config, theme_path = __load_theme(theme_name, themes_path)
     LOG.debug('The theme `%s` from the path `%s` is loaded successfully.',
-              args.theme, theme_path)
+              theme_name, theme_path)
     LOG.debug('The config of the theme: %s', theme_config)
-    theme_parameters = {'theme': args.theme, 'project-name': project_name}
-    theme_parameters.update(theme_config.get('parameters', {}))
+    theme_parameters = {'theme': theme_name, 'project-name': project_name}
+    # the data files of the theme are referenced from the project
+    theme_parameters.update(datasource.make_paths_absolute(
+        theme_config.get('parameters', {}), theme_path))
     theme_parameters['tex_preambule'] = ''
     theme_parameters['tex_options'] = []
     config_dump = yaml.dump(theme_parameters,
                             sort_keys=False,
                             allow_unicode=True)
-    if args.embed:
+    if embed:
         output_file = os.path.join(output_path, project_name + '.source.tex')
         content = ''
         for line in config_dump.split('\n'):
@@ -198,30 +366,25 @@ def command_init(args):
         content = config_dump
     LOG.debug('The output file: %s', output_file)
     LOG.debug('The content of the theme configuration:\n%s', content)
-    if not os.path.exists(output_path):
-        LOG.debug('The path `%s` is not exist. Make them.', output_path)
-        try:
-            os.makedirs(output_path)
-        except (IOError, PermissionError) as error:
-            LOG.error('Cannot make the path %s: %s', output_path, error)
-    try:
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(content)
-    except (IOError, PermissionError) as error:
-        LOG.error('Sorry! I cannot write the output file %s. '
-                  'Please, check the correctness and the '
-                  'existence of the path and '
-                  'the permissions it.\n'
-                  'The error: %s', output_path, error)
-    return output_file, theme_path, theme_config.get('example', None)
+    return output_file, content, theme_path, theme_config
 
 
 def command_apply(args):
     """Handle the `apply` action."""
+    if getattr(args, 'changed_since', None) or getattr(args, 'staged', False):
+        return __apply_changed(args)
     LOG.debug('Apply input file %s '
               'while using config file %s',
               args.input, args.config_file)
-    if args.input:
+    streaming = args.input == '-'
+    if streaming:
+        source_lines = io.TextIOWrapper(sys.stdin.buffer,
+                                        encoding='utf-8').readlines()
+        values, _ = templates.extract_variables(source_lines)
+        values = values if isinstance(values, dict) else {}
+        working_dir = ''
+        source_file = ''
+    elif args.input:
         input_file_path = os.path.realpath(os.path.expanduser(args.input))
         values = __load_config_from_input_file(input_file_path)
         working_dir = os.path.dirname(input_file_path)
@@ -239,6 +402,28 @@ def command_apply(args):
     if not working_dir:
         working_dir = os.getcwd()
     LOG.debug('The output directory: %s', working_dir)
+    if getattr(args, 'sweep', None):
+        return __apply_sweep(args, values, working_dir, source_file)
+    return __apply_theme(args, values, working_dir, source_file,
+                         source_lines if streaming else None)
+
+
+def __apply_theme(args,
+                  values,
+                  working_dir,
+                  source_file,
+                  source_lines=None,
+                  archive_files=None,
+                  archive_paths=None):
+    """
+    Apply the theme to the project of the input `values`.
+
+    `source_lines` are the lines of the source file if it is not read
+    from `working_dir`, in this case the output files are streamed.
+    If `args.archive` is set then the output files, the additional files
+    (see `__write_archive`) and the included files are written
+    to the archive.
+    """
     theme_name = values.get('theme')
     if not theme_name:
         LOG.error('Cannot apply theme because the name of '
@@ -261,8 +446,36 @@ def command_apply(args):
     LOG.debug('The theme `%s` from the path `%s` is loaded, values:\n%s',
               theme_name, theme_path, theme_values)
     theme_values.update({'theme_path': theme_path})
+    values = datasource.resolve(values, working_dir)
+    theme_values['parameters'] = datasource.resolve(
+        theme_values.get('parameters', {}), theme_path)
+    archive_path = getattr(args, 'archive', None)
+    if source_lines is None and archive_path:
+        source_lines = __read_source_lines(source_file_path)
+    if source_lines is not None or archive_path:
+        output_files = __make_output_files(project_name,
+                                           source_file,
+                                           source_lines,
+                                           theme_values,
+                                           values,
+                                           __make_render_cache(args),
+                                           __make_format_cache(args))
+        if archive_path:
+            __write_archive(args,
+                            output_files,
+                            theme_path,
+                            theme_values.pop('include_files', {}),
+                            archive_files or {},
+                            archive_paths or {})
+            return None
+        __stream_output_files(args,
+                              output_files,
+                              theme_path,
+                              theme_values.pop('include_files', {}))
+        return None
     output_path = os.path.join(working_dir, project_name + '.tex')
-    if os.path.isfile(output_path) and not args.config_file:
+    if (os.path.isfile(output_path) and not args.config_file
+            and not getattr(args, 'reapply', False)):
         LOG.error('Cannot write the output file because '
                   'the path `%s` exists. It seems that you need '
                   'change the project name: %s.',
@@ -272,18 +485,159 @@ def command_apply(args):
                          project_name,
                          source_file_path,
                          theme_values,
-                         values)
+                         values,
+                         __make_render_cache(args),
+                         __make_format_cache(args))
     include_files = theme_values.pop('include_files', {})
     LOG.debug('Copy additional theme files %s', include_files)
-    __copy_included_files(theme_path, working_dir, include_files)
+    __copy_included_files(theme_path, working_dir, include_files,
+                          project_files=[output_path, source_file_path])
     return source_file_path
 
 
+def __apply_sweep(args, values, working_dir, source_file):
+    """
+    Render the root file of the project for every row of `args.sweep`.
+
+    The theme is loaded and the template is compiled once, the rows
+    override the parameters of the project. The root files are named
+    by `args.sweep_name` and include the source file of the project.
+    """
+    theme_name = values.get('theme')
+    project_name = values.get('project-name')
+    if not (theme_name and project_name):
+        LOG.error('Cannot sweep the roster, because the directives `theme` '
+                  'and `project-name` are not specified in your '
+                  'configuration: %s', values)
+        exit(1)
+    source_file = source_file or project_name + '.source.tex'
+    theme_values, theme_path = __load_theme(theme_name, args.themes_path)
+    values = datasource.resolve(values, working_dir)
+    parameters = datasource.resolve(theme_values.get('parameters', {}),
+                                    theme_path)
+    input_tex_options = values.pop('tex_options', [])
+    parameters.update(values)
+    parameters['tex_main'] = '\\input{{{}}}'.format(source_file)
+    root_path = os.path.join(theme_path, theme_values.get('root_file', ''))
+    jinja2_variables, content = __load_root_template(root_path)
+    # the unused values are not sent to the workers
+    names = __referenced_variables(root_path,
+                                   content,
+                                   jinja2_variables,
+                                   __make_render_cache(args))
+    if names is not None:
+        parameters = {name: value for name, value in parameters.items()
+                      if name in names}
+        values = {name: value for name, value in values.items()
+                  if name in names
+                  or name in sweep.format_fields(args.sweep_name)}
+    include_files = theme_values.get('include_files', {})
+    LOG.debug('Copy additional theme files %s', include_files)
+    __copy_included_files(
+        theme_path, working_dir, include_files,
+        project_files=[os.path.join(working_dir, source_file)])
+    failed = False
+    try:
+        for result in sweep.sweep(
+                sweep.read_roster(args.sweep),
+                jobs=args.jobs,
+                root_path=root_path,
+                content=content,
+                options=jinja2_variables,
+                parameters=parameters,
+                values=values,
+                tex_options=__make_tex_options(theme_values.get('tex', {}),
+                                               input_tex_options),
+                output_dir=working_dir,
+                name_format=args.sweep_name):
+            if result.status in ('ok', 'unchanged'):
+                metrics.PROJECTS_RENDERED.inc()
+                metrics.BYTES_WRITTEN.inc(result.size)
+            else:
+                failed = True
+            print('{:8} {:>6} {}'.format(result.status, result.index,
+                                         result.name or ''))
+    except (OSError, ValueError, csv.Error) as error:
+        LOG.error('Cannot read the roster %s: %s', args.sweep, error)
+        exit(1)
+    if failed:
+        exit(1)
+
+
+def __apply_changed(args):
+    """
+    Re-apply the projects affected by the changes in git.
+
+    The projects are searched in the directory `args.input`
+    (default is the current directory) and applied in parallel.
+    """
+    path = os.path.realpath(os.path.expanduser(args.input or os.getcwd()))
+    try:
+        projects = changes.affected_projects(path,
+                                             args.themes_path
+                                             or config.THEMES_DIRECTORY,
+                                             since=args.changed_since,
+                                             staged=args.staged)
+    except changes.GitError as error:
+        LOG.error('Cannot detect the changes of %s: %s', path, error)
+        exit(1)
+    LOG.debug('The affected projects: %s', projects)
+    if not projects:
+        print('There are no changed projects in {}'.format(path))
+        return []
+    with ProcessPoolExecutor(max_workers=args.jobs,
+                             initializer=__init_apply_worker,
+                             initargs=(args,)) as executor:
+        results = []
+        for status, snapshot in executor.map(
+                functools.partial(metrics.call_measured, __apply_project),
+                [args] * len(projects),
+                projects):
+            metrics.REGISTRY.merge(snapshot)
+            results.append(status)
+    for project, status in zip(projects, results):
+        print('{:8} {}'.format(status,
+                               project.config_file or project.input))
+    if any(status != 'ok' for status in results):
+        exit(1)
+    return [project.config_file or project.input for project in projects]
+
+
+def __init_apply_worker(args):
+    """Init the process which applies the projects."""
+    metrics.init_worker(__metrics_enabled(args))
+    cache.set_yaml_cache(__make_yaml_cache(args))
+    cache.set_fragment_cache(__make_fragment_cache(args))
+    mirror.set_themes_mirror(__make_themes_mirror(args))
+
+
+def __apply_project(args, project):
+    """Apply the theme to the `project` and return the status."""
+    project_args = argparse.Namespace(**vars(args))
+    project_args.config_file = project.config_file
+    project_args.input = project.input
+    project_args.changed_since = None
+    project_args.staged = False
+    project_args.reapply = True
+    try:
+        command_apply(project_args)
+    except SystemExit:
+        return 'failed'
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.error('Cannot apply the project %s: %s',
+                  project.config_file or project.input, error)
+        return 'error'
+    return 'ok'
+
+
 def command_example(args):
     """Handle the `example` action."""
     if not args.project_name:
         args.project_name = '{}.example'.format(args.theme)
     LOG.debug('Use the follow project name: %s', args.project_name)
+    if getattr(args, 'archive', None):
+        __archive_example(args)
+        return
     config_path, theme_path, example_path = command_init(args)
     working_dir = os.path.dirname(config_path)
     config_file_name = os.path.basename(config_path)
@@ -296,11 +650,15 @@ def command_example(args):
     if args.embed:
         source_file = command_apply(
             argparse.Namespace(config_file=None, input=config_path,
-                               themes_path=args.themes_path))
+                               themes_path=args.themes_path,
+                               cache_path=args.cache_path,
+                               no_cache=args.no_cache))
     else:
         source_file = command_apply(
             argparse.Namespace(config_file=config_path, input=None,
-                               themes_path=args.themes_path))
+                               themes_path=args.themes_path,
+                               cache_path=args.cache_path,
+                               no_cache=args.no_cache))
     LOG.debug('The theme is applied successfully, source_file: %s',
               source_file)
     try:
@@ -317,11 +675,25 @@ def command_example(args):
     LOG.debug('Write the example source file from %s to %s ',
               example_source, source_file)
     try:
-        with open(example_source, 'r', encoding='utf-8') as src:
-            with open(source_file, 'a', encoding='utf-8') as dst:
-                dst.write(src.read())
+        with open(example_source, 'rb') as src:
+            data = src.read()
+        with files.file_lock(files.lock_path(source_file)):
+            with open(source_file, 'rb') as dst:
+                header = dst.read()
+            files.atomic_write(source_file, header + data)
+        metrics.BYTES_WRITTEN.inc(len(data))
     except (FileNotFoundError, PermissionError, IOError) as error:
         LOG.error('Cannot write the example source file: %s', error)
+    # the citations of the example are known only now
+    theme_values, theme_directory = __load_theme(args.theme,
+                                                 args.themes_path)
+    __copy_included_files(
+        theme_directory,
+        working_dir,
+        __cited_included_files(theme_values.get('include_files', {})),
+        project_files=[os.path.join(working_dir,
+                                    args.project_name + '.tex'),
+                       source_file])
     LOG.debug('Copy the add ons files from %s', example_path_directory)
     try:
         for src, dst in [(os.path.join(example_path_directory, file),
@@ -329,91 +701,709 @@ def command_example(args):
                          for file in os.listdir(example_path_directory)
                          if file != 'source.tex']:
             if os.path.isdir(src):
-                shutil.copytree(src, dst)
+                shutil.copytree(src, dst, copy_function=__copy_file)
             else:
-                shutil.copy2(src, dst)
+                __copy_file(src, dst)
     except (FileNotFoundError, IOError) as error:
         LOG.debug('Cannot copy add ons files: %s', error)
     LOG.debug('The example has done successfully')
     return
 
 
-def __copy_included_files(theme_path, working_dir, include_files):
-    """Copy the included files to a project."""
+def __archive_example(args):
+    """Write the example of the theme to the archive `args.archive`."""
+    config_file, content, theme_path, theme_config = __make_project_config(
+        args.theme, args.themes_path, args.project_name, '', args.embed)
+    example_source = ''
+    archive_paths = {}
+    try:
+        example_path_directory = os.path.join(
+            theme_path,
+            os.path.normpath(theme_config.get('example', None)))
+    except TypeError:
+        LOG.debug('The theme %s does not provide any example',
+                  args.theme)
+    else:
+        try:
+            with open(os.path.join(example_path_directory, 'source.tex'),
+                      'r', encoding='utf-8') as file:
+                example_source = file.read()
+        except (FileNotFoundError, PermissionError, IOError) as error:
+            LOG.error('Cannot read the example source file: %s', error)
+        try:
+            archive_paths = {
+                file: os.path.join(example_path_directory, file)
+                for file in sorted(os.listdir(example_path_directory))
+                if file != 'source.tex'}
+        except (FileNotFoundError, IOError) as error:
+            LOG.debug('Cannot list add ons files: %s', error)
+    if args.embed:
+        values, _ = templates.extract_variables(content.splitlines(True))
+        source_file = os.path.basename(config_file)
+        source_lines = (content + example_source).splitlines(True)
+        archive_files = {}
+    else:
+        values = yaml.safe_load(content)
+        source_file = ''
+        source_lines = example_source.splitlines(True)
+        archive_files = {os.path.basename(config_file): content}
+    __apply_theme(args,
+                  values,
+                  os.getcwd(),
+                  source_file,
+                  source_lines,
+                  archive_files,
+                  archive_paths)
+
+
+def command_build(args):
+    """Handle the `build` action."""
+    roots = []
+    for path in args.projects:
+        roots.extend(build.find_roots(
+            os.path.realpath(os.path.expanduser(path))))
+    LOG.debug('The root files for the build: %s', roots)
+    if not roots:
+        LOG.error('There are no projects to build in %s', args.projects)
+        exit(1)
+    latexmk = None
+    if args.latexmk:
+        latexmk = shutil.which(args.latexmk_path)
+        if not latexmk:
+            LOG.error('The executable `%s` is not found', args.latexmk_path)
+            exit(1)
+    results = build.build_projects(roots,
+                                   jobs=args.jobs,
+                                   program=args.program,
+                                   latexmk=latexmk,
+                                   timeout=args.timeout,
+                                   force=args.force)
+    for result in results:
+        print('{status:8} {elapsed:8.2f}s  {root}'.format(
+            **result._asdict()))
+        if result.status not in ('ok', 'skipped'):
+            print('         see the log: {}'.format(result.log_path))
+    if any(result.status not in ('ok', 'skipped') for result in results):
+        exit(1)
+
+
+def command_queue_add(args):
+    """Handle the action `queue add`."""
+    targets = []
+    for path in args.targets:
+        path = os.path.realpath(os.path.expanduser(path))
+        if args.action == 'build':
+            targets.extend(build.find_roots(path))
+        elif os.path.isdir(path):
+            try:
+                targets.extend(project.config_file or project.input
+                               for project in changes.find_projects(path))
+            except changes.GitError as error:
+                LOG.error('Cannot find the projects of %s: %s', path, error)
+                exit(1)
+        else:
+            targets.append(path)
+    try:
+        added = __open_job_queue(args).add(args.action, targets)
+    except sqlite3.Error as error:
+        LOG.error('Cannot add the jobs to %s: %s', args.database, error)
+        exit(1)
+    print('{} of {} jobs are added'.format(added, len(targets)))
+
+
+def command_queue_status(args):
+    """Handle the action `queue status`."""
+    try:
+        queue = __open_job_queue(args)
+        progress = queue.progress()
+        failures = queue.failures()
+    except sqlite3.Error as error:
+        LOG.error('Cannot read the jobs of %s: %s', args.database, error)
+        exit(1)
+    total = sum(progress.values())
+    for state, count in progress.items():
+        print('{:8} {:>8}'.format(state, count))
+    print('{:8} {:>8} ({:.1f}% done)'.format(
+        'total', total, 100.0 * progress['done'] / total if total else 100.0))
+    for action, target, attempts, error in failures:
+        print('failed   {} {} after {} attempts: {}'.format(
+            action, target, attempts, error))
+
+
+def command_queue_retry(args):
+    """Handle the action `queue retry`."""
+    try:
+        retried = __open_job_queue(args).retry()
+    except sqlite3.Error as error:
+        LOG.error('Cannot retry the jobs of %s: %s', args.database, error)
+        exit(1)
+    print('{} failed jobs are pending again'.format(retried))
+
+
+def command_worker(args):
+    """
+    Handle the action `worker`.
+
+    The jobs are claimed from the queue and run one by one until there
+    are no pending jobs; with `args.wait` the worker waits for the jobs
+    running by the other workers too, because they can be abandoned.
+    """
+    latexmk = None
+    if args.latexmk:
+        latexmk = shutil.which(args.latexmk_path)
+        if not latexmk:
+            LOG.error('The executable `%s` is not found', args.latexmk_path)
+            exit(1)
+    owner = jobs.worker_name()
+    failed = False
+    try:
+        queue = __open_job_queue(args)
+        while True:
+            job = queue.claim(owner, args.lease, args.max_attempts)
+            if job is None:
+                if args.wait and queue.progress()['running']:
+                    time.sleep(args.poll_interval)
+                    continue
+                break
+            with queue.hold(job, owner, args.lease):
+                error = __run_job(args, job, latexmk)
+            queue.finish(job, owner, error, args.max_attempts)
+            failed = failed or error is not None
+            print('{:8} {} {}'.format('ok' if error is None else 'failed',
+                                      job.action, job.target))
+    except sqlite3.Error as error:
+        LOG.error('Cannot use the job queue %s: %s', args.database, error)
+        exit(1)
+    if failed:
+        exit(1)
+
+
+def __open_job_queue(args):
+    """Open the job queue of `args.database`."""
+    return jobs.JobQueue(os.path.realpath(os.path.expanduser(args.database)))
+
+
+def __run_job(args, job, latexmk=None):
+    """Run the `job` and return None or `str` of the error."""
+    if job.action == 'apply':
+        config_file = job.target if job.target.endswith('.yaml') else None
+        status = __apply_project(args, changes.Project(
+            config_file, None if config_file else job.target, None, set()))
+        return None if status == 'ok' else 'apply {}'.format(status)
+    result = build.build_project(job.target,
+                                 program=args.program,
+                                 latexmk=latexmk,
+                                 timeout=args.timeout,
+                                 force=args.force)
+    if result.status in ('ok', 'skipped'):
+        return None
+    return 'build {}, see the log: {}'.format(result.status, result.log_path)
+
+
+def command_profile_theme(args):
+    """Handle the `profile-theme` action."""
+    values = {}
+    working_dir = ''
+    if args.input:
+        input_file_path = os.path.realpath(os.path.expanduser(args.input))
+        values = __load_config_from_input_file(input_file_path)
+        working_dir = os.path.dirname(input_file_path)
+    if args.config_file:
+        config_file_path = os.path.realpath(
+            os.path.expanduser(args.config_file))
+        values.update(__load_config_from_config_file(config_file_path))
+        working_dir = working_dir or os.path.dirname(config_file_path)
+    theme_name = args.theme or values.get('theme')
+    if not theme_name:
+        LOG.error('Cannot profile the theme, because its name is not '
+                  'specified by the argument or the directive `theme`')
+        exit(1)
+    theme_values, theme_path = __load_theme(theme_name, args.themes_path)
+    # the sample variables are the parameters of the theme
+    parameters = datasource.resolve(theme_values.get('parameters', {}),
+                                    theme_path)
+    values.pop('tex_options', None)
+    parameters.update(datasource.resolve(values,
+                                         working_dir or os.getcwd()))
+    parameters['tex_main'] = '\\input{{{}.source.tex}}'.format(
+        values.get('project-name', 'project'))
+    root_file = theme_values.get('root_file', '')
+    root_path = os.path.join(theme_path, root_file)
+    jinja2_variables, content = __load_root_template(root_path)
+    profile = profiler.Profile()
+    environment = profiler.ProfilingEnvironment(
+        profile,
+        root_name=root_file,
+        loader=templates.TemplateLoader(os.path.dirname(root_path)),
+        **jinja2_variables)
+    label = 'template@{}'.format(root_file)
+    try:
+        template = environment.from_string(content)
+        for _ in range(args.repeat):
+            profile.enter(label)
+            profile.exit(template.render(**parameters), label)
+    except jinja2.exceptions.TemplateError as error:
+        LOG.error('Cannot render the theme %s: %s', theme_name, error)
+        exit(1)
+    profile.write_table(sys.stdout, args.sort)
+    if args.flamegraph:
+        try:
+            with open(args.flamegraph, 'w', encoding='utf-8') as file:
+                profile.write_folded(file)
+        except OSError as error:
+            LOG.error('Cannot write the flamegraph file %s: %s',
+                      args.flamegraph, error)
+            exit(1)
+
+
+def __copy_included_files(theme_path,
+                          working_dir,
+                          include_files,
+                          project_files=(),
+                          project_texts=()):
+    """
+    Copy the included files to a project.
+
+    The citations of the cited-only bibliographies are searched
+    in the files `project_files` (the root and the source files)
+    and in the strings `project_texts`.
+    """
+    citations = False
     try:
         for dst, src in include_files.items():
+            src, cited_only = __parse_included_file(src)
             try:
+                if cited_only:
+                    if citations is False:
+                        citations = bibliography.find_citations(
+                            project_files, project_texts)
+                    dst_path = os.path.join(working_dir, dst)
+                    with files.file_lock(files.lock_path(dst_path)):
+                        bibliography.write_cited_entries(
+                            os.path.join(theme_path, src),
+                            dst_path,
+                            citations)
+                    continue
                 try:
                     shutil.copytree(
                         os.path.join(theme_path, src),
-                        os.path.join(working_dir, dst))
+                        os.path.join(working_dir, dst),
+                        copy_function=__copy_file,
+                        dirs_exist_ok=True)
                 except NotADirectoryError:
-                    shutil.copy2(
+                    __copy_file(
                         os.path.join(theme_path, src),
                         os.path.join(working_dir, dst))
-            except (FileNotFoundError, IOError, PermissionError) as error:
+            except (FileNotFoundError, IOError, PermissionError,
+                    TypeError) as error:
                 LOG.debug('Cannot copy path `%s` to `%s` because: %s',
-                          os.path.join(theme_path, src),
-                          os.path.join(working_dir, dst),
-                          error)
+                          src, dst, error)
     except AttributeError:
         LOG.debug('Directive the `include_files` has wrong format: %s. '
                   'Therefore additional files was not copied.',
                   include_files)
 
 
+def __parse_included_file(src):
+    """
+    Parse the source of the included file.
+
+    The source is the path in the theme or `dict` with the path `file`
+    and the flag `cited_only`; if the flag is set then only the entries
+    of the bibliography file cited by the project are included.
+    Return the tuple (path, cited_only).
+    """
+    if isinstance(src, dict):
+        return src.get('file'), bool(src.get('cited_only', False))
+    return src, False
+
+
+def __cited_included_files(include_files):
+    """Return `dict` of the cited-only bibliographies of `include_files`."""
+    try:
+        return {dst: src for dst, src in include_files.items()
+                if __parse_included_file(src)[1]}
+    except AttributeError:
+        return {}
+
+
+def __copy_file(src, dst):
+    """Copy the file `src` to `dst` atomically under its lock and count it."""
+    with files.file_lock(files.lock_path(dst)):
+        result = files.atomic_copy(src, dst)
+    metrics.FILES_COPIED.inc()
+    return result
+
+
 def __write_output_files(output_path,
                          project_name,
                          source_file_path,
                          theme_values,
-                         input_values):
-    """Write output files."""
+                         input_values,
+                         render_cache=None,
+                         format_cache=None):
+    """
+    Write output files.
+
+    If `render_cache` is passed then the rendered root file is taken
+    from it when it is possible.
+    If `format_cache` is passed then the preamble of the root file
+    is moved to the separate file and precompiled to the TeX format.
+    """
     LOG.debug('The output path for the root tex file: %s', output_path)
-    tex_options_string = __make_tex_options(
-        theme_values.get('tex', {}),
-        input_values.pop('tex_options', []))
-    LOG.debug('The magic TeX options string: %s', tex_options_string)
-    parameters = theme_values.pop('parameters', {})
-    parameters.update(input_values)
-    tex_main_string = '\\input{{{}}}'.format(
-        os.path.basename(source_file_path))
-    parameters.update({'tex_main': tex_main_string})
-    LOG.debug('The parameters for interpolation: %s', parameters)
-    latex_string = __make_latex(
-        os.path.join(
-            theme_values.pop('theme_path', ''),
-            theme_values.pop('root_file', '')),
-        parameters)
-    LOG.debug('The result of interpolation: %s', latex_string)
-    try:
-        with open(output_path, 'w', encoding='utf-8') as file:
-            file.write(tex_options_string)
-            file.write(latex_string)
-    except (OSError, FileNotFoundError, PermissionError) as error:
-        LOG.error('Cannot write file %s: %s', output_path, error)
-    latex_root_magic = '%!TEX root={}.tex'.format(project_name)
+    source_lines = __read_source_lines(source_file_path)
+    output_files = __make_output_files(project_name,
+                                       os.path.basename(source_file_path),
+                                       source_lines,
+                                       theme_values,
+                                       input_values,
+                                       render_cache,
+                                       format_cache)
+    for name, content in output_files.items():
+        path = os.path.join(os.path.dirname(output_path), name)
+        try:
+            __write_changed_file(path, content.encode('utf-8'))
+        except (OSError, FileNotFoundError, PermissionError) as error:
+            LOG.error('Cannot write file %s: %s', path, error)
+
+
+def __write_changed_file(path, data):
+    """
+    Write `bytes` of `data` to the file `path` if its content differs.
+
+    See `files.write_changed`. Return True if the file is written.
+    """
+    if not files.write_changed(path, data):
+        return False
+    metrics.BYTES_WRITTEN.inc(len(data))
+    return True
+
+
+def __read_source_lines(source_file_path):
+    """
+    Read the lines of the source file.
+
+    Return empty `list` if the file does not exist and None if it cannot
+    be read.
+    """
     try:
         with open(source_file_path, 'r', encoding='utf8') as file:
-            lines = file.readlines()
+            return file.readlines()
     except FileNotFoundError:
-        try:
-            with open(source_file_path, 'w', encoding='utf8') as file:
-                file.write(latex_root_magic + '\n')
-        except (OSError, PermissionError) as error:
-            LOG.debug('Cannot add latex magic root to the file %s: %s',
-                      source_file_path, error)
+        return []
     except (OSError, PermissionError) as error:
         LOG.debug('Cannot add latex magic root to the file %s: %s',
                   source_file_path, error)
+        return None
+
+
+def __make_output_files(project_name,
+                        source_file,
+                        source_lines,
+                        theme_values,
+                        input_values,
+                        render_cache=None,
+                        format_cache=None):
+    """
+    Make the contents of the output files.
+
+    `source_lines` are the lines of the source file `source_file`,
+    it is None if the source file must not be written.
+    The root file of the theme and its additional root files
+    (`root_files`) are rendered concurrently by the shared environment.
+    Return `dict` which maps the names of the output files
+    to their contents, the root file is the first.
+    """
+    theme_tex_options = theme_values.get('tex', {})
+    input_tex_options = input_values.pop('tex_options', [])
+    parameters = theme_values.pop('parameters', {})
+    parameters.update(input_values)
+    tex_main_string = '\\input{{{}}}'.format(source_file)
+    parameters.update({'tex_main': tex_main_string})
+    LOG.debug('The parameters for interpolation: %s', parameters)
+    theme_path = theme_values.pop('theme_path', '')
+    root_file = theme_values.pop('root_file', '')
+    roots = [(project_name + '.tex', root_file)] + __root_files(
+        theme_values.pop('root_files', {}), project_name, input_values)
+    environments = {}
+
+    def render(root):
+        with metrics.RENDER_SECONDS.time():
+            return __make_latex(os.path.join(theme_path, root[1]),
+                                parameters,
+                                render_cache,
+                                environments)
+
+    if len(roots) > 1:
+        with ThreadPoolExecutor(max_workers=len(roots)) as executor:
+            latex_strings = list(executor.map(render, roots))
     else:
+        latex_strings = [render(roots[0])]
+    metrics.PROJECTS_RENDERED.inc()
+    latex_string = latex_strings[0]
+    LOG.debug('The result of interpolation: %s', latex_string)
+    root_tex_options_string = __make_tex_options(theme_tex_options,
+                                                 input_tex_options)
+    preamble_file = None
+    if format_cache is not None:
+        latex_string, theme_tex_options, preamble_file = (
+            __precompile_preamble(format_cache,
+                                  project_name,
+                                  theme_path,
+                                  root_file,
+                                  theme_tex_options,
+                                  latex_string))
+    # the end of the static preamble is not the part of the outputs
+    latex_string = preamble.strip_static_end(latex_string)
+    tex_options_string = __make_tex_options(theme_tex_options,
+                                            input_tex_options)
+    LOG.debug('The magic TeX options string: %s', tex_options_string)
+    output_files = {project_name + '.tex': tex_options_string + latex_string}
+    if preamble_file is not None:
+        output_files[project_name + config.PREAMBLE_FILE_SUFFIX] = (
+            preamble_file)
+    for (name, _), content in zip(roots[1:], latex_strings[1:]):
+        output_files[name] = (root_tex_options_string
+                              + preamble.strip_static_end(content))
+    if source_lines is not None:
+        latex_root_magic = '%!TEX root={}.tex'.format(project_name)
+        output_files[source_file] = ''.join(
+            [latex_root_magic + '\n']
+            + [line for line in source_lines
+               if not line.startswith('%!TEX')])
+    return output_files
+
+
+def __root_files(root_files, project_name, input_values):
+    """
+    Return `list` of the output names and the additional root files.
+
+    `root_files` maps the patterns of the output names to the templates,
+    the patterns are formatted by the input values and `project-name`.
+    """
+    if not isinstance(root_files, dict):
+        LOG.error('The additional root files of the theme must be '
+                  'the mapping of the output names to the templates: %s',
+                  root_files)
+        return []
+    values = dict(input_values)
+    values['project-name'] = project_name
+    roots = []
+    for pattern, template in root_files.items():
         try:
-            with open(source_file_path, 'w', encoding='utf8') as file:
-                file.write(latex_root_magic + '\n')
-                file.writelines([line for line in lines
-                                 if not line.startswith('%!TEX')])
+            name = str(pattern).format_map(values)
+        except (KeyError, IndexError, ValueError) as error:
+            LOG.error('Cannot make the output name of the root file %s '
+                      'by the pattern `%s`: %s', template, pattern, error)
+            continue
+        if not name or os.path.basename(name) != name:
+            LOG.error('The output name `%s` of the root file %s is not '
+                      'the file name', name, template)
+            continue
+        roots.append((name, template))
+    return roots
+
+
+def __precompile_preamble(format_cache,
+                          project_name,
+                          theme_path,
+                          root_file,
+                          tex_options,
+                          latex_string):
+    """
+    Move the preamble of `latex_string` to the precompiled format.
+
+    The root file loads the preamble file itself when it is compiled
+    without the format.
+    Return the body of the root file, the TeX options which point
+    the compiler at the format and the content of the preamble file
+    (None if the preamble is not moved).
+    """
+    parts = preamble.split_preamble(latex_string)
+    if parts is None:
+        LOG.error('Cannot precompile the preamble of %s, because there is '
+                  'no `\\begin{document}` in it', project_name)
+        return latex_string, tex_options, None
+    preamble_string, body = parts
+    # only the static part of the preamble is shared by the projects
+    preamble_string, project_preamble = preamble.split_static(
+        preamble_string)
+    latex_string = preamble.make_body(
+        project_name + config.PREAMBLE_FILE_SUFFIX, project_preamble + body)
+    format_path = format_cache.get_format(
+        theme_path,
+        root_file,
+        tex_options.get('program', config.BUILD_DEFAULT_PROGRAM),
+        preamble_string)
+    preamble_file = preamble.make_preamble_file(preamble_string)
+    if format_path is None:
+        return latex_string, tex_options, preamble_file
+    LOG.debug('The preamble of %s is precompiled to %s',
+              project_name, format_path)
+    options = tex_options.get('options', [])
+    if not isinstance(options, list):
+        options = [options]
+    tex_options = dict(tex_options)
+    tex_options['options'] = options + [
+        '-fmt={}'.format(shlex.quote(format_path))]
+    return latex_string, tex_options, preamble_file
+
+
+def __stream_output_files(args,
+                          output_files,
+                          theme_path,
+                          include_files):
+    """
+    Stream the output files of the project read from stdin.
+
+    The root file is written to stdout. The other output files
+    and the included files are written to the directory `args.emit_dir`
+    or to the tar stream `args.emit_tar`. If the tar stream is stdout
+    then the root file is its member too.
+    """
+    output_files = list(output_files.items())
+    root_name, root = output_files[0]
+    if args.emit_tar == '-':
+        __write_tar(sys.stdout.buffer, output_files, theme_path, include_files)
+        sys.stdout.buffer.flush()
+        return
+    data = root.encode('utf-8')
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+    metrics.BYTES_WRITTEN.inc(len(data))
+    LOG.debug('The root file %s is written to stdout', root_name)
+    if args.emit_tar:
+        try:
+            with open(args.emit_tar, 'wb') as file:
+                __write_tar(file, output_files[1:], theme_path, include_files)
         except (OSError, PermissionError) as error:
-            LOG.debug('Cannot add latex magic root to the file %s: %s',
-                      source_file_path, error)
+            LOG.error('Cannot write the tar stream %s: %s',
+                      args.emit_tar, error)
+    elif args.emit_dir:
+        emit_dir = os.path.realpath(os.path.expanduser(args.emit_dir))
+        try:
+            os.makedirs(emit_dir, exist_ok=True)
+        except (OSError, PermissionError) as error:
+            LOG.error('Cannot make the path %s: %s', emit_dir, error)
+            return
+        for name, content in output_files[1:]:
+            path = os.path.join(emit_dir, name)
+            try:
+                __write_changed_file(path, content.encode('utf-8'))
+            except (OSError, PermissionError) as error:
+                LOG.error('Cannot write file %s: %s', path, error)
+        __copy_included_files(
+            theme_path, emit_dir, include_files,
+            project_texts=[content for _, content in output_files])
+
+
+def __add_tar_member(tar, name, data):
+    """Add the member `name` with `bytes` of `data` to the tar stream."""
+    tar_info = tarfile.TarInfo(name)
+    tar_info.size = len(data)
+    tar_info.mtime = int(time.time())
+    tar_info.mode = 0o644
+    tar.addfile(tar_info, io.BytesIO(data))
+    metrics.BYTES_WRITTEN.inc(len(data))
+
+
+def __write_tar(fileobj, output_files, theme_path, include_files):
+    """Write the output files and the included files as the tar stream."""
+    def count_file(tar_info):
+        """Count the copied regular files."""
+        if tar_info.isfile():
+            metrics.FILES_COPIED.inc()
+        return tar_info
+
+    with tarfile.open(fileobj=fileobj, mode='w|') as tar:
+        for name, content in output_files:
+            __add_tar_member(tar, name, content.encode('utf-8'))
+        try:
+            items = list(include_files.items())
+        except AttributeError:
+            LOG.debug('Directive the `include_files` has wrong format: %s. '
+                      'Therefore additional files was not copied.',
+                      include_files)
+            items = []
+        citations = False
+        for dst, src in items:
+            src, cited_only = __parse_included_file(src)
+            try:
+                if cited_only:
+                    if citations is False:
+                        citations = bibliography.find_text_citations(
+                            line
+                            for _, content in output_files
+                            for line in content.splitlines())
+                    __add_tar_member(tar, dst,
+                                     bibliography.extract_cited_entries(
+                                         os.path.join(theme_path, src),
+                                         citations))
+                    continue
+                tar.add(os.path.join(theme_path, src), arcname=dst,
+                        filter=count_file)
+            except (FileNotFoundError, IOError, PermissionError,
+                    TypeError) as error:
+                LOG.debug('Cannot add path `%s` to the tar stream: %s',
+                          src, error)
+
+
+def __write_archive(args,
+                    output_files,
+                    theme_path,
+                    include_files,
+                    archive_files,
+                    archive_paths):
+    """
+    Write the output files and the included files to the archive.
+
+    The path of the archive is `args.archive`, its format is defined
+    by the extension. `archive_files` maps the names of the additional
+    files to their contents, `archive_paths` maps them to their paths.
+    """
+    citations = False
+    try:
+        with archive.ArchiveFile(args.archive,
+                                 __make_archive_cache(args)) as project:
+            for name, content in output_files.items():
+                project.add_bytes(name, content.encode('utf-8'))
+            for name, content in archive_files.items():
+                project.add_bytes(name, content.encode('utf-8'))
+            for name, path in archive_paths.items():
+                project.add_path(path, name)
+            try:
+                items = list(include_files.items())
+            except AttributeError:
+                LOG.debug('Directive the `include_files` has wrong format: '
+                          '%s. Therefore additional files was not copied.',
+                          include_files)
+                items = []
+            for dst, src in items:
+                if dst in archive_files or dst in archive_paths:
+                    LOG.debug('The included file %s is overridden', dst)
+                    continue
+                src, cited_only = __parse_included_file(src)
+                try:
+                    if not cited_only:
+                        project.add_path(os.path.join(theme_path, src), dst)
+                        continue
+                    if citations is False:
+                        citations = bibliography.find_text_citations(
+                            line
+                            for content in output_files.values()
+                            for line in content.splitlines())
+                    project.add_bytes(dst, bibliography.extract_cited_entries(
+                        os.path.join(theme_path, src), citations))
+                except (FileNotFoundError, IOError, PermissionError,
+                        TypeError) as error:
+                    LOG.debug('Cannot add path `%s` to the archive: %s',
+                              src, error)
+    except ValueError as error:
+        LOG.error('Cannot write the archive: %s', error)
+        exit(1)
+    except (OSError, PermissionError) as error:
+        LOG.error('Cannot write the archive %s: %s', args.archive, error)
+        exit(1)
 
 
 def __load_config_from_input_file(input_file):
@@ -441,8 +1431,7 @@ def __load_config_from_config_file(config_file):
     LOG.debug('Load the values from the config file: %s',
               config_file)
     try:
-        with open(config_file, 'r', encoding='utf-8') as file:
-            config_values = yaml.safe_load(file)
+        config_values = cache.load_yaml_file(config_file)
     except (FileNotFoundError, OSError) as error:
         LOG.debug('Cannot open the file %s, error: %s',
                   config_file, error)
@@ -518,6 +1507,50 @@ def create_argparser():
                                 'path to the directory for the themes'
                                 '(default is `{}`)'
                                 ''.format(config.THEMES_DIRECTORY)))
+    arg_parser.add_argument('--cache-path',
+                            action='store',
+                            default=config.CACHE_DIRECTORY,
+                            help=(
+                                'path to the cache directory '
+                                '(default is `{}`)'
+                                ''.format(config.CACHE_DIRECTORY)))
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            default=False,
+                            help='do not use the render and YAML caches')
+    arg_parser.add_argument('--fragment-cache', action='store_true',
+                            default=False,
+                            help=('keep the rendered `cache` blocks of the '
+                                  'templates in the cache directory, not only '
+                                  'in the memory of the process'))
+    arg_parser.add_argument('--mirror', action='store_true',
+                            default=False,
+                            help=('serve the themes from the local mirror '
+                                  'which is revalidated against the themes '
+                                  'path in the interval'))
+    arg_parser.add_argument('--mirror-path', action='store',
+                            default=None,
+                            help=('path to the directory of the mirror, '
+                                  'e.g. on tmpfs (default is `{}` in the '
+                                  'cache directory), it enables the mirror'
+                                  ''.format(config.MIRROR_SUBDIRECTORY)))
+    arg_parser.add_argument('--mirror-interval', action='store', type=float,
+                            default=config.MIRROR_REVALIDATE_INTERVAL,
+                            help=('the interval of the revalidation of '
+                                  'the mirror in seconds (default is {})'
+                                  ''.format(
+                                      config.MIRROR_REVALIDATE_INTERVAL)))
+    arg_parser.add_argument('--metrics-file', action='store',
+                            default=None,
+                            help=('write the metrics in the Prometheus text '
+                                  'format to the file at the end of the run'))
+    arg_parser.add_argument('--metrics-json', action='store',
+                            default=None,
+                            help=('write the metrics as JSON to the file '
+                                  '(`-` is stderr) at the end of the run'))
+    arg_parser.add_argument('--metrics-port', action='store', type=int,
+                            default=None,
+                            help=('serve the metrics by HTTP on the local '
+                                  'port while the program is running'))
     arg_parser.set_defaults(func=show_version)
     subparsers = arg_parser.add_subparsers()
     parser_list = subparsers.add_parser(
@@ -531,6 +1564,41 @@ def create_argparser():
                              help=('the name of theme; '
                                    'allow you to list of the subthemes'))
     parser_list.set_defaults(func=handler_list)
+    parser_search = subparsers.add_parser(
+        'search',
+        description=('Search the themes and the subthemes by the words '
+                     'of their names, descriptions, parameters and root '
+                     'files'))
+    parser_search.add_argument('--json', action='store_true',
+                               default=False,
+                               help=('print the results as JSON'))
+    parser_search.add_argument('--limit', '-n', type=int, action='store',
+                               default=20,
+                               help=('the maximal number of the results, '
+                                     '0 is all (default is 20)'))
+    parser_search.add_argument('--cached', action='store_true',
+                               default=False,
+                               help=('use the index without checking '
+                                     'the themes for the changes'))
+    parser_search.add_argument('terms', action='store', nargs='+', type=str,
+                               help=('the words to search'))
+    parser_search.set_defaults(func=command_search)
+    parser_check = subparsers.add_parser(
+        'check-themes',
+        description=('Check that the themes and the subthemes load: '
+                     'the configs parse, the root files exist and compile '
+                     'and the included files exist. Nothing is written, '
+                     'the unchanged themes are not checked again'))
+    parser_check.add_argument('--jobs', '-j', type=int, action='store',
+                              default=None,
+                              help=('the number of the parallel jobs '
+                                    '(default is the number of CPUs)'))
+    parser_check.add_argument('--json', action='store_true', default=False,
+                              help=('print the problems as JSON'))
+    parser_check.add_argument('themes', action='store', nargs='*', type=str,
+                              help=('the names of the themes (default is '
+                                    'all the themes)'))
+    parser_check.set_defaults(func=command_check_themes)
     parser_init = subparsers.add_parser(
         'init',
         description=('Create the config file from the theme. '
@@ -558,9 +1626,70 @@ def create_argparser():
                               type=str, action='store',
                               help=('yaml configuration file '
                                     'for your project'))
+    parser_apply.add_argument('--emit-dir', type=str, action='store',
+                              default=None,
+                              help=('the directory for the source and the '
+                                    'included files when the input is '
+                                    'stdin'))
+    parser_apply.add_argument('--emit-tar', type=str, action='store',
+                              default=None,
+                              help=('write the source and the included '
+                                    'files as the tar stream to the file '
+                                    'when the input is stdin; `-` writes '
+                                    'all the files with the root file '
+                                    'as the tar stream to stdout'))
     parser_apply.add_argument('input', action='store',
                               nargs='?', default=None,
-                              type=str, help=('the path to the input file'))
+                              type=str, help=('the path to the input file, '
+                                              '`-` is stdin, in this case '
+                                              'the root file is written to '
+                                              'stdout; with `--changed-since` '
+                                              'or `--staged` it is the '
+                                              'directory of the projects'))
+    parser_apply.add_argument('--changed-since', type=str, action='store',
+                              default=None, metavar='REV',
+                              help=('re-apply the projects of the git '
+                                    'repository whose sources, configs '
+                                    'or themes changed since the revision'))
+    parser_apply.add_argument('--staged', action='store_true',
+                              default=False,
+                              help=('re-apply the projects whose sources, '
+                                    'configs or themes are changed in '
+                                    'the git index'))
+    parser_apply.add_argument('--jobs', '-j', type=int, action='store',
+                              default=None,
+                              help=('the number of the parallel jobs of '
+                                    '`--changed-since`, `--staged` and '
+                                    '`--sweep` (default is the number '
+                                    'of CPUs)'))
+    parser_apply.add_argument('--sweep', type=str, action='store',
+                              default=None, metavar='ROSTER',
+                              help=('render the root file for every row '
+                                    'of the CSV or JSON lines (`.jsonl`) '
+                                    'file, the row overrides the parameters '
+                                    'of the project'))
+    parser_apply.add_argument('--sweep-name', type=str, action='store',
+                              default='{project-name}-{index}',
+                              help=('the name of the root file of the row '
+                                    'formatted by the values of the project '
+                                    'and the row, `index` is the number '
+                                    'of the row (default is '
+                                    '`{project-name}-{index}`)'))
+    parser_apply.add_argument('--archive', type=str, action='store',
+                              default=None,
+                              help=('write the project to the archive '
+                                    '(`.zip`, `.tar.gz` or `.tgz`) instead '
+                                    'of the working directory, `-` writes '
+                                    'the gzipped tar to stdout'))
+    parser_apply.add_argument('--precompile-preamble', action='store_true',
+                              default=False,
+                              help=('move the preamble of the root file to '
+                                    'the separate file and precompile it '
+                                    'to the TeX format shared by the theme'))
+    parser_apply.add_argument('--format-timeout', type=float,
+                              action='store', default=None,
+                              help=('the time limit of the building '
+                                    'of the format in seconds'))
     parser_apply.set_defaults(func=command_apply)
     parser_example = subparsers.add_parser(
         'example',
@@ -580,17 +1709,345 @@ def create_argparser():
                                 help=('place the values to the tex-files, '
                                       'don\'t use the separate yaml-config '
                                       ' file'))
+    parser_example.add_argument('--archive', type=str, action='store',
+                                default=None,
+                                help=('write the example to the archive '
+                                      '(`.zip`, `.tar.gz` or `.tgz`) '
+                                      'instead of the output directory, '
+                                      '`-` writes the gzipped tar to '
+                                      'stdout'))
     parser_example.add_argument('theme', action='store',
                                 type=str, help=('the name of the theme'))
     parser_example.set_defaults(func=command_example)
+    parser_build = subparsers.add_parser(
+        'build',
+        description=('Compile the projects by the TeX program '
+                     'from their `%!TEX` magic comments'))
+    parser_build.add_argument('--jobs', '-j', type=int, action='store',
+                              default=None,
+                              help=('the number of the parallel jobs '
+                                    '(default is the number of CPUs)'))
+    parser_build.add_argument('--timeout', type=float, action='store',
+                              default=None,
+                              help=('the time limit of the one job '
+                                    'in seconds'))
+    parser_build.add_argument('--program', '-p', type=str, action='store',
+                              default=None,
+                              help=('override the TeX program of the magic '
+                                    'comments (default is `{}`)'
+                                    ''.format(config.BUILD_DEFAULT_PROGRAM)))
+    parser_build.add_argument('--latexmk', action='store_true',
+                              default=False,
+                              help=('run the TeX program through latexmk'))
+    parser_build.add_argument('--latexmk-path', type=str, action='store',
+                              default='latexmk',
+                              help=('the latexmk executable'))
+    parser_build.add_argument('--force', '-f', action='store_true',
+                              default=False,
+                              help=('compile the unchanged projects too'))
+    parser_build.add_argument('projects', action='store', nargs='+',
+                              type=str,
+                              help=('the root files of the projects or '
+                                    'the directories with them'))
+    parser_build.set_defaults(func=command_build)
+    parser_queue = subparsers.add_parser(
+        'queue',
+        description=('Manage the queue of the batch `apply` and `build` '
+                     'jobs run by the command `worker`'))
+    queue_subparsers = parser_queue.add_subparsers()
+    parser_queue_add = queue_subparsers.add_parser(
+        'add',
+        description=('add the jobs, the done jobs of the same targets '
+                     'are not run again'))
+    parser_queue_add.add_argument('--action', '-a', action='store',
+                                  choices=jobs.ACTIONS, default='apply',
+                                  help=('the action of the jobs '
+                                        '(default is `apply`)'))
+    parser_queue_add.add_argument('targets', action='store', nargs='+',
+                                  type=str,
+                                  help=('the configs or the sources of '
+                                        'the projects to apply (the '
+                                        'directories are searched by git), '
+                                        'the root files or the directories '
+                                        'with them to build'))
+    parser_queue_add.set_defaults(func=command_queue_add)
+    parser_queue_status = queue_subparsers.add_parser(
+        'status',
+        description=('show the progress of the jobs and the failed jobs'))
+    parser_queue_status.set_defaults(func=command_queue_status)
+    parser_queue_retry = queue_subparsers.add_parser(
+        'retry',
+        description=('make the failed jobs pending again'))
+    parser_queue_retry.set_defaults(func=command_queue_retry)
+    parser_worker = subparsers.add_parser(
+        'worker',
+        description=('Run the jobs of the queue, any number of the workers '
+                     'on the hosts sharing the queue can run at once'))
+    parser_worker.add_argument('--lease', type=float, action='store',
+                               default=config.JOB_LEASE,
+                               help=('the lease of the claimed job in '
+                                     'seconds, the job of the dead worker '
+                                     'is claimed again after it (default '
+                                     'is {})'.format(config.JOB_LEASE)))
+    parser_worker.add_argument('--max-attempts', type=int, action='store',
+                               default=config.JOB_MAX_ATTEMPTS,
+                               help=('the number of the attempts of the '
+                                     'failing job (default is {})'
+                                     ''.format(config.JOB_MAX_ATTEMPTS)))
+    parser_worker.add_argument('--wait', action='store_true',
+                               default=False,
+                               help=('wait for the jobs running by the other '
+                                     'workers instead of the exit'))
+    parser_worker.add_argument('--poll-interval', type=float,
+                               action='store', default=5.0,
+                               help=('the interval of the polling of the '
+                                     'queue with `--wait` in seconds'))
+    parser_worker.add_argument('--timeout', type=float, action='store',
+                               default=None,
+                               help=('the time limit of the one build '
+                                     'in seconds'))
+    parser_worker.add_argument('--program', '-p', type=str, action='store',
+                               default=None,
+                               help=('override the TeX program of the magic '
+                                     'comments of the builds'))
+    parser_worker.add_argument('--latexmk', action='store_true',
+                               default=False,
+                               help=('run the TeX program through latexmk'))
+    parser_worker.add_argument('--latexmk-path', type=str, action='store',
+                               default='latexmk',
+                               help=('the latexmk executable'))
+    parser_worker.add_argument('--force', '-f', action='store_true',
+                               default=False,
+                               help=('compile the unchanged projects too'))
+    parser_worker.add_argument('--precompile-preamble', action='store_true',
+                               default=False,
+                               help=('precompile the preambles of the '
+                                     'applied projects'))
+    parser_worker.set_defaults(func=command_worker)
+    for parser in (parser_queue_add, parser_queue_status,
+                   parser_queue_retry, parser_worker):
+        parser.add_argument('--database', '-d', type=str, action='store',
+                            default=config.JOB_QUEUE_DATABASE,
+                            help=('the SQLite database of the queue '
+                                  '(default is `{}`)'
+                                  ''.format(config.JOB_QUEUE_DATABASE)))
+    parser_profile = subparsers.add_parser(
+        'profile-theme',
+        description=('Render the theme many times and show the time '
+                     'and the output size of its loops, conditions, '
+                     'blocks, macros and included templates'))
+    parser_profile.add_argument('--config-file', '--config', '-c',
+                                type=str, action='store',
+                                help=('yaml configuration file of the '
+                                      'project whose variables are used'))
+    parser_profile.add_argument('--input', '-i', type=str, action='store',
+                                default=None,
+                                help=('the source file of the project whose '
+                                      'variables are used (default are '
+                                      'the parameters of the theme)'))
+    parser_profile.add_argument('--repeat', '-r', type=int,
+                                action='store', default=100,
+                                help=('the number of the renderings '
+                                      '(default is 100)'))
+    parser_profile.add_argument('--sort', '-s', action='store',
+                                choices=profiler.SORT_KEYS, default='total',
+                                help=('the column of the table to sort by '
+                                      '(default is `total`)'))
+    parser_profile.add_argument('--flamegraph', type=str, action='store',
+                                default=None,
+                                help=('write the folded stacks of the self '
+                                      'times in microseconds to the file '
+                                      'for the flamegraph tools'))
+    parser_profile.add_argument('theme', action='store', nargs='?',
+                                default=None, type=str,
+                                help=('the name of the theme (default is '
+                                      'the theme of the project)'))
+    parser_profile.set_defaults(func=command_profile_theme)
+    parser_cache = subparsers.add_parser(
+        'cache',
+        description=('Manage the cache of the rendered templates'))
+    cache_subparsers = parser_cache.add_subparsers()
+    parser_cache_stats = cache_subparsers.add_parser(
+        'stats',
+        description=('show the statistics of the cache'))
+    parser_cache_stats.set_defaults(func=command_cache_stats)
+    parser_cache_prune = cache_subparsers.add_parser(
+        'prune',
+        description=('evict the old entries from the cache'))
+    parser_cache_prune.add_argument('--max-size', type=int, action='store',
+                                    default=None,
+                                    help=('the maximal size of the cache '
+                                          'in bytes'))
+    parser_cache_prune.add_argument('--max-age', type=int, action='store',
+                                    default=None,
+                                    help=('the maximal age of the unused '
+                                          'entries in seconds'))
+    parser_cache_prune.add_argument('--all', '-a', action='store_true',
+                                    default=False,
+                                    help=('remove all the entries'))
+    parser_cache_prune.set_defaults(func=command_cache_prune)
+    parser_mirror = subparsers.add_parser(
+        'mirror',
+        description=('Manage the local mirror of the themes path'))
+    mirror_subparsers = parser_mirror.add_subparsers()
+    parser_mirror_sync = mirror_subparsers.add_parser(
+        'sync',
+        description=('revalidate the mirrored themes against the themes '
+                     'path now'))
+    parser_mirror_sync.add_argument('themes', action='store', nargs='*',
+                                    type=str,
+                                    help=('the names of the themes (default '
+                                          'is all the themes)'))
+    parser_mirror_sync.set_defaults(func=command_mirror_sync)
+    parser_mirror_status = mirror_subparsers.add_parser(
+        'status',
+        description=('show the mirrored themes and the times of their '
+                     'revalidation'))
+    parser_mirror_status.set_defaults(func=command_mirror_status)
+    parser_completion = subparsers.add_parser(
+        'completion',
+        description=('Print the completion script of the shell or refresh '
+                     'the table of the names of the themes used by it, '
+                     'e.g. `eval "$(coculatex completion bash)"`'))
+    parser_completion.add_argument('action', action='store',
+                                   choices=completion.SHELLS + ('refresh',),
+                                   help=('the shell of the script or '
+                                         '`refresh`'))
+    parser_completion.set_defaults(func=command_completion)
     return arg_parser
 
 
-def __make_latex(root_path, variables):
+def command_completion(args):
+    """Handle the action `completion`."""
+    if args.action != 'refresh':
+        print(completion.script(args.action), end='')
+        return
+    cache_path = os.path.realpath(os.path.expanduser(args.cache_path))
+    try:
+        completion.write_table(
+            completion.table_path(cache_path, args.themes_path),
+            args.themes_path,
+            __theme_names(args.themes_path),
+            completion.parser_spec(create_argparser()))
+    except OSError as error:
+        LOG.error('Cannot write the completion table: %s', error)
+        exit(1)
+
+
+def __make_latex(root_path, variables, render_cache=None, environments=None):
     """
     Make jinja2 template and interpolate it by using variables.
 
     Return `str` data from jinja2 template rendered by variables.
+    If `render_cache` is passed then the result is looked up there first
+    and stored there after the rendering.
+    `environments` is `dict` of the jinja2 environments shared by
+    the renderings of the same theme.
+    """
+    jinja2_variables, content = __load_root_template(root_path)
+    LOG.debug('using variables for render template: %s', variables)
+    if render_cache is not None:
+        # the values of the unused variables do not change the result
+        names = __referenced_variables(root_path,
+                                       content,
+                                       jinja2_variables,
+                                       render_cache)
+        cache_key = render_cache.make_key(
+            root_path,
+            jinja2_variables,
+            variables if names is None else
+            {name: value for name, value in variables.items()
+             if name in names})
+        data = render_cache.get(cache_key)
+        if data is not None:
+            LOG.debug('The rendering of `%s` is taken from the cache',
+                      root_path)
+            metrics.CACHE_REQUESTS.inc(cache='render', result='hit')
+            return data
+        metrics.CACHE_REQUESTS.inc(cache='render', result='miss')
+    template = templates.SubstitutionTemplate.compile(content,
+                                                      jinja2_variables)
+    if template is not None:
+        LOG.debug('The template `%s` has only the substitutions', root_path)
+        data = template.render(variables)
+        dependencies = set()
+    else:
+        data, dependencies = __render_jinja2(root_path,
+                                             content,
+                                             jinja2_variables,
+                                             variables,
+                                             environments)
+    if render_cache is not None:
+        render_cache.put(cache_key, data, dependencies)
+    return data
+
+
+def __render_jinja2(root_path,
+                    content,
+                    jinja2_variables,
+                    variables,
+                    environments=None):
+    """
+    Render the root template by Jinja2.
+
+    Return `str` data and `set` of the paths of the loaded templates.
+    """
+    environment_key = (os.path.dirname(root_path),
+                       cache.canonical_dump(jinja2_variables))
+    environment = (environments or {}).get(environment_key)
+    if environment is None:
+        environment = jinja2.Environment(
+            loader=templates.TemplateLoader(os.path.dirname(root_path)),
+            **jinja2_variables)
+        if environments is not None:
+            environment = environments.setdefault(environment_key,
+                                                  environment)
+    try:
+        data = environment.from_string(content).render(**variables)
+    except (jinja2.exceptions.TemplateError,
+            jinja2.exceptions.TemplateRuntimeError,
+            jinja2.exceptions.TemplateSyntaxError) as error:
+        raise exceptions.LaTeXTMError(
+            'jinja2 theme template error: {}'.format(error))
+    # the shared loader holds the templates of all the renderings
+    return data, set(environment.loader.loaded)
+
+
+def __referenced_variables(root_path,
+                           content,
+                           jinja2_variables,
+                           render_cache=None):
+    """
+    Return `set` of the variables referenced by the root template.
+
+    None is returned if they cannot be found statically. If `render_cache`
+    is passed then the names are looked up there first and stored there
+    after the analysis.
+    """
+    if render_cache is not None:
+        usage_key = render_cache.make_usage_key(root_path, jinja2_variables)
+        names = render_cache.get(usage_key)
+        metrics.CACHE_REQUESTS.inc(
+            cache='usage', result='miss' if names is None else 'hit')
+        if names is not None:
+            return set(names)
+    try:
+        names, dependencies = templates.referenced_variables(
+            root_path, content, jinja2_variables)
+    except jinja2.exceptions.TemplateError as error:
+        raise exceptions.LaTeXTMError(
+            'jinja2 theme template error: {}'.format(error))
+    if render_cache is not None and names is not None:
+        render_cache.put(usage_key, sorted(names), dependencies)
+    return names
+
+
+def __load_root_template(root_path):
+    """
+    Load the root template of the theme.
+
+    Return the jinja2 configuration updated by the header of the template
+    and `str` content of the template without the header.
     """
     try:
         with open(root_path, 'r', encoding='utf-8') as file:
@@ -600,33 +2057,158 @@ def __make_latex(root_path, variables):
     LOG.debug('yaml description of variables for making jinja2 template: %s',
               jinja2_variables_str)
     LOG.debug('content of theme\'s template: %s', content)
-    jinja2_variables = dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG))
-    LOG.debug('default jinja2 configuration: %s', jinja2_variables)
     # delete unknown keys and update values of default configuration
-    if jinja2_variables_str:
-        jinja2_variables_from_template = yaml.safe_load(jinja2_variables_str)
-        if not jinja2_variables_from_template:
-            jinja2_variables_from_template = {}
-        LOG.debug('loaded variables from `%s`: %s',
-                  root_path,
-                  jinja2_variables_from_template)
-        jinja2_variables.update(
-            {key: value
-             for key, value in jinja2_variables_from_template.items()
-             if key in jinja2_variables})
-        LOG.debug('jinj2 configuration updated by loaded variables: %s',
-                  jinja2_variables)
-    LOG.debug('using variables for render template: %s', variables)
-    try:
-        data = jinja2.Environment(
-            loader=templates.TemplateLoader(os.path.dirname(root_path)),
-            **jinja2_variables).from_string(content).render(**variables)
-    except (jinja2.exceptions.TemplateError,
-            jinja2.exceptions.TemplateRuntimeError,
-            jinja2.exceptions.TemplateSyntaxError) as error:
-        raise exceptions.LaTeXTMError(
-            'jinja2 theme template error: {}'.format(error))
-    return data
+    jinja2_variables = templates.template_options(jinja2_variables_str)
+    LOG.debug('jinj2 configuration updated by loaded variables: %s',
+              jinja2_variables)
+    return jinja2_variables, content
+
+
+def __make_render_cache(args):
+    """Make the render cache from the arguments or return None."""
+    if getattr(args, 'no_cache', False):
+        LOG.debug('The render cache is disabled')
+        return None
+    cache_path = getattr(args, 'cache_path', None) or config.CACHE_DIRECTORY
+    return cache.RenderCache(os.path.join(
+        os.path.realpath(os.path.expanduser(cache_path)),
+        config.RENDER_CACHE_SUBDIRECTORY))
+
+
+def __make_archive_cache(args):
+    """Make the cache of the compressed archive members or return None."""
+    if getattr(args, 'no_cache', False):
+        LOG.debug('The archive cache is disabled')
+        return None
+    cache_path = getattr(args, 'cache_path', None) or config.CACHE_DIRECTORY
+    return cache.ArchiveMemberCache(os.path.join(
+        os.path.realpath(os.path.expanduser(cache_path)),
+        config.ARCHIVE_CACHE_SUBDIRECTORY))
+
+
+def __make_yaml_cache(args):
+    """Make the cache of the parsed YAML data or return None."""
+    if getattr(args, 'no_cache', False):
+        LOG.debug('The YAML cache is disabled')
+        return None
+    cache_path = getattr(args, 'cache_path', None) or config.CACHE_DIRECTORY
+    return cache.YamlCache(os.path.join(
+        os.path.realpath(os.path.expanduser(cache_path)),
+        config.YAML_CACHE_SUBDIRECTORY))
+
+
+def __make_fragment_cache(args):
+    """Make the on-disk cache of the `cache` blocks or return None."""
+    if (getattr(args, 'no_cache', False)
+            or not getattr(args, 'fragment_cache', False)):
+        return None
+    cache_path = getattr(args, 'cache_path', None) or config.CACHE_DIRECTORY
+    return cache.FragmentCache(os.path.join(
+        os.path.realpath(os.path.expanduser(cache_path)),
+        config.FRAGMENT_CACHE_SUBDIRECTORY))
+
+
+def __make_themes_mirror(args):
+    """Make the mirror of the themes if it is enabled by `args`."""
+    if not (args.mirror or args.mirror_path):
+        return None
+    return mirror.ThemesMirror(
+        args.themes_path,
+        os.path.expanduser(args.mirror_path or os.path.join(
+            args.cache_path, config.MIRROR_SUBDIRECTORY)),
+        args.mirror_interval)
+
+
+def command_mirror_sync(args):
+    """Handle the action `mirror sync`."""
+    args.mirror = True
+    themes_mirror = __make_themes_mirror(args)
+    themes = args.themes
+    if not themes:
+        themes = sorted(set(themes_mirror.themes())
+                        | set(__theme_names(args.themes_path)))
+    failed = False
+    for theme in themes:
+        try:
+            copied = themes_mirror.sync_theme(theme)
+        except OSError as error:
+            LOG.error('Cannot mirror the theme %s: %s', theme, error)
+            failed = True
+            continue
+        print('{}: {} files are copied'.format(theme, copied))
+    if failed:
+        exit(1)
+
+
+def command_mirror_status(args):
+    """Handle the action `mirror status`."""
+    args.mirror = True
+    themes_mirror = __make_themes_mirror(args)
+    print('origin: {}\npath: {}\ninterval: {} seconds'.format(
+        themes_mirror.origin, themes_mirror.path, themes_mirror.interval))
+    for row in themes_mirror.status():
+        print('{}\n    files: {}\n    size: {} bytes\n    synced: {}{}'
+              ''.format(row.theme, row.files, row.size,
+                        time.strftime('%Y-%m-%d %H:%M:%S',
+                                      time.localtime(row.synced)),
+                        ' (stale)' if row.stale else ''))
+
+
+def __make_format_cache(args):
+    """Make the cache of the preamble formats or return None."""
+    if not getattr(args, 'precompile_preamble', False):
+        return None
+    cache_path = getattr(args, 'cache_path', None) or config.CACHE_DIRECTORY
+    return preamble.FormatCache(
+        os.path.join(os.path.realpath(os.path.expanduser(cache_path)),
+                     config.FORMAT_CACHE_SUBDIRECTORY),
+        timeout=getattr(args, 'format_timeout', None))
+
+
+def command_cache_stats(args):
+    """Handle the action `cache stats`."""
+    args.no_cache = False
+    args.precompile_preamble = True
+    args.fragment_cache = True
+    for title, directory_cache in (('render cache',
+                                    __make_render_cache(args)),
+                                   ('YAML cache', __make_yaml_cache(args)),
+                                   ('archive cache',
+                                    __make_archive_cache(args)),
+                                   ('fragment cache',
+                                    __make_fragment_cache(args)),
+                                   ('format cache',
+                                    __make_format_cache(args))):
+        stats = directory_cache.stats()
+        LOG.debug('The statistics of the %s: %s', title, stats)
+        print('{title}\n'
+              '    path: {path}\n'
+              '    entries: {entries}\n'
+              '    size: {size} bytes (max {max_size})\n'
+              '    max age: {max_age} seconds'.format(title=title, **stats))
+        for name in ('oldest', 'newest'):
+            if stats[name] is not None:
+                print('    {}: {}'.format(name, time.strftime(
+                    '%Y-%m-%d %H:%M:%S', time.localtime(stats[name]))))
+
+
+def command_cache_prune(args):
+    """Handle the action `cache prune`."""
+    args.no_cache = False
+    args.precompile_preamble = True
+    args.fragment_cache = True
+    max_size = args.max_size
+    max_age = args.max_age
+    if args.all:
+        max_size, max_age = 0, 0
+    for directory_cache in (__make_render_cache(args),
+                            __make_yaml_cache(args),
+                            __make_archive_cache(args),
+                            __make_fragment_cache(args),
+                            __make_format_cache(args)):
+        removed = directory_cache.prune(max_size=max_size, max_age=max_age)
+        print('{} entries are removed from {}'.format(removed,
+                                                      directory_cache.path))
 
 
 def __load_theme(theme_name,
@@ -640,7 +2222,12 @@ def __load_theme(theme_name,
     themes_path = themes_path if themes_path else config.THEMES_DIRECTORY
     LOG.debug('Load theme `%s` from path: `%s`', theme_name, themes_path)
     themes_list = theme_name.split('.')
-    theme_directory = os.path.join(themes_path, themes_list[0])
+    themes_mirror = mirror.get_themes_mirror()
+    if (themes_mirror is not None
+            and os.path.realpath(themes_path) == themes_mirror.origin):
+        theme_directory = themes_mirror.theme_directory(themes_list[0])
+    else:
+        theme_directory = os.path.join(themes_path, themes_list[0])
     theme_variables = {themes_list[0]: config.THEME_CONFIG_FILE_NAME}
     for theme in themes_list:
         subtheme_values = __load_theme_config(
@@ -693,8 +2280,8 @@ def __load_theme_config(config_file,
     LOG.debug('Absolete path to config file `%s`',
               path_config_file)
     try:
-        with open(path_config_file, 'r', encoding='utf-8') as file:
-            subtheme_values = yaml.safe_load(file)
+        subtheme_values = cache.load_yaml_file(path_config_file,
+                                               kind='theme')
     except (IOError, FileNotFoundError, PermissionError) as error:
         LOG.debug(
             'Cannot load the config file `%s`, error: %s',
@@ -727,7 +2314,55 @@ def main():
     else:
         LOG.debug('OK! The path `%s` is folder', themes_path)
     arguments.themes_path = themes_path
-    arguments.func(arguments)
+    cache.set_yaml_cache(__make_yaml_cache(arguments))
+    cache.set_fragment_cache(__make_fragment_cache(arguments))
+    mirror.set_themes_mirror(__make_themes_mirror(arguments))
+    __init_metrics(arguments)
+    try:
+        arguments.func(arguments)
+    finally:
+        __export_metrics(arguments)
+
+
+def __init_metrics(args):
+    """Enable the metrics if any of the exports is requested."""
+    if not __metrics_enabled(args):
+        return
+    LOG.debug('The metrics are enabled')
+    metrics.REGISTRY.enabled = True
+    if args.metrics_port:
+        try:
+            metrics.REGISTRY.serve(args.metrics_port)
+        except OSError as error:
+            LOG.error('Cannot serve the metrics on the port %s: %s',
+                      args.metrics_port, error)
+
+
+def __metrics_enabled(args):
+    """Return True if any of the exports of the metrics is requested."""
+    return bool(args.metrics_file or args.metrics_json or args.metrics_port)
+
+
+def __export_metrics(args):
+    """Write the metrics to the files requested by the arguments."""
+    if args.metrics_file:
+        try:
+            with open(args.metrics_file, 'w', encoding='utf-8') as file:
+                file.write(metrics.REGISTRY.to_prometheus())
+        except (OSError, PermissionError) as error:
+            LOG.error('Cannot write the metrics to the file %s: %s',
+                      args.metrics_file, error)
+    if args.metrics_json:
+        content = json.dumps(metrics.REGISTRY.as_dict(), indent=2)
+        if args.metrics_json == '-':
+            print(content, file=sys.stderr)
+            return
+        try:
+            with open(args.metrics_json, 'w', encoding='utf-8') as file:
+                file.write(content + '\n')
+        except (OSError, PermissionError) as error:
+            LOG.error('Cannot write the metrics to the file %s: %s',
+                      args.metrics_json, error)
 
 
 if __name__ == "__main__":
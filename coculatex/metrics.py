@@ -0,0 +1,295 @@
+"""
+Module contains the metrics of the program.
+
+The metrics are collected only when the registry is enabled,
+otherwise the updates of them cost a single attribute check.
+They can be exported in the Prometheus text exposition format
+or as `dict` (for the JSON output). The pool workers return
+the snapshots of their registries (see `call_measured`) which
+the parent process merges to its registry.
+"""
+import bisect
+import contextlib
+import copy
+import logging
+import threading
+import time
+from http.server import (BaseHTTPRequestHandler,
+                         HTTPServer)
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    """Make the Prometheus string of the labels."""
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    """Make the Prometheus string of the number."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """The monotonically increasing counter."""
+
+    kind = 'counter'
+
+    def __init__(self, registry, name, description, labelnames=()):
+        """Init the counter."""
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter by `amount`."""
+        if not self.registry.enabled:
+            return
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        """Add the `values` of the snapshot of the counter."""
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        """Iterate over the Prometheus samples (suffix, labels, value)."""
+        for key, value in sorted(self.values.items()):
+            yield '', _format_labels(self.labelnames, key), value
+
+    def as_dict(self):
+        """Return the values of the counter as `dict`."""
+        return [dict(zip(self.labelnames, key), value=value)
+                for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """The histogram of the observed values."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, description, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        """Init the histogram."""
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, **labels):
+        """Observe the `value`."""
+        if not self.registry.enabled:
+            return
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.registry.lock:
+            counts, total = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def merge(self, values):
+        """Add the `values` of the snapshot of the histogram."""
+        for key, (counts, total) in values.items():
+            own_counts, own_total = self.values.get(
+                key, ([0] * (len(self.buckets) + 1), 0))
+            self.values[key] = ([own + other for own, other
+                                 in zip(own_counts, counts)],
+                                own_total + total)
+
+    def time(self, **labels):
+        """Return the context manager which observes its duration."""
+        if not self.registry.enabled:
+            return _NULL_CONTEXT
+        return self._timer(labels)
+
+    @contextlib.contextmanager
+    def _timer(self, labels):
+        """Observe the duration of the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        """Iterate over the Prometheus samples (suffix, labels, value)."""
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', _format_labels(
+                    self.labelnames, key,
+                    [('le', _format_value(bound))]), cumulative
+            yield '_sum', _format_labels(self.labelnames, key), total
+            yield '_count', _format_labels(self.labelnames, key), cumulative
+
+    def as_dict(self):
+        """Return the values of the histogram as `dict`."""
+        return [dict(zip(self.labelnames, key),
+                     count=sum(counts),
+                     sum=total,
+                     buckets=dict(zip(
+                         [_format_value(bound)
+                          for bound in self.buckets + (float('inf'),)],
+                         counts)))
+                for key, (counts, total) in sorted(self.values.items())]
+
+
+class Registry:
+    """The registry of the metrics."""
+
+    def __init__(self, enabled=False):
+        """Init the registry."""
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def counter(self, name, description, labelnames=()):
+        """Register the new counter."""
+        metric = Counter(self, name, description, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, description, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        """Register the new histogram."""
+        metric = Histogram(self, name, description, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        """Forget all the collected values."""
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+    def snapshot(self):
+        """Return the picklable copy of the collected values."""
+        with self.lock:
+            return {metric.name: copy.deepcopy(metric.values)
+                    for metric in self.metrics}
+
+    def merge(self, snapshot):
+        """Add the values of the `snapshot` of the other registry."""
+        with self.lock:
+            for metric in self.metrics:
+                metric.merge(snapshot.get(metric.name, {}))
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append('# HELP {} {}'.format(metric.name,
+                                                   metric.description))
+                lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+                for suffix, labels, value in metric.samples():
+                    lines.append('{}{}{} {}'.format(
+                        metric.name, suffix, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def as_dict(self):
+        """Return the metrics as `dict`."""
+        with self.lock:
+            return {metric.name: metric.as_dict() for metric in self.metrics}
+
+    def serve(self, port, address='127.0.0.1'):
+        """
+        Serve the metrics by HTTP in the daemon thread.
+
+        Return the instance of the `HTTPServer`.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            """Respond by the metrics for any GET request."""
+
+            def do_GET(self):  # noqa: N802
+                """Send the metrics."""
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # noqa: A002
+                """Redirect the log of the server to the logger."""
+                LOG.debug('metrics server: ' + format, *args)
+
+        server = HTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        LOG.debug('The metrics are served on %s:%d', address, port)
+        return server
+
+
+REGISTRY = Registry()
+
+
+PROJECTS_RENDERED = REGISTRY.counter(
+    'coculatex_projects_rendered_total',
+    'The number of the rendered projects.')
+
+RENDER_SECONDS = REGISTRY.histogram(
+    'coculatex_render_seconds',
+    'The latency of the rendering of the root file.')
+
+YAML_PARSE_SECONDS = REGISTRY.histogram(
+    'coculatex_yaml_parse_seconds',
+    'The time of the parsing of the YAML data.')
+
+BYTES_WRITTEN = REGISTRY.counter(
+    'coculatex_bytes_written_total',
+    'The number of the bytes written to the output files.')
+
+FILES_COPIED = REGISTRY.counter(
+    'coculatex_files_copied_total',
+    'The number of the files copied from the themes.')
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'coculatex_cache_requests_total',
+    'The number of the cache lookups by the cache and the result.',
+    ('cache', 'result'))
+
+
+def init_worker(enabled):
+    """Init the registry of the pool worker process."""
+    REGISTRY.enabled = enabled
+    REGISTRY.reset()
+
+
+def call_measured(function, *args):
+    """
+    Call `function` and return its result and the metrics of the call.
+
+    It is run in the pool workers: the registry of the process is reset
+    before the call, so its snapshot holds only the updates of the call,
+    the parent merges it by `Registry.merge`.
+    """
+    REGISTRY.reset()
+    result = function(*args)
+    return result, REGISTRY.snapshot()
@@ -0,0 +1,176 @@
+"""
+Module contains the read-through local mirror of the themes.
+
+The themes on the slow (network) storage are copied to the local
+directory when they are used first and served from there afterwards.
+Every mirrored theme has the manifest of the sizes and the modification
+times of its origin files; the origin is walked again (and only
+the changed files are copied) when the manifest is older than
+the revalidation interval, not on every access.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from collections import namedtuple
+from coculatex import (
+    files,
+    metrics)
+
+
+LOG = logging.getLogger(__name__)
+
+_MANIFEST_SUFFIX = '.manifest.json'
+
+MirrorStatus = namedtuple('MirrorStatus', 'theme files size synced stale')
+
+_MIRROR = None
+
+
+def set_themes_mirror(themes_mirror):
+    """Set the mirror of the themes used by the loading of the themes."""
+    global _MIRROR  # pylint: disable=global-statement
+    _MIRROR = themes_mirror
+
+
+def get_themes_mirror():
+    """Return the mirror set by `set_themes_mirror` or None."""
+    return _MIRROR
+
+
+class ThemesMirror:
+    """
+    The mirror of the themes directory `origin` in the directory `path`.
+
+    The mirrored themes are revalidated every `interval` seconds.
+    """
+
+    def __init__(self, origin, path, interval):
+        """Init the mirror, the directory is made on the first use."""
+        self.origin = os.path.realpath(origin)
+        self.path = os.path.join(path, files.path_digest(self.origin))
+        self.interval = interval
+        # the theme name -> the time of the last check in the process
+        self._checked = {}
+
+    def _manifest_path(self, theme):
+        """Return the path of the manifest of the `theme`."""
+        return os.path.join(self.path, '.' + theme + _MANIFEST_SUFFIX)
+
+    def _read_manifest(self, theme):
+        """Return the manifest of the `theme` or None."""
+        try:
+            with open(self._manifest_path(theme), 'r',
+                      encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) else None
+
+    def theme_directory(self, theme):
+        """
+        Return the local directory of the `theme`.
+
+        The theme is copied or revalidated if it is needed. The origin
+        directory is returned if the theme cannot be mirrored.
+        """
+        origin = os.path.join(self.origin, theme)
+        if theme in ('', os.curdir, os.pardir) or os.sep in theme:
+            return origin
+        now = time.time()
+        local = os.path.join(self.path, theme)
+        if now - self._checked.get(theme, float('-inf')) < self.interval:
+            return local
+        manifest = self._read_manifest(theme)
+        if (manifest is not None and os.path.isdir(local)
+                and now - manifest.get('synced', 0) < self.interval):
+            metrics.CACHE_REQUESTS.inc(cache='mirror', result='hit')
+            self._checked[theme] = manifest['synced']
+            return local
+        metrics.CACHE_REQUESTS.inc(cache='mirror', result='miss')
+        try:
+            self.sync_theme(theme)
+        except OSError as error:
+            LOG.error('Cannot mirror the theme %s: %s', theme, error)
+            return origin
+        return local if os.path.isdir(local) else origin
+
+    def sync_theme(self, theme):
+        """
+        Revalidate the mirror of the `theme` against the origin.
+
+        The changed files are copied, the removed ones are removed.
+        Return the number of the copied files.
+        """
+        origin = os.path.join(self.origin, theme)
+        local = os.path.join(self.path, theme)
+        os.makedirs(self.path, exist_ok=True)
+        with files.file_lock(files.lock_path(self._manifest_path(theme))):
+            if not os.path.isdir(origin):
+                LOG.debug('The theme %s is not in %s', theme, self.origin)
+                self.remove_theme(theme)
+                return 0
+            manifest = self._read_manifest(theme) or {}
+            mirrored = manifest.get('files', {})
+            synced = time.time()
+            entries = {}
+            copied = 0
+            for directory, _, names in os.walk(origin):
+                relative = os.path.relpath(directory, origin)
+                os.makedirs(os.path.join(local, relative), exist_ok=True)
+                for name in names:
+                    path = os.path.normpath(os.path.join(relative, name))
+                    stat = os.stat(os.path.join(directory, name))
+                    entries[path] = [stat.st_size, stat.st_mtime_ns]
+                    if (mirrored.get(path) != entries[path]
+                            or not os.path.exists(os.path.join(local, path))):
+                        files.atomic_copy(os.path.join(directory, name),
+                                          os.path.join(local, path))
+                        copied += 1
+            for path in set(mirrored) - set(entries):
+                try:
+                    os.unlink(os.path.join(local, path))
+                except OSError as error:
+                    LOG.debug('Cannot remove the mirrored file %s: %s',
+                              path, error)
+            files.atomic_write(self._manifest_path(theme), json.dumps(
+                {'origin': origin, 'synced': synced, 'files': entries},
+                sort_keys=True))
+        self._checked[theme] = synced
+        LOG.debug('The theme %s is mirrored: %d of %d files are copied',
+                  theme, copied, len(entries))
+        return copied
+
+    def themes(self):
+        """Return `list` of the names of the mirrored themes."""
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(name[1:-len(_MANIFEST_SUFFIX)] for name in names
+                      if name.startswith('.')
+                      and name.endswith(_MANIFEST_SUFFIX))
+
+    def status(self):
+        """Return `list` of `MirrorStatus` of the mirrored themes."""
+        now = time.time()
+        rows = []
+        for theme in self.themes():
+            manifest = self._read_manifest(theme) or {}
+            entries = manifest.get('files', {})
+            synced = manifest.get('synced', 0)
+            rows.append(MirrorStatus(
+                theme, len(entries),
+                sum(size for size, _ in entries.values()),
+                synced, now - synced >= self.interval))
+        return rows
+
+    def remove_theme(self, theme):
+        """Remove the mirror of the `theme` removed from the origin."""
+        shutil.rmtree(os.path.join(self.path, theme), ignore_errors=True)
+        try:
+            os.unlink(self._manifest_path(theme))
+        except OSError:
+            pass
+        self._checked.pop(theme, None)
@@ -0,0 +1,202 @@
+"""
+Module contains the precompiled preambles of the themes.
+
+The rendered root file is split into the preamble (everything before
+`\\begin{document}`) and the body. The static part of the preamble
+(up to the line `config.STATIC_PREAMBLE_END` of the theme) is dumped to
+the TeX format file which is cached by the digest of it, the program
+and the TeX files of the theme, so all the projects of the theme share
+one format; the rest of the preamble stays in the root file.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from coculatex import (
+    cache,
+    config,
+    files)
+
+
+LOG = logging.getLogger(__name__)
+
+PREAMBLE_MARKER = r'\coculatexpreamble'
+
+_BEGIN_DOCUMENT_RE = re.compile(r'^[ \t]*\\begin\s*\{document\}',
+                                re.MULTILINE)
+
+_STATIC_END_RE = re.compile(
+    r'^[ \t]*' + re.escape(config.STATIC_PREAMBLE_END) + r'[^\n]*\n?',
+    re.MULTILINE)
+
+
+def split_preamble(latex_string):
+    """
+    Split the LaTeX document to the preamble and the body.
+
+    Return the tuple (preamble, body) or None if the document
+    has no `\\begin{document}`.
+    """
+    match = _BEGIN_DOCUMENT_RE.search(latex_string)
+    if not match:
+        return None
+    return latex_string[:match.start()], latex_string[match.start():]
+
+
+def make_preamble_file(preamble):
+    """Return the content of the preamble file which marks its loading."""
+    return '\\def{}{{}}\n{}'.format(PREAMBLE_MARKER, preamble)
+
+
+def make_body(preamble_file_name, body):
+    """
+    Return the body which loads the preamble file if it is necessary.
+
+    The preamble file is skipped when the document is compiled
+    with the precompiled format.
+    """
+    return ('\\ifdefined{marker}\\else\\input{{{name}}}\\fi\n{body}'
+            ''.format(marker=PREAMBLE_MARKER,
+                      name=preamble_file_name,
+                      body=body))
+
+
+def split_static(preamble):
+    """
+    Split the preamble to the static part and the per-project part.
+
+    The theme marks the end of the static part (shared by all the
+    projects of the theme) by the line `config.STATIC_PREAMBLE_END`.
+    If there is no such line then the whole preamble is static.
+    Return the tuple (static, dynamic).
+    """
+    match = _STATIC_END_RE.search(preamble)
+    if not match:
+        LOG.debug('The preamble has no end of the static part')
+        return preamble, ''
+    return preamble[:match.start()], preamble[match.end():]
+
+
+def strip_static_end(latex_string):
+    """Remove the lines `config.STATIC_PREAMBLE_END` from `latex_string`."""
+    return _STATIC_END_RE.sub('', latex_string)
+
+
+class FormatCache(cache.DirectoryCache):
+    """
+    The cache of the TeX formats of the preambles.
+
+    The formats are evicted like the other caches, the log
+    of the building is stored next to the format.
+    """
+
+    extension = config.FORMAT_FILE_EXTENSION
+
+    def __init__(self, path,
+                 max_size=config.FORMAT_CACHE_MAX_SIZE,
+                 max_age=config.FORMAT_CACHE_MAX_AGE,
+                 timeout=None):
+        """Init the cache for the directory `path`."""
+        super().__init__(path, max_size, max_age)
+        self.timeout = timeout
+
+    @staticmethod
+    def format_name(theme_path, root_file, program, preamble):
+        """Return the name of the format of the preamble."""
+        digest = hashlib.sha256()
+        digest.update(program.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(cache.directory_digest(
+            theme_path, config.FORMAT_INPUT_EXTENSIONS).encode('ascii'))
+        digest.update(b'\0')
+        digest.update(preamble.encode('utf-8'))
+        variant = '{}-{}'.format(
+            os.path.basename(os.path.normpath(theme_path)),
+            os.path.splitext(os.path.basename(root_file))[0])
+        variant = re.sub(r'[^\w-]+', '-', variant)
+        return '{}-{}'.format(variant, digest.hexdigest()[:16])
+
+    def get_format(self, theme_path, root_file, program, preamble):
+        """
+        Return the path (without the extension) of the format.
+
+        The format is built if it is absent in the cache.
+        Return None if the format cannot be built.
+        """
+        name = self.format_name(theme_path, root_file, program, preamble)
+        format_file = self._entry_path(name)
+        format_path = os.path.splitext(format_file)[0]
+        if os.path.isfile(format_file):
+            LOG.debug('The format %s is found in the cache', name)
+            try:
+                os.utime(format_file)
+            except OSError as error:
+                LOG.debug('Cannot touch the format %s: %s', name, error)
+            return format_path
+        try:
+            os.makedirs(os.path.dirname(format_file), exist_ok=True)
+            with files.file_lock(files.lock_path(format_path)):
+                if not os.path.isfile(format_file):
+                    self._build(name, theme_path, program,
+                                make_preamble_file(preamble))
+        except (OSError, subprocess.SubprocessError) as error:
+            LOG.error('Cannot build the format %s: %s', name, error)
+            return None
+        self._maybe_prune()
+        return format_path
+
+    def _remove(self, entry_path):
+        """
+        Remove the format with its log.
+
+        The lock file is kept: the other process can wait for it
+        to build the format again.
+        """
+        os.unlink(entry_path)
+        try:
+            os.unlink(os.path.splitext(entry_path)[0] + '.log')
+        except OSError:
+            pass
+
+    def _build(self, name, theme_path, program, preamble):
+        """Build the format `name` from the preamble."""
+        directory = os.path.dirname(self._entry_path(name))
+        build_directory = tempfile.mkdtemp(dir=directory,
+                                           prefix='.{}.'.format(name))
+        try:
+            with open(os.path.join(build_directory, name + '.tex'), 'w',
+                      encoding='utf-8') as file:
+                file.write(preamble)
+                file.write('\n\\dump\n')
+            base_format = os.path.splitext(os.path.basename(program))[0]
+            command = [program, '-ini', '-interaction=nonstopmode',
+                       '-halt-on-error', '-jobname={}'.format(name),
+                       '&{}'.format(base_format), name + '.tex']
+            environment = dict(os.environ)
+            environment['TEXINPUTS'] = os.pathsep.join(
+                [os.path.abspath(theme_path),
+                 environment.get('TEXINPUTS', '')])
+            LOG.debug('Build the format by the command: %s', command)
+            process = subprocess.run(command,
+                                     cwd=build_directory,
+                                     env=environment,
+                                     stdin=subprocess.DEVNULL,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     timeout=self.timeout,
+                                     check=False)
+            log_path = os.path.join(directory, name + '.log')
+            files.atomic_write(log_path, process.stdout)
+            built_format = os.path.join(build_directory,
+                                        name + config.FORMAT_FILE_EXTENSION)
+            if process.returncode != 0 or not os.path.isfile(built_format):
+                raise OSError('the program {} exited with the code {}, '
+                              'see the log {}'.format(
+                                  program, process.returncode, log_path))
+            os.replace(built_format, self._entry_path(name))
+        finally:
+            shutil.rmtree(build_directory, ignore_errors=True)
+        LOG.debug('The format %s is built', name)
@@ -0,0 +1,182 @@
+"""
+Module contains the profiler of the rendering of the theme templates.
+
+`ProfilingEnvironment` instruments the parsed templates: the loops,
+the conditions, the blocks, the macros and the included templates are
+wrapped by the filter blocks which measure the time and the size of
+their output. The statistics are collected to `Profile`, it writes
+them as the table and as the folded stacks of the flamegraph tools.
+"""
+import time
+from collections import namedtuple
+import jinja2
+from jinja2 import nodes
+
+
+_ENTER_FUNCTION = '_coculatex_profile_enter'
+
+_EXIT_FILTER = '_coculatex_profile_exit'
+
+# the conditions with these nodes are not wrapped, because the filter
+# block is the scope and the names set in them must stay visible
+_SCOPED_NODES = (nodes.Assign, nodes.AssignBlock, nodes.Macro,
+                 nodes.Import, nodes.FromImport, nodes.Block)
+
+# the fields of the statements lists (`If.elif_` must hold `If` nodes)
+_BODY_FIELDS = ('body', 'else_')
+
+SORT_KEYS = ('total', 'self', 'calls', 'bytes', 'label')
+
+Row = namedtuple('Row', 'label calls total self bytes')
+
+
+class Profile:
+    """The statistics of the rendering by the labels of the template parts."""
+
+    def __init__(self):
+        """Init the empty profile."""
+        # label -> [calls, total seconds, self seconds, output bytes]
+        self.stats = {}
+        # the folded stack -> self seconds
+        self.stacks = {}
+        self._frames = []
+
+    def enter(self, label):
+        """Start the part `label`, return the empty output."""
+        self._frames.append([label, time.perf_counter(), 0.0])
+        return ''
+
+    def exit(self, output, label):
+        """Finish the part `label` with the `output`, return the output."""
+        while self._frames and self._frames[-1][0] != label:
+            # the frame of the part interrupted by the exception
+            self._frames.pop()
+        if not self._frames:
+            return output
+        stack = ';'.join(frame[0] for frame in self._frames)
+        _, start, children = self._frames.pop()
+        elapsed = time.perf_counter() - start
+        if self._frames:
+            self._frames[-1][2] += elapsed
+        stats = self.stats.setdefault(label, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - children
+        stats[3] += len(str(output).encode('utf-8'))
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - children
+        return output
+
+    def rows(self, sort='total'):
+        """Return `list` of `Row` sorted by the key `sort`."""
+        rows = [Row(label, *stats) for label, stats in self.stats.items()]
+        if sort == 'label':
+            return sorted(rows)
+        return sorted(rows, key=lambda row: (-getattr(row, sort), row.label))
+
+    def write_table(self, file, sort='total'):
+        """Write the statistics as the table to the text `file`."""
+        file.write('{:>8} {:>12} {:>12} {:>12} {:>12}  {}\n'.format(
+            'calls', 'total ms', 'self ms', 'ms/call', 'bytes/call',
+            'part'))
+        for row in self.rows(sort):
+            file.write('{:>8} {:>12.3f} {:>12.3f} {:>12.3f} {:>12.0f}  '
+                       '{}\n'.format(row.calls,
+                                     row.total * 1000,
+                                     row.self * 1000,
+                                     row.total * 1000 / row.calls,
+                                     row.bytes / row.calls,
+                                     row.label))
+
+    def write_folded(self, file):
+        """
+        Write the folded stacks to the text `file`.
+
+        The values are the self times in microseconds, it is the input
+        of `flamegraph.pl` and the compatible tools.
+        """
+        for stack, seconds in sorted(self.stacks.items()):
+            file.write('{} {}\n'.format(stack, round(seconds * 1000000)))
+
+
+class ProfilingEnvironment(jinja2.Environment):
+    """
+    The environment which instruments the templates by `profile`.
+
+    `root_name` is the name of the template made from the string.
+    """
+
+    def __init__(self, profile, root_name='<root>', **options):
+        """Init the environment of the `profile`."""
+        super().__init__(**options)
+        self.profile = profile
+        self.root_name = root_name
+        self.globals[_ENTER_FUNCTION] = profile.enter
+        self.filters[_EXIT_FILTER] = profile.exit
+
+    def _parse(self, source, name, filename):
+        """Parse the template and instrument it."""
+        template = super()._parse(source, name, filename)
+        self._instrument(template, name or self.root_name)
+        template.set_environment(self)
+        return template
+
+    def _instrument(self, node, template_name):
+        """Wrap the profiled statements of the children of `node`."""
+        for field, value in node.iter_fields():
+            if not isinstance(value, list):
+                continue
+            children = []
+            for child in value:
+                if isinstance(child, nodes.Node):
+                    self._instrument(child, template_name)
+                    if field in _BODY_FIELDS:
+                        child = self._wrap(child, template_name)
+                children.append(child)
+            setattr(node, field, children)
+
+    def _wrap(self, node, template_name):
+        """Return the statement `node` wrapped by the profiler."""
+        if isinstance(node, (nodes.Block, nodes.Macro)):
+            node.body = [self._measure(
+                node.body, _label(type(node).__name__.lower(), node.name,
+                                  template_name, node.lineno),
+                node.lineno)]
+            return node
+        if isinstance(node, nodes.For):
+            detail = (node.target.name
+                      if isinstance(node.target, nodes.Name) else '')
+            return self._measure([node], _label('for', detail,
+                                                template_name, node.lineno),
+                                 node.lineno)
+        if isinstance(node, nodes.Include):
+            detail = (node.template.value
+                      if isinstance(node.template, nodes.Const) else '')
+            return self._measure([node], _label('include', detail,
+                                                template_name, node.lineno),
+                                 node.lineno)
+        if (isinstance(node, nodes.If)
+                and not any(node.find_all(_SCOPED_NODES))):
+            return self._measure([node], _label('if', '', template_name,
+                                                node.lineno),
+                                 node.lineno)
+        return node
+
+    @staticmethod
+    def _measure(body, label, lineno):
+        """Return the filter block which measures the `body`."""
+        enter = nodes.Output([nodes.Call(
+            nodes.Name(_ENTER_FUNCTION, 'load', lineno=lineno),
+            [nodes.Const(label, lineno=lineno)], [], None, None,
+            lineno=lineno)], lineno=lineno)
+        exit_filter = nodes.Filter(None, _EXIT_FILTER,
+                                   [nodes.Const(label, lineno=lineno)],
+                                   [], None, None, lineno=lineno)
+        return nodes.FilterBlock([enter] + list(body), exit_filter,
+                                 lineno=lineno)
+
+
+def _label(kind, detail, template_name, lineno):
+    """Return the label of the profiled part of the template."""
+    label = '{}{}@{}:{}'.format(kind, ':' + detail if detail else '',
+                                template_name, lineno)
+    return label.replace(';', '_').replace(' ', '_')
@@ -0,0 +1,227 @@
+"""
+Module contains the full-text search over the themes.
+
+Every theme and every subtheme is the document of the inverted index:
+its name, its description, the names of its parameters and the content
+of its root files are split to the lowercase terms weighted by the field.
+The index is kept in the cache directory with the modification times
+and the sizes of the files of every theme, only the themes with
+the changed files are indexed again. The results are ranked by
+the sum of the weights of the query terms multiplied by their idf.
+"""
+import json
+import logging
+import math
+import os
+import re
+from collections import (
+    Counter,
+    namedtuple)
+import yaml
+from coculatex import (
+    cache,
+    config,
+    files,
+    library,
+    metrics)
+
+
+LOG = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+FIELD_WEIGHTS = {'name': 5.0,
+                 'parameter': 3.0,
+                 'description': 2.0,
+                 'content': 1.0}
+
+SearchResult = namedtuple('SearchResult', 'name score description terms')
+
+_TERM = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Return `list` of the lowercase terms of `text`."""
+    return _TERM.findall(str(text).lower())
+
+
+def index_path(cache_path, themes_path):
+    """Return the path of the index of the themes in `themes_path`."""
+    return files.cache_file_path(cache_path, config.SEARCH_INDEX_SUBDIRECTORY,
+                                 themes_path)
+
+
+def _document(name, values, theme_path, signature):
+    """
+    Return the document of the (sub)theme `name` with the config `values`.
+
+    The root files read are added to `signature`.
+    """
+    fields = {'name': tokenize(name) + [name.lower()],
+              'description': tokenize(values.get('description') or ''),
+              'parameter': [],
+              'content': []}
+    parameters = values.get('parameters')
+    if isinstance(parameters, dict):
+        for parameter in parameters:
+            fields['parameter'] += [str(parameter).lower()]
+            fields['parameter'] += tokenize(parameter)
+    root_files = [values.get('root_file')]
+    if isinstance(values.get('root_files'), dict):
+        root_files += list(values['root_files'].values())
+    for root_file in root_files:
+        if not isinstance(root_file, str) or not root_file:
+            continue
+        path = os.path.join(theme_path, root_file)
+        signature[root_file] = files.file_signature(path)
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as file:
+                fields['content'] += tokenize(file.read())
+        except OSError as error:
+            LOG.debug('Cannot read the root file %s: %s', path, error)
+    terms = Counter()
+    for field, tokens in fields.items():
+        for term, count in Counter(tokens).items():
+            terms[term] += FIELD_WEIGHTS[field] * (1 + math.log(count))
+    description = str(values.get('description') or '').strip()
+    return {'description': (description.splitlines()[0] if description
+                            else ''),
+            'terms': {term: round(weight, 3)
+                      for term, weight in terms.items()}}
+
+
+def theme_documents(themes_path, theme):
+    """
+    Return the documents of the `theme` and its subthemes.
+
+    Return `dict` of the documents by the names and `dict` of
+    the signatures of the theme files by their relative paths.
+    """
+    theme_path = os.path.join(themes_path, theme)
+    signature = {}
+
+    def load(name, config_file):
+        path = os.path.join(theme_path, config_file)
+        signature[config_file] = files.file_signature(path)
+        try:
+            values = cache.load_yaml_file(path, kind='theme')
+        except (OSError, yaml.YAMLError) as error:
+            LOG.debug('Cannot load the config of the theme %s: %s',
+                      name, error)
+            return None
+        return values if isinstance(values, dict) else {}
+
+    documents = {name: _document(name, values, theme_path, signature)
+                 for name, _, values in library.walk_theme(theme, load)}
+    return documents, signature
+
+
+class SearchIndex:
+    """The inverted index of the themes in `themes_path` kept in `path`."""
+
+    def __init__(self, themes_path, path=None):
+        """Init the empty index, `path` is None for the index in memory."""
+        self.themes_path = themes_path
+        self.path = path
+        # the theme name -> {'signature': ..., 'documents': ...}
+        self.themes = {}
+        # the term -> {the document name: the weight}
+        self.postings = {}
+        self.descriptions = {}
+
+    def load(self):
+        """Load the index from `path`, the wrong index is ignored."""
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as error:
+            LOG.debug('Cannot load the search index %s: %s', self.path, error)
+            return
+        if (not isinstance(data, dict)
+                or data.get('version') != INDEX_VERSION
+                or data.get('themes_path') != self.themes_path):
+            LOG.debug('The search index %s is outdated', self.path)
+            return
+        self.themes = data['themes']
+        self._make_postings()
+
+    def save(self):
+        """Save the index to `path` atomically."""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        files.atomic_write(self.path, json.dumps(
+            {'version': INDEX_VERSION,
+             'themes_path': self.themes_path,
+             'themes': self.themes}, sort_keys=True))
+        LOG.debug('The search index %s is saved', self.path)
+
+    def update(self):
+        """
+        Index the new and the changed themes, drop the removed ones.
+
+        Return True if the index is changed.
+        """
+        try:
+            names = library.list_themes(self.themes_path)
+        except OSError as error:
+            LOG.error('Cannot list the themes of %s: %s',
+                      self.themes_path, error)
+            names = []
+        changed = False
+        for name in set(self.themes) - set(names):
+            LOG.debug('The theme %s is removed from the index', name)
+            del self.themes[name]
+            changed = True
+        for name in names:
+            entry = self.themes.get(name)
+            theme_path = os.path.join(self.themes_path, name)
+            if entry and all(
+                    files.file_signature(os.path.join(theme_path, path))
+                    == signature
+                    for path, signature in entry['signature'].items()):
+                metrics.CACHE_REQUESTS.inc(cache='search', result='hit')
+                continue
+            metrics.CACHE_REQUESTS.inc(cache='search', result='miss')
+            LOG.debug('The theme %s is indexed', name)
+            documents, signature = theme_documents(self.themes_path, name)
+            self.themes[name] = {'signature': signature,
+                                 'documents': documents}
+            changed = True
+        if changed:
+            self._make_postings()
+        return changed
+
+    def _make_postings(self):
+        """Make the postings of the terms from the documents."""
+        self.postings = {}
+        self.descriptions = {}
+        for entry in self.themes.values():
+            for name, document in entry['documents'].items():
+                self.descriptions[name] = document['description']
+                for term, weight in document['terms'].items():
+                    self.postings.setdefault(term, {})[name] = weight
+
+    def search(self, query, limit=None):
+        """
+        Return `list` of `SearchResult` of the `query` terms.
+
+        The documents with any of the terms are ranked by their score,
+        at most `limit` results are returned.
+        """
+        scores = Counter()
+        matched = {}
+        for term in set(tokenize(' '.join(query))):
+            postings = self.postings.get(term, {})
+            if not postings:
+                continue
+            idf = math.log(1 + len(self.descriptions) / len(postings))
+            for name, weight in postings.items():
+                scores[name] += weight * idf
+                matched.setdefault(name, []).append(term)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [SearchResult(name, round(score, 3), self.descriptions[name],
+                             sorted(matched[name]))
+                for name, score in ranked[:limit]]
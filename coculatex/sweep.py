@@ -0,0 +1,161 @@
+"""
+Module contains the rendering of the theme for the rows of a roster.
+
+The roster is the CSV file with the header or the file of JSON lines
+(`.jsonl`), every row overrides the parameters of the base project.
+The template is compiled once in every worker process, the rows are
+read lazily and only the limited number of them is sent to the workers
+at once, so the memory does not grow with the roster.
+"""
+import csv
+import functools
+import json
+import logging
+import os
+import re
+import string
+from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait)
+import jinja2
+from coculatex import (
+    files,
+    metrics,
+    preamble,
+    templates)
+
+
+LOG = logging.getLogger(__name__)
+
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+SweepResult = namedtuple('SweepResult', 'index name status size')
+
+# the state of the worker process made by `_init_worker`
+_WORKER = {}
+
+
+def read_roster(path):
+    """Iterate over `dict` rows of the roster `path`."""
+    if path.lower().endswith(JSON_LINES_EXTENSIONS):
+        with open(path, 'r', encoding='utf-8') as file:
+            for lineno, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('The line {} of the roster {} is not '
+                                     'the JSON object'.format(lineno, path))
+                yield row
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                # the fields missing in the short rows are None and
+                # the extra values are under None, both are dropped
+                yield {key: value for key, value in row.items()
+                       if key is not None and value is not None}
+
+
+def format_fields(name_format):
+    """Return `set` of the names of the values used by `name_format`."""
+    return {re.split(r'[.\[]', field)[0]
+            for _, field, _, _ in string.Formatter().parse(name_format)
+            if field}
+
+
+def output_name(name_format, index, values, row):
+    """
+    Return the name of the root file of the row without the extension.
+
+    `name_format` is formatted by the `values` of the base project
+    updated by the `row` and the 1-based `index` of the row.
+    """
+    mapping = dict(values)
+    mapping.update(row)
+    mapping.setdefault('index', index)
+    try:
+        name = name_format.format_map(mapping)
+    except KeyError as error:
+        raise ValueError('The row {} has no field {} of the output '
+                         'name'.format(index, error)) from None
+    if not name or name in (os.curdir, os.pardir) or os.sep in name:
+        raise ValueError('The output name `{}` of the row {} is not the file '
+                         'name'.format(name, index))
+    return name
+
+
+def _init_worker(root_path, content, options, parameters, values,
+                 tex_options, output_dir, name_format, metrics_enabled=False):
+    """Compile the root template once for the worker process."""
+    metrics.init_worker(metrics_enabled)
+    template = templates.SubstitutionTemplate.compile(content, options)
+    if template is None:
+        environment = jinja2.Environment(
+            loader=templates.TemplateLoader(os.path.dirname(root_path)),
+            **options)
+        template = environment.from_string(content)
+    _WORKER.update(template=template,
+                   parameters=parameters,
+                   values=values,
+                   tex_options=tex_options,
+                   output_dir=output_dir,
+                   name_format=name_format)
+
+
+def _render_row(index, row):
+    """
+    Render the root file of the `row` and return `SweepResult`.
+
+    The unchanged root file is not written again.
+    """
+    name = None
+    try:
+        name = output_name(_WORKER['name_format'], index,
+                           _WORKER['values'], row)
+        variables = dict(_WORKER['parameters'])
+        variables.update(row)
+        data = (_WORKER['tex_options'] + preamble.strip_static_end(
+            _WORKER['template'].render(**variables))).encode('utf-8')
+        written = files.write_changed(
+            os.path.join(_WORKER['output_dir'], name + '.tex'), data)
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.error('Cannot render the row %d of the roster: %s', index, error)
+        return SweepResult(index, name, 'failed', 0)
+    if not written:
+        return SweepResult(index, name, 'unchanged', 0)
+    return SweepResult(index, name, 'ok', len(data))
+
+
+def sweep(rows, jobs=None, **kwargs):
+    """
+    Render the root files of `rows` in the pool of `jobs` processes.
+
+    `kwargs` are passed to `_init_worker`. At most twice `jobs` rows
+    are rendered or waiting at once, the metrics of the workers are
+    merged into the registry of the process.
+    Iterate over `SweepResult` in the order of the completion.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    kwargs.setdefault('metrics_enabled', metrics.REGISTRY.enabled)
+    with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=functools.partial(_init_worker, **kwargs)) as executor:
+        pending = set()
+        for index, row in enumerate(rows, 1):
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _merge_result(future)
+            pending.add(executor.submit(metrics.call_measured, _render_row,
+                                        index, row))
+        for future in wait(pending).done:
+            yield _merge_result(future)
+
+
+def _merge_result(future):
+    """Merge the metrics of the done `future`, return its `SweepResult`."""
+    result, snapshot = future.result()
+    metrics.REGISTRY.merge(snapshot)
+    return result
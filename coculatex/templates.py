@@ -1,13 +1,43 @@
 """Module contains functions for working with various templates."""
+import functools
+import hashlib
+import keyword
 import logging
 import os
+import re
+import threading
+from collections import OrderedDict
 import yaml
-from jinja2 import BaseLoader, TemplateNotFound
-from coculatex import config
+from jinja2 import (
+    BaseLoader,
+    Environment,
+    TemplateNotFound,
+    meta,
+    nodes)
+from jinja2.defaults import DEFAULT_NAMESPACE
+from jinja2.ext import Extension
+from coculatex import (
+    cache,
+    config,
+    metrics)
 
 
 LOG = logging.getLogger(__name__)
 
+# the fragments of the `cache` blocks rendered by the process
+_FRAGMENTS = OrderedDict()
+
+_FRAGMENTS_LOCK = threading.Lock()
+
+# the names of the expressions which are not the plain variable lookups
+_RESERVED_NAMES = (frozenset(keyword.kwlist) | frozenset(DEFAULT_NAMESPACE)
+                   | {'true', 'false', 'none', 'and', 'or', 'not', 'in',
+                      'is', 'if', 'else'})
+
+# the extensions which only add the tags, they do not change
+# the templates without the blocks
+_TAG_EXTENSIONS = ('coculatex.templates.FragmentCacheExtension',)
+
 
 class TemplateLoader(BaseLoader):
     """Redefined BaseLoader to specify path where search the templates."""
@@ -15,6 +45,8 @@ class TemplateLoader(BaseLoader):
     def __init__(self, path):
         """Init the Loader by using path variabel."""
         self.path = path
+        # the paths of the loaded templates
+        self.loaded = set()
         LOG.debug('Define the TemplateLoader for the path %s', self.path)
 
     def get_source(self, environment, template):
@@ -22,12 +54,162 @@ class TemplateLoader(BaseLoader):
         path = os.path.join(self.path, template)
         if not os.path.exists(path):
             raise TemplateNotFound(template)
+        self.loaded.add(path)
         mtime = os.path.getmtime(path)
         with open(path, encoding='utf-8') as file:
             source = file.read()
         return source, path, lambda: mtime == os.path.getmtime(path)
 
 
+class FragmentCacheExtension(Extension):
+    """
+    The block `cache` which memoizes its rendered body.
+
+    `\\BLOCK{cache 'name', lang}...\\BLOCK{endcache}` renders the body
+    once for every template, body and values of the arguments.
+    The template is named by the path of its loader and its name,
+    so the root templates made by `from_string` (without the names)
+    of the different themes do not share the fragments.
+    The fragments are kept in the memory of the process and in
+    the `cache.FragmentCache` set by `cache.set_fragment_cache`.
+    The body must depend only on the arguments, the templates included
+    by it are not tracked and the names set in it are not visible after it.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        """Parse the block `cache`."""
+        lineno = next(parser.stream).lineno
+        arguments = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            arguments.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        body_digest = hashlib.sha256(
+            repr(body).encode('utf-8')).hexdigest()
+        template_name = os.path.join(
+            getattr(self.environment.loader, 'path', None) or '',
+            parser.name or '')
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.Const(template_name),
+                                         nodes.Const(body_digest),
+                                         nodes.List(arguments)]),
+            [], [], body).set_lineno(lineno)
+
+    @staticmethod
+    def _render(template_name, body_digest, arguments, caller):
+        """Return the fragment from the caches or render it by `caller`."""
+        key = cache.FragmentCache.make_key(template_name, body_digest,
+                                           arguments)
+        with _FRAGMENTS_LOCK:
+            data = _FRAGMENTS.get(key)
+            if data is not None:
+                _FRAGMENTS.move_to_end(key)
+        if data is not None:
+            metrics.CACHE_REQUESTS.inc(cache='fragment', result='hit')
+            return data
+        fragment_cache = cache.get_fragment_cache()
+        if fragment_cache is not None:
+            data = fragment_cache.get(key)
+        metrics.CACHE_REQUESTS.inc(
+            cache='fragment', result='miss' if data is None else 'hit')
+        if data is None:
+            data = str(caller())
+            if fragment_cache is not None:
+                fragment_cache.put(key, data)
+        with _FRAGMENTS_LOCK:
+            _FRAGMENTS[key] = data
+            while len(_FRAGMENTS) > config.FRAGMENT_MEMORY_MAX_ENTRIES:
+                _FRAGMENTS.popitem(last=False)
+        return data
+
+
+class SubstitutionTemplate:
+    """
+    The template made only of the substitutions of the variables.
+
+    The templates with the plain names (`\\VAR{name}`) only render
+    the same output without Jinja2 (see `compile`): the text is split
+    by the names once and the rendering joins the parts with the values.
+    """
+
+    def __init__(self, texts, names):
+        """Init the template of the `texts` between the `names`."""
+        self.texts = texts
+        self.names = names
+
+    @classmethod
+    def compile(cls, content, options):
+        """
+        Return the template of `content` or None if it needs Jinja2.
+
+        `options` are the Jinja2 settings. Jinja2 is needed for the blocks,
+        the comments, the line statements and the line comments, any
+        expression except the name, the autoescaping, the extensions
+        which are not only the tags and the carriage returns (Jinja2
+        normalizes the newlines).
+        """
+        extensions = tuple(options.get('extensions') or ())
+        if (options.get('autoescape')
+                or not set(extensions) <= set(_TAG_EXTENSIONS)):
+            return None
+        split = _split_substitutions(
+            content,
+            options.get('block_start_string', '{%'),
+            options.get('variable_start_string', '{{'),
+            options.get('variable_end_string', '}}'),
+            options.get('comment_start_string', '{#'),
+            options.get('line_statement_prefix'),
+            options.get('line_comment_prefix'))
+        return None if split is None else cls(*split)
+
+    def render(self, *args, **kwargs):
+        """Render the template by the variables like `jinja2.Template`."""
+        variables = dict(*args, **kwargs)
+        parts = [self.texts[0]]
+        for name, text in zip(self.names, self.texts[1:]):
+            # the undefined variables are empty like `jinja2.Undefined`
+            if name in variables:
+                parts.append(str(variables[name]))
+            parts.append(text)
+        return ''.join(parts)
+
+
+@functools.lru_cache(maxsize=128)
+def _split_substitutions(content, block_start, variable_start, variable_end,
+                         comment_start, line_statement_prefix,
+                         line_comment_prefix):
+    """
+    Split `content` by the substitutions of the variables.
+
+    Return `tuple` of the texts and `tuple` of the names between them
+    or None if `content` has anything else.
+    """
+    markers = (block_start, comment_start, line_statement_prefix,
+               line_comment_prefix, '\r')
+    if any(marker and marker in content for marker in markers):
+        return None
+    # Jinja2 drops the single newline at the end of the template
+    if content.endswith('\n'):
+        content = content[:-1]
+    substitution = re.compile(r'{}\s*([A-Za-z_][A-Za-z0-9_]*)\s*{}'.format(
+        re.escape(variable_start), re.escape(variable_end)))
+    texts = []
+    names = []
+    position = 0
+    while True:
+        start = content.find(variable_start, position)
+        if start < 0:
+            texts.append(content[position:])
+            return tuple(texts), tuple(names)
+        match = substitution.match(content, start)
+        if match is None or match.group(1) in _RESERVED_NAMES:
+            return None
+        texts.append(content[position:start])
+        names.append(match.group(1))
+        position = match.end()
+
+
 def extract_variables(file):
     """
     Extract variables from templates.
@@ -49,9 +231,69 @@ def extract_variables(file):
         else:
             cleared_template += line
     try:
-        values = yaml.safe_load(var_strings)
+        values = cache.load_yaml_string(var_strings, kind='header')
     except yaml.scanner.ScannerError as error:
         LOG.debug('The problem happens while load values from '
                   'the string %s: %s', var_strings, error)
         values = {}
     return values, cleared_template
+
+
+def template_options(values):
+    """
+    Return the Jinja2 settings of the template with the header `values`.
+
+    The defaults of `config.JINJA2_DEFAULT_CONFIG` are updated by
+    the known settings of the header, the other keys are ignored.
+    The extensions of the header are added to the default ones.
+    """
+    options = dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG))
+    if isinstance(values, dict):
+        extensions = list(options['extensions'])
+        options.update({key: value for key, value in values.items()
+                        if key in options})
+        added = options['extensions']
+        if isinstance(added, str):
+            added = [added]
+        options['extensions'] = extensions + [
+            extension for extension in added or ()
+            if extension not in extensions]
+    return options
+
+
+def referenced_variables(root_path, content, options):
+    """
+    Find the variables referenced by the root template.
+
+    `content` is the root template `root_path` without the header,
+    `options` are the Jinja2 settings. The templates extended, included
+    and imported by it are analyzed too, the variables set by a template
+    for the included ones are counted as referenced.
+    Return `set` of the names or None if the name of any loaded template
+    is not constant, and `set` of the paths of the analyzed templates.
+    """
+    loader = TemplateLoader(os.path.dirname(root_path))
+    template = SubstitutionTemplate.compile(content, options)
+    if template is not None:
+        return set(template.names), loader.loaded
+    environment = Environment(loader=loader, **options)
+    names = set()
+    seen = set()
+    sources = [content]
+    while sources:
+        tree = environment.parse(sources.pop())
+        names |= meta.find_undeclared_variables(tree)
+        for template in meta.find_referenced_templates(tree):
+            if template is None:
+                LOG.debug('The template of %s is loaded by the dynamic name',
+                          root_path)
+                return None, loader.loaded
+            if template in seen:
+                continue
+            seen.add(template)
+            try:
+                sources.append(loader.get_source(environment, template)[0])
+            except TemplateNotFound:
+                LOG.debug('The template %s is not found', template)
+    LOG.debug('The variables referenced by %s: %s', root_path, names)
+    return names, loader.loaded
@@ -0,0 +1,314 @@
+"""
+Module contains the validation of the library of the themes.
+
+Every theme and subtheme is loaded like by the command `apply`, but
+nothing is rendered or written: the configs must parse, the root files
+must exist and compile (with the Jinja2 settings of their headers)
+together with the templates they extend, include and import, and
+the included files must exist. The themes are checked in the pool of
+processes. The problems of every theme are kept in the cache directory
+with the modification times and the sizes of the files read by its
+check, the unchanged themes are not checked again.
+"""
+import functools
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import jinja2
+import yaml
+from jinja2 import meta
+from coculatex import (
+    __version__ as VERSION,
+    cache,
+    config,
+    files,
+    library,
+    metrics,
+    templates)
+
+
+LOG = logging.getLogger(__name__)
+
+Problem = namedtuple('Problem', 'theme path line message')
+
+ThemeReport = namedtuple('ThemeReport', 'theme problems cached')
+
+
+def results_path(cache_path, themes_path):
+    """Return the path of the cached results of the themes in `themes_path`."""
+    return files.cache_file_path(cache_path, config.CHECK_RESULTS_SUBDIRECTORY,
+                                 themes_path)
+
+
+def _error_line(error, numbers=None):
+    """
+    Return the line of the YAML or Jinja2 `error` or None.
+
+    `numbers` maps the 0-based lines of the parsed text to the lines
+    of the file.
+    """
+    mark = getattr(error, 'problem_mark', None)
+    if mark is not None:
+        line = mark.line
+    elif getattr(error, 'lineno', None):
+        line = error.lineno - 1
+    else:
+        return None
+    if numbers is None:
+        return line + 1
+    return numbers[min(line, len(numbers) - 1)] if numbers else None
+
+
+class _ThemeCheck:
+    """The check of the theme `theme` in `themes_path`."""
+
+    def __init__(self, themes_path, theme):
+        """Init the check."""
+        self.theme = theme
+        self.theme_path = os.path.join(themes_path, theme)
+        self.problems = []
+        # the relative path -> the signature of the files read
+        self.signature = {}
+        self.checked = set()
+
+    def report(self, name, path, line, message):
+        """Add the problem of the (sub)theme `name`."""
+        self.problems.append(Problem(name, path, line, message))
+
+    def touch(self, path):
+        """Add `path` to the signature, return True if it exists."""
+        signature = files.file_signature(path)
+        self.signature[os.path.relpath(path, self.theme_path)] = signature
+        return signature is not None
+
+    def load_config(self, name, config_file):
+        """Return the values of the config of `name` or None."""
+        path = os.path.join(self.theme_path, config_file)
+        if not self.touch(path):
+            self.report(name, path, None, 'the config is not found')
+            return None
+        try:
+            values = cache.load_yaml_file(path, kind='theme')
+        except (OSError, UnicodeDecodeError) as error:
+            self.report(name, path, None,
+                        'cannot read the config: {}'.format(error))
+            return None
+        except yaml.YAMLError as error:
+            self.report(name, path, _error_line(error),
+                        'the config does not parse: {}'.format(
+                            getattr(error, 'problem', None) or error))
+            return None
+        if not isinstance(values, dict):
+            self.report(name, path, None, 'the config is not a mapping')
+            return None
+        return values
+
+    def run(self):
+        """Check the theme and its subthemes, return the problems."""
+        for name, config_file, values in library.walk_theme(
+                self.theme, self.load_config, self.report_config):
+            self.check_values(name, values,
+                              os.path.join(self.theme_path, config_file))
+        return self.problems
+
+    def report_config(self, name, config_file, message):
+        """Add the problem of the config file of the (sub)theme `name`."""
+        self.report(name, os.path.join(self.theme_path, config_file), None,
+                    message)
+
+    def check_values(self, name, values, config_path):
+        """Check the root and the included files of the (sub)theme."""
+        root_files = []
+        if values.get('root_file'):
+            root_files.append(values['root_file'])
+        else:
+            self.report(name, config_path, None, '`root_file` is not set')
+        if isinstance(values.get('root_files'), dict):
+            root_files += list(values['root_files'].values())
+        for root_file in root_files:
+            if not isinstance(root_file, str):
+                self.report(name, config_path, None,
+                            'the root file {!r} is not a path'.format(
+                                root_file))
+                continue
+            path = os.path.join(self.theme_path, root_file)
+            if not self.touch(path):
+                self.report(name, config_path, None,
+                            'the root file `{}` is not found'.format(
+                                root_file))
+            elif path not in self.checked:
+                self.checked.add(path)
+                self.check_template(name, path)
+        include_files = values.get('include_files') or {}
+        if not isinstance(include_files, dict):
+            self.report(name, config_path, None,
+                        'the included files are not a mapping')
+            return
+        for dst, src in include_files.items():
+            if isinstance(src, dict):
+                src = src.get('file')
+            if not isinstance(src, str):
+                self.report(name, config_path, None,
+                            'the source of the included file `{}` is not '
+                            'a path'.format(dst))
+            elif not self.touch(os.path.join(self.theme_path, src)):
+                self.report(name, config_path, None,
+                            'the included file `{}` is not found'.format(src))
+
+    def check_template(self, name, path):
+        """Compile the root template `path` and the templates it loads."""
+        header = []
+        header_numbers = []
+        content = []
+        content_numbers = []
+        prefix = config.YAML_LINE_PREFIX
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                for number, line in enumerate(file, 1):
+                    if line.startswith(prefix):
+                        header.append(line[len(prefix):])
+                        header_numbers.append(number)
+                    else:
+                        content.append(line)
+                        content_numbers.append(number)
+        except (OSError, UnicodeDecodeError) as error:
+            self.report(name, path, None,
+                        'cannot read the template: {}'.format(error))
+            return
+        try:
+            values = cache.load_yaml_string(''.join(header), kind='header')
+        except yaml.YAMLError as error:
+            self.report(name, path, _error_line(error, header_numbers),
+                        'the header does not parse: {}'.format(
+                            getattr(error, 'problem', None) or error))
+            values = {}
+        loader = templates.TemplateLoader(self.theme_path)
+        try:
+            environment = jinja2.Environment(
+                loader=loader, **templates.template_options(values))
+            tree = environment.parse(''.join(content))
+            environment.compile(tree)
+        except jinja2.exceptions.TemplateSyntaxError as error:
+            self.report(name, path, _error_line(error, content_numbers),
+                        'the template does not compile: {}'.format(
+                            error.message))
+            return
+        except (TypeError, ValueError,
+                jinja2.exceptions.TemplateError) as error:
+            self.report(name, path, None,
+                        'the template does not compile: {}'.format(error))
+            return
+        trees = [(path, tree)]
+        seen = set()
+        while trees:
+            parent, tree = trees.pop()
+            for template in meta.find_referenced_templates(tree):
+                if template is None or template in seen:
+                    continue
+                seen.add(template)
+                try:
+                    environment.get_template(template)
+                    trees.append((
+                        os.path.join(self.theme_path, template),
+                        environment.parse(
+                            loader.get_source(environment, template)[0])))
+                except jinja2.exceptions.TemplateNotFound:
+                    self.touch(os.path.join(self.theme_path, template))
+                    self.report(name, parent, None,
+                                'the template `{}` is not found'.format(
+                                    template))
+                except jinja2.exceptions.TemplateSyntaxError as error:
+                    self.report(name, error.filename or template,
+                                error.lineno,
+                                'the template does not compile: {}'.format(
+                                    error.message))
+        for loaded in loader.loaded:
+            self.touch(loaded)
+
+
+def check_theme(themes_path, theme):
+    """
+    Check the `theme` and its subthemes.
+
+    Return `list` of the problems as lists and `dict` of the signatures
+    of the files read by the check by their paths relative to the theme.
+    """
+    check = _ThemeCheck(themes_path, theme)
+    problems = check.run()
+    return [list(problem) for problem in problems], check.signature
+
+
+def _is_fresh(theme_path, result):
+    """Return True if the files of the cached `result` are unchanged."""
+    return bool(result.get('signature')) and all(
+        files.file_signature(os.path.join(theme_path, path)) == signature
+        for path, signature in result['signature'].items())
+
+
+def _load_results(path, themes_path):
+    """Return the stored results of the checks in `path` or empty `dict`."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if (data.get('version') == VERSION
+                and data.get('themes_path') == themes_path):
+            return dict(data['themes'])
+    except (OSError, ValueError, AttributeError, KeyError,
+            TypeError) as error:
+        LOG.debug('Cannot load the results of the checks %s: %s',
+                  path, error)
+    return {}
+
+
+def check_themes(themes_path, themes, path=None, jobs=None):
+    """
+    Check the `themes` in the pool of `jobs` processes.
+
+    The results of the unchanged themes are taken from the file `path`
+    (None disables it), the new results are merged into it under
+    the lock, so the concurrent checks do not lose the results of each
+    other. Return `list` of `ThemeReport` in the order of `themes`.
+    """
+    stored = {} if path is None else _load_results(path, themes_path)
+    reports = {}
+    pending = []
+    for theme in themes:
+        result = stored.get(theme)
+        if result and _is_fresh(os.path.join(themes_path, theme), result):
+            reports[theme] = ThemeReport(
+                theme, [Problem(*problem) for problem in result['problems']],
+                True)
+        else:
+            pending.append(theme)
+    LOG.debug('%d themes are checked, %d are cached',
+              len(pending), len(reports))
+    if pending:
+        checked = {}
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=functools.partial(
+                    metrics.init_worker, metrics.REGISTRY.enabled)
+        ) as executor:
+            for theme, ((problems, signature), snapshot) in zip(
+                    pending, executor.map(
+                        functools.partial(
+                            metrics.call_measured,
+                            functools.partial(check_theme, themes_path)),
+                        pending)):
+                metrics.REGISTRY.merge(snapshot)
+                checked[theme] = {'problems': problems,
+                                  'signature': signature}
+                reports[theme] = ThemeReport(
+                    theme, [Problem(*problem) for problem in problems], False)
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with files.file_lock(files.lock_path(path)):
+                stored = _load_results(path, themes_path)
+                stored.update(checked)
+                files.atomic_write(path, json.dumps(
+                    {'version': VERSION,
+                     'themes_path': themes_path,
+                     'themes': stored}, sort_keys=True))
+    return [reports[theme] for theme in themes]
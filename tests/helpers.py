@@ -0,0 +1,35 @@
+"""The helpers shared by the tests."""
+import os
+import subprocess
+import sys
+
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+THEMES_PATH = os.path.join(ROOT_DIRECTORY, 'example', 'themes')
+
+THEME_PATH = os.path.join(THEMES_PATH, 'dmarticle')
+
+
+def environment():
+    """Return the environment of the programs run from the sources."""
+    return dict(os.environ, PYTHONPATH=ROOT_DIRECTORY)
+
+
+def coculatex_command(arguments, themes_path=THEMES_PATH):
+    """Return the command line of the program with `arguments`."""
+    return ([sys.executable, '-m', 'coculatex.main', '-t', themes_path]
+            + list(arguments))
+
+
+def run_coculatex(arguments, themes_path=THEMES_PATH, **kwargs):
+    """
+    Run the program with `arguments`, return `subprocess.CompletedProcess`.
+
+    Its stdout is captured and it must succeed by default, `kwargs`
+    are passed to `subprocess.run`.
+    """
+    kwargs.setdefault('stdout', subprocess.PIPE)
+    kwargs.setdefault('check', True)
+    return subprocess.run(coculatex_command(arguments, themes_path),
+                          env=environment(), **kwargs)
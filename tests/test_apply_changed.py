@@ -0,0 +1,148 @@
+"""Testing the `apply --changed-since` and `apply --staged` modes."""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+from coculatex import changes
+from helpers import (
+    THEMES_PATH,
+    run_coculatex)
+
+
+class ApplyChangedTestCase(unittest.TestCase):
+    """Test Case for the re-apply of the changed projects."""
+
+    def setUp(self):
+        """Prepare the repository with two projects and the themes."""
+        if not shutil.which('git'):
+            self.skipTest('git is not found')
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = self.temp_dir.name
+        self.themes_path = os.path.join(self.repository, 'themes')
+        shutil.copytree(THEMES_PATH, self.themes_path)
+        for name in ('first', 'second'):
+            self.write(os.path.join(name, name + '.yaml'),
+                       'theme: dmarticle.en\nproject-name: {}\n'
+                       'title: {}\n'.format(name, name))
+            self.write(os.path.join(name, name + '.source.tex'), 'Text\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@test',
+                 'commit', '-q', '-m', 'init')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the file of the repository."""
+        path = os.path.join(self.repository, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+    def git(self, *arguments):
+        """Run git in the repository."""
+        subprocess.run(['git', '-C', self.repository] + list(arguments),
+                       check=True)
+
+    def apply(self, *arguments, themes_path=None, check=True):
+        """Run the action `apply` and return its stdout."""
+        process = run_coculatex(
+            ['--no-cache', 'apply'] + list(arguments) + [self.repository],
+            themes_path=themes_path or self.themes_path,
+            stderr=subprocess.PIPE, check=check)
+        if not check:
+            return process.returncode
+        return process.stdout.decode('utf-8')
+
+    def applied(self, name):
+        """Return True if the root file of the project exists."""
+        return os.path.isfile(
+            os.path.join(self.repository, name, name + '.tex'))
+
+    def test_changed_config(self):
+        """Test only the project with the changed config is applied."""
+        self.write(os.path.join('second', 'second.yaml'),
+                   'theme: dmarticle.en\nproject-name: second\n'
+                   'title: Changed\n')
+        output = self.apply('--changed-since', 'HEAD')
+        self.assertIn('second.yaml', output)
+        self.assertFalse(self.applied('first'))
+        self.assertTrue(self.applied('second'))
+
+    def test_staged_theme(self):
+        """Test the staged change of the theme affects all its projects."""
+        self.write(os.path.join('themes', 'dmarticle', 'en.yaml'),
+                   'root_file: en.tex\n')
+        self.assertIn('There are no changed projects',
+                      self.apply('--staged'))
+        self.git('add', 'themes')
+        self.apply('--staged', '--jobs', '2')
+        self.assertTrue(self.applied('first'))
+        self.assertTrue(self.applied('second'))
+
+    def test_changed_source(self):
+        """Test the source change applies the project of its config."""
+        self.write(os.path.join('first', 'first.source.tex'), 'Changed\n')
+        self.assertIn('first.yaml', self.apply('--changed-since', 'HEAD'))
+        self.assertTrue(self.applied('first'))
+        self.assertFalse(self.applied('second'))
+
+    def test_only_changed_files_are_loaded(self):
+        """Test the unchanged projects are not loaded."""
+        source = os.path.join(self.repository, 'first', 'first.source.tex')
+        with mock.patch('coculatex.changes._load_project',
+                        wraps=changes._load_project) as load:
+            projects = changes.find_projects(self.repository, {source})
+        self.assertEqual([project.config_file for project in projects],
+                         [os.path.join(self.repository,
+                                       'first', 'first.yaml')])
+        self.assertEqual(
+            sorted(os.path.basename(call[0][0])
+                   for call in load.call_args_list),
+            ['first.source.tex', 'first.yaml'])
+
+    def test_themes_repository_without_revision(self):
+        """Test the revision unknown to the themes repository fails."""
+        themes_path = os.path.join(self.temp_dir.name, 'separate')
+        shutil.copytree(THEMES_PATH, themes_path)
+        for arguments in (('init', '-q'), ('add', '.'),
+                          ('-c', 'user.name=test', '-c',
+                           'user.email=test@test',
+                           'commit', '-q', '-m', 'init')):
+            subprocess.run(['git', '-C', themes_path] + list(arguments),
+                           check=True)
+        revision = subprocess.run(
+            ['git', '-C', self.repository, 'rev-parse', 'HEAD'],
+            stdout=subprocess.PIPE, check=True).stdout.decode().strip()
+        self.assertEqual(self.apply('--changed-since', revision,
+                                    themes_path=themes_path, check=False),
+                         1)
+
+    def test_metrics_of_workers(self):
+        """Test the metrics of the pool workers are merged."""
+        self.write(os.path.join('first', 'first.source.tex'), 'Changed\n')
+        self.write(os.path.join('second', 'second.source.tex'), 'Changed\n')
+        metrics_path = os.path.join(self.temp_dir.name, 'metrics.json')
+        run_coculatex(
+            ['--cache-path', os.path.join(self.temp_dir.name, 'cache'),
+             '--metrics-json', metrics_path, 'apply', '--changed-since',
+             'HEAD', '--jobs', '2', self.repository],
+            themes_path=self.themes_path)
+        with open(metrics_path, encoding='utf-8') as file:
+            values = json.load(file)
+        self.assertEqual(
+            values['coculatex_projects_rendered_total'][0]['value'], 2)
+        self.assertEqual(
+            values['coculatex_render_seconds'][0]['count'], 2)
+        self.assertTrue(any(
+            sample['cache'] == 'render' and sample['value']
+            for sample in values['coculatex_cache_requests_total']))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
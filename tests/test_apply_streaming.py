@@ -0,0 +1,75 @@
+"""Testing the `apply -` streaming mode."""
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from helpers import run_coculatex
+
+
+SOURCE = ('%%= theme: dmarticle.ru\n'
+          '%%= project-name: paper\n'
+          '%%= title: Streamed\n'
+          'Hello, World!\n')
+
+
+def run_streaming(arguments, stdin, cwd):
+    """Run the program with `stdin` and return its stdout."""
+    return run_coculatex(['--no-cache'] + arguments,
+                         input=stdin.encode('utf-8'), cwd=cwd).stdout
+
+
+class ApplyStreamingTestCase(unittest.TestCase):
+    """Test Case for the action `apply` with stdin input."""
+
+    def setUp(self):
+        """Prepare the working directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_root_to_stdout(self):
+        """Test the root file is written to stdout only."""
+        output = run_streaming(['apply', '-'], SOURCE, self.temp_dir.name)
+        self.assertTrue(output.startswith(b'%!TEX options=-shell-escape\n'))
+        self.assertIn(b'Streamed}', output)
+        self.assertIn(b'\\input{paper.source.tex}', output)
+        self.assertNotIn(b'static-preamble-end', output)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_emit_dir(self):
+        """Test the source and included files go to the directory."""
+        emit_dir = os.path.join(self.temp_dir.name, 'out')
+        run_streaming(['apply', '--emit-dir', emit_dir, '-'],
+                      SOURCE, self.temp_dir.name)
+        self.assertEqual(sorted(os.listdir(emit_dir)),
+                         ['amsbib.sty', 'bibliography.bib',
+                          'paper.source.tex'])
+        with open(os.path.join(emit_dir, 'paper.source.tex'),
+                  encoding='utf-8') as file:
+            self.assertEqual(file.read(), '%!TEX root=paper.tex\n' + SOURCE)
+
+    def test_tar_stream(self):
+        """Test all the files are written as the tar stream."""
+        output = run_streaming(['apply', '--emit-tar', '-', '-'],
+                               SOURCE, self.temp_dir.name)
+        with tarfile.open(fileobj=io.BytesIO(output)) as tar:
+            self.assertEqual(tar.getnames(),
+                             ['paper.tex', 'paper.source.tex',
+                              'amsbib.sty', 'bibliography.bib'])
+
+    def test_archive(self):
+        """Test the project is written to the archive only."""
+        output = run_streaming(['apply', '--archive', '-', '-'],
+                               SOURCE, self.temp_dir.name)
+        with tarfile.open(fileobj=io.BytesIO(output), mode='r:gz') as tar:
+            self.assertEqual(tar.getnames(),
+                             ['paper.tex', 'paper.source.tex',
+                              'amsbib.sty', 'bibliography.bib'])
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
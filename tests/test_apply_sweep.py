@@ -0,0 +1,122 @@
+"""Testing the `apply --sweep` mode."""
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+from coculatex import sweep
+from helpers import run_coculatex
+
+
+class ApplySweepTestCase(unittest.TestCase):
+    """Test Case for the rendering of the roster."""
+
+    def setUp(self):
+        """Prepare the project config."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = self.write(
+            'letter.yaml',
+            'theme: dmarticle.en\nproject-name: letter\ntitle: Base\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the file of the project and return its path."""
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def read(self, name):
+        """Return the content of the file of the project."""
+        with open(os.path.join(self.temp_dir.name, name),
+                  encoding='utf-8') as file:
+            return file.read()
+
+    def apply(self, *arguments):
+        """Run the action `apply` and return its exit code."""
+        return run_coculatex(
+            ['--no-cache', 'apply', '-c', self.config_path, '--jobs', '2']
+            + list(arguments),
+            stderr=subprocess.PIPE, check=False).returncode
+
+    def test_csv(self):
+        """Test every row of the CSV roster is rendered."""
+        roster = self.write('roster.csv',
+                            'title,code\nFirst,a\n"Second, too",b\n')
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', 'paper-{code}'), 0)
+        self.assertIn('\\title{First}', self.read('paper-a.tex'))
+        self.assertIn('\\title{Second, too}', self.read('paper-b.tex'))
+        self.assertIn('\\input{letter.source.tex}', self.read('paper-a.tex'))
+        self.assertNotIn('static-preamble-end', self.read('paper-a.tex'))
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.temp_dir.name, 'bibliography.bib')))
+
+    def test_json_lines(self):
+        """Test the rows of JSON lines are named by the default format."""
+        roster = self.write('roster.jsonl', '\n'.join(
+            json.dumps({'title': title}) for title in ('One', 'Two')))
+        self.assertEqual(self.apply('--sweep', roster), 0)
+        self.assertIn('\\title{Two}', self.read('letter-2.tex'))
+
+    def test_unknown_field(self):
+        """Test the row without the field of the name fails."""
+        roster = self.write('roster.csv', 'title\nFirst\n')
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', '{code}'), 1)
+
+    def test_output_name(self):
+        """Test the output name must be the file name."""
+        self.assertEqual(sweep.output_name('{project-name}-{index}', 3,
+                                           {'project-name': 'x'}, {}),
+                         'x-3')
+        with self.assertRaises(ValueError):
+            sweep.output_name('{name}', 1, {}, {'name': '../x'})
+
+    def test_short_row(self):
+        """Test the fields missing in the short rows are not None."""
+        roster = self.write('roster.csv', 'code,title,who\na,First,Ann\nX\n')
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', '{who}'), 1)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.temp_dir.name, 'None.tex')))
+        roster = self.write('roster.csv', 'code,title\na,First\nb\n')
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', '{code}'), 0)
+        self.assertIn('\\title{Base}', self.read('b.tex'))
+
+    def test_missing_name_field(self):
+        """Test the missing field of the output name is `ValueError`."""
+        with self.assertRaises(ValueError):
+            sweep.output_name('{code}', 1, {}, {})
+
+    def test_unchanged_rows(self):
+        """Test the unchanged root files are not written again."""
+        roster = self.write('roster.csv', 'title,code\nFirst,a\n')
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', '{code}'), 0)
+        path = os.path.join(self.temp_dir.name, 'a.tex')
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(self.apply('--sweep', roster,
+                                    '--sweep-name', '{code}'), 0)
+        self.assertEqual(os.stat(path).st_mtime_ns, 0)
+
+    def test_render_error(self):
+        """Test the runtime error of the template fails only its row."""
+        template = mock.Mock()
+        template.render.side_effect = TypeError('unsupported operand')
+        with mock.patch.dict(sweep._WORKER,
+                             {'template': template, 'parameters': {},
+                              'values': {}, 'tex_options': '',
+                              'output_dir': self.temp_dir.name,
+                              'name_format': '{index}'}):
+            self.assertEqual(sweep._render_row(1, {}),
+                             sweep.SweepResult(1, '1', 'failed', 0))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,82 @@
+"""Testing the writers of the project archives."""
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from coculatex import archive
+from coculatex.cache import ArchiveMemberCache
+
+
+class ArchiveTestCase(unittest.TestCase):
+    """Test Case for the module `archive`."""
+
+    def setUp(self):
+        """Prepare the assets."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.assets = os.path.join(self.temp_dir.name, 'assets')
+        os.makedirs(os.path.join(self.assets, 'pictures'))
+        for name, content in (('style.sty', b'\\relax\n'),
+                              (os.path.join('pictures', 'a.png'),
+                               b'\x89PNG' * 300)):
+            with open(os.path.join(self.assets, name), 'wb') as file:
+                file.write(content)
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, project):
+        """Write the project to the archive."""
+        project.add_bytes('paper.tex', b'\\documentclass{article}\n')
+        project.add_path(os.path.join(self.assets, 'style.sty'), 'style.sty')
+        project.add_path(os.path.join(self.assets, 'pictures'), 'pictures')
+
+    def test_tar_gz(self):
+        """Test the gzip members make the valid tar archive."""
+        member_cache = ArchiveMemberCache(
+            os.path.join(self.temp_dir.name, 'cache'))
+        outputs = []
+        for _ in range(2):
+            output = io.BytesIO()
+            with archive.TarGzArchive(output, member_cache) as project:
+                self.write(project)
+            outputs.append(output.getvalue())
+        self.assertEqual(member_cache.stats()['entries'], 2)
+        for output in outputs:
+            with tarfile.open(fileobj=io.BytesIO(output),
+                              mode='r:gz') as tar:
+                self.assertEqual(tar.getnames(),
+                                 ['paper.tex', 'style.sty', 'pictures',
+                                  'pictures/a.png'])
+                self.assertEqual(
+                    tar.extractfile('pictures/a.png').read(),
+                    b'\x89PNG' * 300)
+
+    def test_archive_file(self):
+        """Test the format is defined by the extension."""
+        path = os.path.join(self.temp_dir.name, 'project.zip')
+        with archive.ArchiveFile(path) as project:
+            self.write(project)
+        with zipfile.ZipFile(path) as zip_file:
+            self.assertEqual(zip_file.read('style.sty'), b'\\relax\n')
+            self.assertIn('pictures/a.png', zip_file.namelist())
+        self.assertEqual(os.listdir(self.temp_dir.name).count('project.zip'),
+                         1)
+        with self.assertRaises(ValueError):
+            with archive.ArchiveFile(
+                    os.path.join(self.temp_dir.name, 'project.rar')):
+                pass
+
+    def test_failed_archive_is_removed(self):
+        """Test the archive is not written if the project fails."""
+        path = os.path.join(self.temp_dir.name, 'project.tar.gz')
+        with self.assertRaises(FileNotFoundError):
+            with archive.ArchiveFile(path) as project:
+                project.add_path(os.path.join(self.assets, 'missing'), 'x')
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['assets'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,127 @@
+"""Testing the extraction of the cited bibliography entries."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from coculatex import bibliography
+
+
+BIBTEX = '''@string{jc = "J. Cryptology"}
+
+@article{alpha,
+  author = {A. Author},
+  title = {{Alpha}},
+  journal = jc,
+}
+
+@inproceedings{beta,
+  author = {B. Author},
+  crossref = {proc},
+}
+
+@proceedings{proc,
+  title = {Proceedings},
+}
+
+@book{gamma,
+  title = {Gamma},
+}
+'''
+
+BIBITEM = '''\\begin{thebibliography}{9}
+\\RBibitem{alpha}
+\\by A. Author
+\\paper Alpha
+
+\\bibitem{beta}
+B. Author, Beta.
+\\end{thebibliography}
+'''
+
+
+class BibliographyTestCase(unittest.TestCase):
+    """Test Case for the module `bibliography`."""
+
+    def setUp(self):
+        """Prepare the bibliography and the project files."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.bib_path = self.write('refs.bib', BIBTEX)
+        self.tex_path = self.write(
+            'main.tex',
+            '\\cite{alpha}\n% \\cite{gamma}\n\\citep[p.~1]{beta, alpha}\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the file and return its path."""
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_find_citations(self):
+        """Test the keys are found and the comments are skipped."""
+        self.assertEqual(bibliography.find_citations([self.tex_path]),
+                         {'alpha', 'beta'})
+        self.assertIsNone(
+            bibliography.find_text_citations(['\\nocite{*}']))
+
+    def test_find_citations_texts(self):
+        """Test the keys of the strings are found with the files ones."""
+        self.assertEqual(
+            bibliography.find_citations([self.tex_path],
+                                        ['\\nocite{gamma}\n']),
+            {'alpha', 'beta', 'gamma'})
+
+    def test_bibtex(self):
+        """Test the cited entries and their crossrefs are extracted."""
+        data = bibliography.extract_cited_entries(
+            self.bib_path, {'alpha', 'beta'}).decode('utf-8')
+        self.assertIn('@string{jc', data)
+        self.assertIn('@article{alpha', data)
+        self.assertIn('@inproceedings{beta', data)
+        self.assertIn('@proceedings{proc', data)
+        self.assertNotIn('gamma', data)
+
+    def test_bibitem(self):
+        """Test the entries of the `\\bibitem` list are extracted."""
+        path = self.write('refs.tex', BIBITEM)
+        data = bibliography.extract_cited_entries(
+            path, {'beta'}).decode('utf-8')
+        self.assertTrue(data.startswith('\\begin{thebibliography}{9}'))
+        self.assertIn('\\bibitem{beta}', data)
+        self.assertIn('\\end{thebibliography}', data)
+        self.assertNotIn('RBibitem', data)
+
+    def test_unchanged_is_not_written(self):
+        """Test the extraction is skipped for the unchanged inputs."""
+        output_path = os.path.join(self.temp_dir.name, 'cited.bib')
+        self.assertTrue(bibliography.write_cited_entries(
+            self.bib_path, output_path, {'alpha'}))
+        with mock.patch('coculatex.bibliography.extract_cited_entries',
+                        side_effect=AssertionError):
+            self.assertFalse(bibliography.write_cited_entries(
+                self.bib_path, output_path, {'alpha'}))
+        self.assertTrue(bibliography.write_cited_entries(
+            self.bib_path, output_path, {'alpha', 'gamma'}))
+        with open(output_path, 'r', encoding='utf-8') as file:
+            self.assertIn('@book{gamma', file.read())
+
+    def test_bibitem_trailer(self):
+        """Test the trailer of the list is not the part of the last item."""
+        path = self.write('refs.tex', BIBITEM + '% the trailer\n')
+        index = bibliography.make_index(path)
+        self.assertEqual(index['entries'][-1][2],
+                         BIBITEM.index('\\end{thebibliography}'))
+        data = bibliography.extract_cited_entries(
+            path, {'alpha'}).decode('utf-8')
+        self.assertNotIn('\\bibitem{beta}', data)
+        self.assertIn('\\paper Alpha', data)
+        self.assertTrue(data.endswith(
+            '\\end{thebibliography}\n% the trailer\n'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
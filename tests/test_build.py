@@ -0,0 +1,155 @@
+"""Testing the compilation of the projects by the stub TeX program."""
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+from coculatex import build
+
+
+STUB_TEX = '''#!{python}
+import os
+import sys
+import time
+source = sys.argv[-1]
+jobname = os.path.splitext(source)[0]
+for option in sys.argv[1:-1]:
+    if option.startswith('-jobname='):
+        jobname = option[len('-jobname='):]
+with open(source) as file:
+    content = file.read()
+if 'SPAWN' in content:
+    # the child like the TeX program started by latexmk
+    import subprocess
+    subprocess.Popen([sys.executable, '-c',
+                      'import time; time.sleep(2); '
+                      'open("late.txt", "w").close()'])
+if 'SLEEP' in content:
+    time.sleep(5)
+print('stub tex', ' '.join(sys.argv[1:]))
+if 'FAIL' in content:
+    sys.exit(1)
+with open(jobname + '.pdf', 'w') as file:
+    file.write(content)
+'''
+
+
+class BuildTestCase(unittest.TestCase):
+    """Test Case for the module `build`."""
+
+    def setUp(self):
+        """Prepare the stub TeX program and the projects."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.program = os.path.join(self.temp_dir.name, 'stubtex')
+        with open(self.program, 'w') as file:
+            file.write(STUB_TEX.format(python=sys.executable))
+        os.chmod(self.program, os.stat(self.program).st_mode | stat.S_IEXEC)
+        self.project = os.path.join(self.temp_dir.name, 'project')
+        os.makedirs(self.project)
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the file of the project."""
+        path = os.path.join(self.project, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_read_magic_and_command(self):
+        """Test the command is made from the magic comments."""
+        root = self.write('paper.tex',
+                          '%!TEX options=-shell-escape\n'
+                          '%!TEX program=xelatex\n'
+                          '%!TEX encoding=utf8\n\n\n'
+                          '\\documentclass{article}\n'
+                          '%!TEX program=ignored\n')
+        magic = build.read_tex_magic(root)
+        self.assertEqual(magic, {'options': '-shell-escape',
+                                 'program': 'xelatex',
+                                 'encoding': 'utf8'})
+        self.assertEqual(build.make_command(root, magic),
+                         ['xelatex', '-interaction=nonstopmode',
+                          '-halt-on-error', '-shell-escape', 'paper.tex'])
+
+    def test_build_skip_unchanged(self):
+        """Test the build and the skipping of unchanged projects."""
+        root = self.write('paper.tex', '%!TEX program=pdflatex\nok\n')
+        self.write('paper.source.tex', '%!TEX root=paper.tex\n')
+        self.assertEqual(build.find_roots(self.project), [root])
+        result = build.build_project(root, program=self.program)
+        self.assertEqual(result.status, 'ok')
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.project, 'paper.pdf')))
+        with open(result.log_path, encoding='utf-8') as file:
+            self.assertIn('stub tex', file.read())
+        result = build.build_project(root, program=self.program)
+        self.assertEqual(result.status, 'skipped')
+        self.write('paper.source.tex', '%!TEX root=paper.tex\nchanged\n')
+        result = build.build_project(root, program=self.program)
+        self.assertEqual(result.status, 'ok')
+
+    def test_build_pool_failures_and_timeout(self):
+        """Test the pool reports the failures and the timeouts."""
+        roots = [self.write('good.tex', '%!TEX program=pdflatex\nok\n'),
+                 self.write('bad.tex', '%!TEX program=pdflatex\nFAIL\n'),
+                 self.write('slow.tex', '%!TEX program=pdflatex\nSLEEP\n')]
+        results = build.build_projects(roots, jobs=3,
+                                       program=self.program, timeout=1)
+        self.assertEqual([result.status for result in results],
+                         ['ok', 'failed', 'timeout'])
+
+    def test_timeout_kills_children(self):
+        """Test the children of the timed out job are killed too."""
+        root = self.write('slow.tex', '%!TEX program=pdflatex\nSPAWN SLEEP\n')
+        result = build.build_project(root, program=self.program, timeout=1)
+        self.assertEqual(result.status, 'timeout')
+        time.sleep(2)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.project, 'late.txt')))
+
+    def test_other_program_skips_format(self):
+        """Test the format of the magic program is not loaded by others."""
+        magic = {'program': 'pdflatex', 'options': '-fmt=/cache/theme -8bit'}
+        root = os.path.join(self.project, 'paper.tex')
+        self.assertEqual(build.make_command(root, magic),
+                         ['pdflatex', '-interaction=nonstopmode',
+                          '-halt-on-error', '-fmt=/cache/theme', '-8bit',
+                          'paper.tex'])
+        self.assertEqual(build.make_command(root, magic, program='xelatex'),
+                         ['xelatex', '-interaction=nonstopmode',
+                          '-halt-on-error', '-8bit', 'paper.tex'])
+
+    def test_shared_directory(self):
+        """Test the projects of the same directory do not share inputs."""
+        root = self.write('paper.tex', '%!TEX program=pdflatex\n'
+                                       '\\usepackage{theme}\n'
+                                       '\\input{body}\n')
+        self.write('theme.sty', '\\RequirePackage[x]{common}\n')
+        self.write('common.sty', '% common\n')
+        self.write('body.tex', '\\includegraphics[width=1cm]{fig/plot}\n')
+        os.makedirs(os.path.join(self.project, 'fig'))
+        self.write(os.path.join('fig', 'plot.pdf'), 'plot')
+        self.write('paper.source.tex', '%!TEX root=paper.tex\n')
+        self.write('letter.tex', '%!TEX program=pdflatex\n\\input{theme}\n')
+        self.write('letter.source.tex', '%!TEX root=letter.tex\n')
+        self.assertEqual(
+            [os.path.relpath(path, self.project)
+             for path in build.project_inputs(root)],
+            ['body.tex', 'common.sty', os.path.join('fig', 'plot.pdf'),
+             'paper.source.tex', 'paper.tex', 'theme.sty'])
+        self.assertEqual(build.build_project(root, program=self.program)
+                         .status, 'ok')
+        self.write('letter.source.tex', '%!TEX root=letter.tex\nchanged\n')
+        self.assertEqual(build.build_project(root, program=self.program)
+                         .status, 'skipped')
+        self.write(os.path.join('fig', 'plot.pdf'), 'changed')
+        self.assertEqual(build.build_project(root, program=self.program)
+                         .status, 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
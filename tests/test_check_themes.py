@@ -0,0 +1,119 @@
+"""Testing the validation of the library of the themes."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from coculatex import validation
+from helpers import (
+    THEMES_PATH,
+    run_coculatex)
+
+
+BROKEN_CONFIG = ('root_file: broken.tex\n'
+                 'include_files:\n'
+                 '  missing.sty: missing.sty\n'
+                 'subthemes:\n'
+                 '  bad: bad.yaml\n'
+                 '  lost: lost\n')
+
+BROKEN_TEMPLATE = ('%%= block_start_string: "<<"\n'
+                   '%%= block_end_string: ">>"\n'
+                   'line\n'
+                   '<< if title >>\n'
+                   '<< include "absent.tex" >>\n')
+
+
+class CheckThemesTestCase(unittest.TestCase):
+    """Test Case for the command `check-themes`."""
+
+    def setUp(self):
+        """Prepare the valid and the broken themes."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.themes_path = os.path.join(self.temp_dir.name, 'themes')
+        shutil.copytree(THEMES_PATH, self.themes_path)
+        self.broken_path = os.path.join(self.themes_path, 'broken')
+        os.makedirs(self.broken_path)
+        self.write('config.yaml', BROKEN_CONFIG)
+        self.write('broken.tex', BROKEN_TEMPLATE)
+        self.write('bad.yaml', 'root_file: [unclosed\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the file of the broken theme."""
+        with open(os.path.join(self.broken_path, name), 'w',
+                  encoding='utf-8') as file:
+            file.write(content)
+
+    def check(self, *themes):
+        """Return the exit code and the JSON output of the command."""
+        process = run_coculatex(
+            ['--cache-path', self.temp_dir.name, 'check-themes', '--json',
+             '-j', '2'] + list(themes),
+            themes_path=self.themes_path, check=False)
+        return process.returncode, json.loads(process.stdout.decode('utf-8'))
+
+    def test_valid_theme(self):
+        """Test the valid theme has no problems."""
+        returncode, output = self.check('dmarticle')
+        self.assertEqual(returncode, 0)
+        self.assertEqual(output['problems'], [])
+
+    def test_problems(self):
+        """Test the problems are reported with their locations."""
+        returncode, output = self.check()
+        self.assertEqual(returncode, 1)
+        self.assertEqual(output['themes'], 2)
+        problems = {(problem['theme'], os.path.basename(problem['path']),
+                     problem['line']): problem['message']
+                    for problem in output['problems']}
+        self.assertIn('the template does not compile',
+                      problems['broken', 'broken.tex', 5])
+        self.assertIn('does not parse', problems['broken.bad', 'bad.yaml', 2])
+        self.assertEqual(problems['broken.lost', 'lost.yaml', None],
+                         'the config is not found')
+        self.assertEqual(problems['broken', 'config.yaml', None],
+                         'the included file `missing.sty` is not found')
+
+    def test_included_template(self):
+        """Test the templates loaded by the root file are checked."""
+        self.write('broken.tex', BROKEN_TEMPLATE.replace(
+            '<< if title >>\n', ''))
+        problems = validation.check_theme(self.themes_path, 'broken')[0]
+        self.assertIn(['broken', os.path.join(self.broken_path, 'broken.tex'),
+                       None, 'the template `absent.tex` is not found'],
+                      problems)
+
+    def test_cached_results(self):
+        """Test the unchanged themes are not checked again."""
+        self.check()
+        _, output = self.check()
+        self.assertEqual(output['cached'], 2)
+        self.write('missing.sty', '% found\n')
+        _, output = self.check()
+        self.assertEqual(output['cached'], 1)
+        self.assertNotIn('the included file `missing.sty` is not found',
+                         [problem['message']
+                          for problem in output['problems']])
+
+    def test_concurrent_results(self):
+        """Test the results stored by the concurrent check are kept."""
+        path = validation.results_path(self.temp_dir.name, self.themes_path)
+        validation.check_themes(self.themes_path, ['dmarticle'], path, 1)
+        load_results = validation._load_results
+        # the other check has read the results before the first one
+        with mock.patch.object(validation, '_load_results',
+                               side_effect=[{}, load_results(
+                                   path, self.themes_path)]):
+            validation.check_themes(self.themes_path, ['broken'], path, 1)
+        self.assertEqual(
+            sorted(load_results(path, self.themes_path)),
+            ['broken', 'dmarticle'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,88 @@
+"""Testing the completion of the command line."""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from coculatex import completion
+from helpers import (
+    THEMES_PATH,
+    environment)
+
+
+class CompletionTestCase(unittest.TestCase):
+    """Test Case for the completion by the name table."""
+
+    def setUp(self):
+        """Prepare the cache directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = self.temp_dir.name
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def complete(self, line, *arguments):
+        """Return the candidates of the last word of `line`."""
+        words = ['coculatex', '-t', THEMES_PATH,
+                 '--cache-path', self.cache_path] + line.split(' ')
+        process = subprocess.run(
+            [sys.executable] + list(arguments)
+            + ['-m', 'coculatex.completion', str(len(words) - 1)] + words,
+            stdout=subprocess.PIPE, env=environment(), check=True)
+        return process.stdout.decode('utf-8').split()
+
+    def test_themes(self):
+        """Test the themes and the subthemes are completed."""
+        self.assertEqual(self.complete('init dm'),
+                         ['dmarticle', 'dmarticle.en', 'dmarticle.ru'])
+        self.assertEqual(self.complete('example dmarticle.r'),
+                         ['dmarticle.ru'])
+        self.assertEqual(self.complete('init --embed x'), [])
+        path = completion.table_path(self.cache_path, THEMES_PATH)
+        self.assertTrue(os.path.isfile(path))
+
+    def test_commands_and_options(self):
+        """Test the commands, the options and the choices are completed."""
+        self.assertIn('apply', self.complete('a'))
+        self.assertEqual(self.complete('queue a'), ['add'])
+        self.assertIn('--sweep', self.complete('apply --sw'))
+        self.assertEqual(self.complete('profile-theme --sort se'), ['self'])
+        self.assertEqual(self.complete('apply --config '), [])
+
+    def test_no_template_imports(self):
+        """Test the completion imports neither jinja2 nor yaml."""
+        self.complete('init dm')
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'coculatex.completion',
+             '5', 'coculatex', '-t', THEMES_PATH,
+             '--cache-path', self.cache_path, 'init', 'dm'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            env=environment(), check=True)
+        modules = {line.split('|')[-1].strip()
+                   for line in process.stderr.decode('utf-8').splitlines()}
+        self.assertNotIn('yaml', modules)
+        self.assertNotIn('jinja2', modules)
+
+    def test_stale_table(self):
+        """Test the table is stale for the other version or the old one."""
+        table = {'version': completion.VERSION,
+                 'themes_mtime': os.stat(THEMES_PATH).st_mtime_ns,
+                 'created': 0}
+        self.assertTrue(completion.is_stale(table, THEMES_PATH))
+        table['created'] = time.time()
+        self.assertFalse(completion.is_stale(table, THEMES_PATH))
+        table['version'] = 'other'
+        self.assertTrue(completion.is_stale(table, THEMES_PATH))
+
+    def test_bash_script(self):
+        """Test the bash script is valid."""
+        process = subprocess.run(['bash', '-n'],
+                                 input=completion.script('bash').encode(),
+                                 check=False)
+        self.assertEqual(process.returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,102 @@
+"""Testing the concurrent applies into the same working directory."""
+import os
+import stat
+import subprocess
+import tempfile
+import unittest
+from coculatex import files
+from helpers import (
+    THEMES_PATH,
+    coculatex_command,
+    environment)
+
+
+class ConcurrentApplyTestCase(unittest.TestCase):
+    """Test Case for the applies sharing the working directory."""
+
+    def setUp(self):
+        """Prepare the projects in the shared directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_path = self.temp_dir.name
+        self.config_paths = []
+        for index in range(4):
+            path = os.path.join(self.project_path,
+                                'paper{}.yaml'.format(index))
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('theme: dmarticle.en\nproject-name: paper{}\n'
+                           'title: Paper {}\n'.format(index, index))
+            self.config_paths.append(path)
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_concurrent_applies(self):
+        """Test the concurrent applies write the complete files."""
+        processes = [subprocess.Popen(
+            coculatex_command(['--no-cache', 'apply', '-c', path]),
+            stdout=subprocess.DEVNULL, env=environment())
+            for path in self.config_paths]
+        for process in processes:
+            self.assertEqual(process.wait(), 0)
+        for index in range(4):
+            with open(os.path.join(self.project_path,
+                                   'paper{}.tex'.format(index)),
+                      encoding='utf-8') as file:
+                content = file.read()
+            self.assertIn('\\title{{Paper {}}}'.format(index), content)
+            self.assertIn('\\end{document}', content)
+        for name in os.listdir(self.project_path):
+            self.assertFalse(name.endswith('.tmp'), name)
+        for name in os.listdir(os.path.join(THEMES_PATH, 'dmarticle')):
+            path = os.path.join(self.project_path, name)
+            if name.endswith('.sty'):
+                with open(os.path.join(THEMES_PATH, 'dmarticle', name),
+                          'rb') as source, open(path, 'rb') as copy:
+                    self.assertEqual(source.read(), copy.read())
+
+
+class AtomicWriteTestCase(unittest.TestCase):
+    """Test Case for the modes of the atomically written files."""
+
+    def setUp(self):
+        """Prepare the temporary directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'file.tex')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_mode_is_kept(self):
+        """Test the replaced file keeps its mode."""
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('old')
+        os.chmod(self.path, 0o640)
+        files.atomic_write(self.path, 'new')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        with open(self.path, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'new')
+
+    def test_new_file_mode(self):
+        """Test the new file gets the mode of the umask."""
+        umask = os.umask(0o022)
+        os.umask(umask)
+        files.atomic_write(self.path, 'new')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode),
+                         0o666 & ~umask)
+
+    def test_atomic_copy(self):
+        """Test the copied file keeps the mode and the time."""
+        source = os.path.join(self.temp_dir.name, 'source.sty')
+        with open(source, 'w', encoding='utf-8') as file:
+            file.write('style')
+        os.chmod(source, 0o604)
+        os.utime(source, (1000, 1000))
+        files.atomic_copy(source, self.path)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o604)
+        self.assertEqual(os.path.getmtime(self.path), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
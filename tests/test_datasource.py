@@ -0,0 +1,76 @@
+"""Testing the lazy data sources of the parameters."""
+import os
+import pickle
+import tempfile
+import unittest
+import jinja2
+from coculatex import datasource
+
+
+class DataSourceTestCase(unittest.TestCase):
+    """Test Case for the module `datasource`."""
+
+    def setUp(self):
+        """Prepare the data files."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.write('results.csv', 'name,score\nAlice,10\nBob,7\n')
+        self.write('authors.jsonl',
+                   '{"name": "Ivan"}\n\n{"name": "Mikhail"}\n')
+        self.write('list.yaml', '- 1\n- 2\n')
+        self.write('docs.yaml', 'a: 1\n---\na: 2\n---\na: 3\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def write(self, name, content):
+        """Write the data file."""
+        with open(os.path.join(self.temp_dir.name, name), 'w',
+                  encoding='utf-8') as file:
+            file.write(content)
+
+    def test_resolve(self):
+        """Test the references are replaced by the sources."""
+        values = datasource.resolve(
+            {'title': 'T',
+             'results': {'data_file': 'results.csv'},
+             'other': {'data_file': 'x', 'title': 'not a reference'}},
+            self.temp_dir.name)
+        self.assertEqual(values['title'], 'T')
+        self.assertIsInstance(values['results'], datasource.DataSource)
+        self.assertEqual(values['results'].path,
+                         os.path.join(self.temp_dir.name, 'results.csv'))
+        self.assertEqual(values['other'],
+                         {'data_file': 'x', 'title': 'not a reference'})
+
+    def test_streaming(self):
+        """Test the items of the formats."""
+        def source(name):
+            return datasource.DataSource(
+                os.path.join(self.temp_dir.name, name))
+        self.assertEqual(list(source('results.csv')),
+                         [{'name': 'Alice', 'score': '10'},
+                          {'name': 'Bob', 'score': '7'}])
+        self.assertEqual([item['name'] for item in source('authors.jsonl')],
+                         ['Ivan', 'Mikhail'])
+        self.assertEqual(list(source('list.yaml')), [1, 2])
+        self.assertEqual(list(source('docs.yaml')),
+                         [{'a': 1}, {'a': 2}, {'a': 3}])
+        self.assertEqual(len(source('docs.yaml')), 3)
+        self.assertEqual(source('list.yaml')[1], 2)
+        restored = pickle.loads(pickle.dumps(source('results.csv')))
+        self.assertEqual(len(restored), 2)
+
+    def test_render(self):
+        """Test the template loops over the source lazily."""
+        values = datasource.resolve({'results': {'data_file': 'results.csv'},
+                                     'unused': {'data_file': 'missing.csv'}},
+                                    self.temp_dir.name)
+        template = jinja2.Environment().from_string(
+            '{% for row in results %}{{ row.name }}={{ row.score }};'
+            '{% endfor %}{{ results|length }}')
+        self.assertEqual(template.render(**values), 'Alice=10;Bob=7;2')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,95 @@
+"""Testing the block `cache` of the templates."""
+import os
+import tempfile
+import unittest
+import jinja2
+from coculatex import (
+    cache,
+    config,
+    templates)
+
+
+TEMPLATE = ('%% cache \'names\', lang:\n'
+            '\\VAR{count()} \\VAR{lang}\n'
+            '%% endcache\n'
+            '\\VAR{title}\n')
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    """Test Case for `templates.FragmentCacheExtension`."""
+
+    def setUp(self):
+        """Prepare the empty caches."""
+        templates._FRAGMENTS.clear()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.calls = 0
+
+    def tearDown(self):
+        """Remove the caches."""
+        templates._FRAGMENTS.clear()
+        cache.set_fragment_cache(None)
+        self.temp_dir.cleanup()
+
+    def count(self):
+        """Count the renderings of the body."""
+        self.calls += 1
+        return self.calls
+
+    def render(self, **variables):
+        """Render the template by the new environment."""
+        environment = jinja2.Environment(
+            **dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG)))
+        return environment.from_string(TEMPLATE).render(count=self.count,
+                                                        **variables)
+
+    def test_memory(self):
+        """Test the body is rendered once for the same arguments."""
+        self.assertEqual(self.render(lang='en', title='A'), '1 en\nA')
+        self.assertEqual(self.render(lang='en', title='B'), '1 en\nB')
+        self.assertEqual(self.render(lang='ru', title='C'), '2 ru\nC')
+        self.assertEqual(self.calls, 2)
+
+    def test_disk(self):
+        """Test the fragments are shared by the cache directory."""
+        cache.set_fragment_cache(cache.FragmentCache(self.temp_dir.name))
+        self.render(lang='en', title='A')
+        templates._FRAGMENTS.clear()
+        self.assertEqual(self.render(lang='en', title='B'), '1 en\nB')
+        self.assertEqual(self.calls, 1)
+
+    def test_changed_body(self):
+        """Test the fragment of the changed body is not reused."""
+        self.render(lang='en', title='A')
+        environment = jinja2.Environment(
+            **dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG)))
+        self.assertEqual(environment.from_string(
+            TEMPLATE.replace('\\VAR{lang}', '\\VAR{lang}!')).render(
+                count=self.count, lang='en', title='A'),
+            '2 en!\nA')
+
+    def test_theme_roots(self):
+        """Test the root templates of the different themes do not share."""
+        outputs = []
+        for theme in ('first', 'second'):
+            environment = jinja2.Environment(
+                loader=templates.TemplateLoader(
+                    os.path.join(self.temp_dir.name, theme)),
+                **dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG)))
+            outputs.append(environment.from_string(TEMPLATE).render(
+                count=self.count, lang='en', title='A'))
+        self.assertEqual(outputs, ['1 en\nA', '2 en\nA'])
+
+    def test_header_extensions(self):
+        """Test the extensions of the header keep the block `cache`."""
+        options = templates.template_options(
+            {'extensions': ['jinja2.ext.do']})
+        self.assertEqual(options['extensions'],
+                         ['coculatex.templates.FragmentCacheExtension',
+                          'jinja2.ext.do'])
+        environment = jinja2.Environment(**options)
+        self.assertEqual(environment.from_string(TEMPLATE).render(
+            count=self.count, lang='en', title='A'), '1 en\nA')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
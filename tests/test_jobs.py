@@ -0,0 +1,83 @@
+"""Testing the queue of the batch jobs."""
+import os
+import tempfile
+import time
+import unittest
+from coculatex import jobs
+from helpers import run_coculatex
+
+
+class JobQueueTestCase(unittest.TestCase):
+    """Test Case for the class `JobQueue`."""
+
+    def setUp(self):
+        """Prepare the empty queue."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.temp_dir.name, 'jobs.sqlite3')
+        self.queue = jobs.JobQueue(self.database)
+
+    def tearDown(self):
+        """Remove the queue."""
+        self.temp_dir.cleanup()
+
+    def test_done_jobs_are_kept(self):
+        """Test the done jobs are not added again."""
+        self.assertEqual(self.queue.add('apply', ['a', 'b']), 2)
+        job = self.queue.claim('worker', 60)
+        self.assertEqual((job.target, job.attempts), ('a', 1))
+        self.assertTrue(self.queue.finish(job, 'worker'))
+        self.assertEqual(self.queue.add('apply', ['a', 'b', 'c']), 1)
+        self.assertEqual(self.queue.progress(),
+                         {'pending': 2, 'running': 0, 'done': 1,
+                          'failed': 0})
+        with self.assertRaises(ValueError):
+            self.queue.add('remove', ['a'])
+
+    def test_retries(self):
+        """Test the failing job is retried up to the maximal attempts."""
+        self.queue.add('build', ['a', 'b'])
+        job = self.queue.claim('worker', 60)
+        self.queue.finish(job, 'worker', 'error', max_attempts=2)
+        # the least attempted job is claimed first
+        self.assertEqual(self.queue.claim('worker', 60).target, 'b')
+        job = self.queue.claim('worker', 60)
+        self.assertEqual((job.target, job.attempts), ('a', 2))
+        self.queue.finish(job, 'worker', 'error', max_attempts=2)
+        self.assertEqual(self.queue.failures(), [('build', 'a', 2, 'error')])
+        self.assertEqual(self.queue.retry(), 1)
+        self.assertEqual(self.queue.claim('worker', 60).attempts, 1)
+
+    def test_expired_lease(self):
+        """Test the job of the dead worker is claimed by the other one."""
+        self.queue.add('apply', ['a'])
+        job = self.queue.claim('dead', 0.01)
+        self.assertIsNone(self.queue.claim('alive', 60))
+        time.sleep(0.02)
+        self.assertEqual(self.queue.claim('alive', 60).target, 'a')
+        self.assertFalse(self.queue.renew(job, 'dead', 60))
+        self.assertFalse(self.queue.finish(job, 'dead'))
+        self.assertEqual(self.queue.progress()['running'], 1)
+
+    def test_worker(self):
+        """Test the worker applies the projects of the queue."""
+        config_path = os.path.join(self.temp_dir.name, 'paper.yaml')
+        with open(config_path, 'w', encoding='utf-8') as file:
+            file.write('theme: dmarticle.en\nproject-name: paper\n')
+        self.queue.add('apply', [config_path])
+        run_coculatex(['--no-cache', 'worker', '--database', self.database])
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.temp_dir.name, 'paper.tex')))
+        self.assertEqual(self.queue.progress()['done'], 1)
+
+    def test_expired_last_attempt(self):
+        """Test the expired job is failed after the last attempt."""
+        self.queue.add('apply', ['a'])
+        self.queue.claim('dead', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.queue.claim('alive', 60, max_attempts=1))
+        self.assertEqual(self.queue.failures(),
+                         [('apply', 'a', 1, 'the lease expired')])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
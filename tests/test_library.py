@@ -0,0 +1,49 @@
+"""Testing the walking over the themes."""
+import unittest
+from coculatex import library
+
+
+CONFIGS = {
+    'config.yaml': {'root_file': 'base.tex',
+                    'parameters': {'title': 'Base', 'lang': 'en'},
+                    'subthemes': {'ru': 'ru', 'lost': 'lost.yaml',
+                                  'wrong': ['ru']}},
+    'ru.yaml': {'parameters': {'lang': 'ru'}, 'root_file': 'ru.tex'},
+}
+
+
+class LibraryTestCase(unittest.TestCase):
+    """Test Case for the module `library`."""
+
+    def test_walk_theme(self):
+        """Test the subthemes are merged with the theme."""
+        loaded = []
+        reported = []
+
+        def load(name, config_file):
+            loaded.append((name, config_file))
+            return CONFIGS.get(config_file)
+
+        walked = list(library.walk_theme(
+            'article', load,
+            lambda *problem: reported.append(problem)))
+        self.assertEqual([name for name, _, _ in walked],
+                         ['article', 'article.ru'])
+        self.assertEqual(walked[1][1:], (
+            'ru.yaml',
+            {'root_file': 'ru.tex',
+             'parameters': {'title': 'Base', 'lang': 'ru'},
+             'subthemes': CONFIGS['config.yaml']['subthemes']}))
+        self.assertIn(('article.lost', 'lost.yaml'), loaded)
+        self.assertEqual(reported, [('article.wrong', 'config.yaml',
+                                     'the config of the subtheme is not '
+                                     'a path')])
+
+    def test_missing_theme(self):
+        """Test the theme without the config has no entries."""
+        self.assertEqual(list(library.walk_theme(
+            'article', lambda name, config_file: None)), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
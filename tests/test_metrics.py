@@ -0,0 +1,71 @@
+"""Testing the metrics registry."""
+import unittest
+from coculatex.metrics import Registry
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Test Case for the class `Registry`."""
+
+    def setUp(self):
+        """Prepare the registry with metrics."""
+        self.registry = Registry()
+        self.counter = self.registry.counter(
+            'test_requests_total', 'Requests.', ('cache', 'result'))
+        self.histogram = self.registry.histogram(
+            'test_seconds', 'Latency.', buckets=(0.1, 1.0))
+
+    def test_disabled(self):
+        """Test the disabled registry collects nothing."""
+        self.counter.inc(cache='render', result='hit')
+        self.histogram.observe(0.5)
+        with self.histogram.time():
+            pass
+        self.assertEqual(self.registry.as_dict(),
+                         {'test_requests_total': [], 'test_seconds': []})
+
+    def test_prometheus_exposition(self):
+        """Test the Prometheus text format."""
+        self.registry.enabled = True
+        self.counter.inc(cache='render', result='hit')
+        self.counter.inc(2, cache='render', result='hit')
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+        self.histogram.observe(5)
+        self.assertEqual(
+            self.registry.to_prometheus(),
+            '# HELP test_requests_total Requests.\n'
+            '# TYPE test_requests_total counter\n'
+            'test_requests_total{cache="render",result="hit"} 3\n'
+            '# HELP test_seconds Latency.\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{le="0.1"} 1\n'
+            'test_seconds_bucket{le="1"} 2\n'
+            'test_seconds_bucket{le="+Inf"} 3\n'
+            'test_seconds_sum 5.55\n'
+            'test_seconds_count 3\n')
+
+    def test_merge_snapshot(self):
+        """Test the snapshot of the other registry is added."""
+        self.registry.enabled = True
+        other = Registry(enabled=True)
+        other_counter = other.counter(
+            'test_requests_total', 'Requests.', ('cache', 'result'))
+        other_histogram = other.histogram(
+            'test_seconds', 'Latency.', buckets=(0.1, 1.0))
+        self.counter.inc(cache='render', result='hit')
+        other_counter.inc(2, cache='render', result='hit')
+        other_counter.inc(cache='yaml', result='miss')
+        self.histogram.observe(0.05)
+        other_histogram.observe(0.5)
+        self.registry.merge(other.snapshot())
+        self.assertEqual(self.registry.as_dict(), {
+            'test_requests_total': [
+                {'cache': 'render', 'result': 'hit', 'value': 3},
+                {'cache': 'yaml', 'result': 'miss', 'value': 1}],
+            'test_seconds': [
+                {'count': 2, 'sum': 0.55,
+                 'buckets': {'0.1': 1, '1': 1, '+Inf': 0}}]})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
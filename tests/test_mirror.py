@@ -0,0 +1,85 @@
+"""Testing the local mirror of the themes."""
+import os
+import shutil
+import tempfile
+import unittest
+from coculatex import mirror
+from helpers import (
+    THEMES_PATH,
+    run_coculatex)
+
+
+class ThemesMirrorTestCase(unittest.TestCase):
+    """Test Case for the read-through mirror of the themes."""
+
+    def setUp(self):
+        """Prepare the origin themes, the mirror and the project."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.themes_path = os.path.join(self.temp_dir.name, 'themes')
+        shutil.copytree(THEMES_PATH, self.themes_path)
+        self.mirror_path = os.path.join(self.temp_dir.name, 'mirror')
+        self.project_path = os.path.join(self.temp_dir.name, 'project')
+        os.makedirs(self.project_path)
+        self.config_path = os.path.join(self.project_path, 'paper.yaml')
+        with open(self.config_path, 'w', encoding='utf-8') as file:
+            file.write('theme: dmarticle.en\nproject-name: paper\n'
+                       'title: Mirrored\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def run_mirrored(self, *arguments):
+        """Run the program with the mirror and return its stdout."""
+        process = run_coculatex(
+            ['--no-cache', '--mirror-path', self.mirror_path]
+            + list(arguments), themes_path=self.themes_path)
+        return process.stdout.decode('utf-8')
+
+    def origin_file(self, name):
+        """Return the path of the file of the origin theme."""
+        return os.path.join(self.themes_path, 'dmarticle', name)
+
+    def test_read_through(self):
+        """Test the theme is served from the mirror until revalidated."""
+        self.run_mirrored('apply', '-c', self.config_path)
+        themes_mirror = mirror.ThemesMirror(self.themes_path,
+                                            self.mirror_path, 300)
+        self.assertEqual(themes_mirror.themes(), ['dmarticle'])
+        self.assertTrue(os.path.isfile(os.path.join(
+            themes_mirror.path, 'dmarticle', 'amsbib.sty')))
+        with open(self.origin_file('amsbib.sty'), 'a',
+                  encoding='utf-8') as file:
+            file.write('% changed\n')
+        self.run_mirrored('apply', '-c', self.config_path)
+        with open(os.path.join(self.project_path, 'amsbib.sty'),
+                  encoding='utf-8') as file:
+            self.assertNotIn('% changed', file.read())
+        self.assertIn('dmarticle: 1 files are copied',
+                      self.run_mirrored('mirror', 'sync', 'dmarticle'))
+        self.run_mirrored('apply', '-c', self.config_path)
+        with open(os.path.join(self.project_path, 'amsbib.sty'),
+                  encoding='utf-8') as file:
+            self.assertIn('% changed', file.read())
+
+    def test_revalidation(self):
+        """Test the expired mirror copies the changes and removals."""
+        themes_mirror = mirror.ThemesMirror(self.themes_path,
+                                            self.mirror_path, 0)
+        local = themes_mirror.theme_directory('dmarticle')
+        self.assertTrue(local.startswith(themes_mirror.path))
+        os.remove(self.origin_file('README.txt'))
+        with open(self.origin_file('en.tex'), 'a', encoding='utf-8') as file:
+            file.write('% changed\n')
+        self.assertEqual(themes_mirror.sync_theme('dmarticle'), 1)
+        self.assertFalse(os.path.exists(os.path.join(local, 'README.txt')))
+        self.assertEqual(themes_mirror.theme_directory('missing'),
+                         os.path.join(themes_mirror.origin, 'missing'))
+        status = self.run_mirrored('mirror', 'status')
+        self.assertIn('dmarticle\n', status)
+        self.assertIn('(stale)', self.run_mirrored(
+            '--mirror-interval', '0', 'mirror', 'status'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
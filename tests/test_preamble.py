@@ -0,0 +1,117 @@
+"""Testing the precompiled preambles by the stub TeX program."""
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from coculatex import (
+    files,
+    preamble)
+
+
+STUB_TEX = '''#!{python}
+import os
+import sys
+jobname = [option for option in sys.argv
+           if option.startswith('-jobname=')][0][len('-jobname='):]
+assert '-ini' in sys.argv and sys.argv[-2] == '&stubtex'
+with open(sys.argv[-1]) as file:
+    content = file.read()
+assert content.rstrip().endswith('\\\\dump')
+with open(os.path.join({calls!r}), 'a') as file:
+    file.write(jobname + '\\n')
+with open(jobname + '.fmt', 'w') as file:
+    file.write(content)
+'''
+
+
+class PreambleTestCase(unittest.TestCase):
+    """Test Case for the module `preamble`."""
+
+    def setUp(self):
+        """Prepare the stub TeX program and the theme."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.calls = os.path.join(self.temp_dir.name, 'calls')
+        self.program = os.path.join(self.temp_dir.name, 'stubtex')
+        with open(self.program, 'w') as file:
+            file.write(STUB_TEX.format(python=sys.executable,
+                                       calls=self.calls))
+        os.chmod(self.program, os.stat(self.program).st_mode | stat.S_IEXEC)
+        self.theme_path = os.path.join(self.temp_dir.name, 'dmarticle')
+        os.makedirs(self.theme_path)
+        with open(os.path.join(self.theme_path, 'ru.tex'), 'w') as file:
+            file.write('theme')
+        self.cache = preamble.FormatCache(
+            os.path.join(self.temp_dir.name, 'formats'))
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_split_preamble(self):
+        """Test the splitting of the document."""
+        document = ('\\documentclass{article}\n\\usepackage{amsmath}\n'
+                    '\\begin{document}\nText\n\\end{document}\n')
+        head, body = preamble.split_preamble(document)
+        self.assertEqual(head, '\\documentclass{article}\n'
+                               '\\usepackage{amsmath}\n')
+        self.assertEqual(body, '\\begin{document}\nText\n\\end{document}\n')
+        self.assertIsNone(preamble.split_preamble('Text'))
+        self.assertEqual(
+            preamble.make_body('paper.preamble.tex', body),
+            '\\ifdefined\\coculatexpreamble\\else'
+            '\\input{paper.preamble.tex}\\fi\n' + body)
+
+    def test_split_static(self):
+        """Test the per-project part of the preamble is split off."""
+        head = ('\\documentclass{article}\n'
+                '%!COCULATEX static-preamble-end\n'
+                '\\usepackage{project}\n')
+        self.assertEqual(preamble.split_static(head),
+                         ('\\documentclass{article}\n',
+                          '\\usepackage{project}\n'))
+        self.assertEqual(preamble.split_static('\\relax\n'),
+                         ('\\relax\n', ''))
+
+    def test_format_is_shared(self):
+        """Test the format is built once for the same preamble."""
+        head = '\\documentclass{article}\n'
+        first = self.cache.get_format(self.theme_path, 'ru.tex',
+                                      self.program, head)
+        second = self.cache.get_format(self.theme_path, 'ru.tex',
+                                       self.program, head)
+        self.assertEqual(first, second)
+        self.assertTrue(os.path.basename(first).startswith('dmarticle-ru-'))
+        self.assertTrue(os.path.isfile(first + '.fmt'))
+        other = self.cache.get_format(self.theme_path, 'ru.tex',
+                                      self.program, head + '%\n')
+        self.assertNotEqual(first, other)
+        with open(self.calls) as file:
+            self.assertEqual(len(file.readlines()), 2)
+
+    def test_failed_build(self):
+        """Test the failure of the build gives None."""
+        self.assertIsNone(self.cache.get_format(
+            self.theme_path, 'ru.tex', '/bin/false', 'preamble'))
+
+    def test_prune(self):
+        """Test the formats are evicted with their logs, not the locks."""
+        path = self.cache.get_format(self.theme_path, 'ru.tex',
+                                     self.program, '\\relax\n')
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        self.assertTrue(os.path.isfile(path + '.log'))
+        self.assertEqual(self.cache.prune(max_size=0), 1)
+        self.assertFalse(os.path.exists(path + '.fmt'))
+        self.assertFalse(os.path.exists(path + '.log'))
+        self.assertTrue(os.path.exists(files.lock_path(path)))
+        self.assertEqual(os.listdir(os.path.dirname(path)), [])
+
+    def test_strip_static_end(self):
+        """Test the end of the static part is not left in the outputs."""
+        self.assertEqual(preamble.strip_static_end(
+            '\\relax\n%!COCULATEX static-preamble-end\n\\begin{document}\n'),
+            '\\relax\n\\begin{document}\n')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,99 @@
+"""Testing the profiler of the theme templates."""
+import io
+import os
+import unittest
+import jinja2
+from coculatex import (
+    config,
+    profiler)
+from helpers import THEME_PATH
+
+
+TEMPLATES = {
+    'root.tex': ('\\BLOCK{macro name(x)}[\\VAR{x}]\\BLOCK{endmacro}\n'
+                 '%% for author in authors:\n'
+                 '\\VAR{name(author)}\n'
+                 '%% endfor\n'
+                 '%% if authors:\n'
+                 '%% set count = authors|length\n'
+                 '%% endif\n'
+                 '\\VAR{count}\n'
+                 '%% include "part.tex"\n'),
+    'part.tex': '%% if count > 1:\nmany\n%% endif\n',
+}
+
+
+class ProfilerTestCase(unittest.TestCase):
+    """Test Case for the module `profiler`."""
+
+    def render(self, environment):
+        """Render the root template by the `environment`."""
+        return environment.get_template('root.tex').render(
+            authors=['Alpha', 'Beta'])
+
+    def make_environment(self):
+        """Return the profiling environment and its profile."""
+        profile = profiler.Profile()
+        return profiler.ProfilingEnvironment(
+            profile, loader=jinja2.DictLoader(TEMPLATES),
+            **dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG))
+        ), profile
+
+    def test_output_is_unchanged(self):
+        """Test the instrumented templates render the same output."""
+        environment, _ = self.make_environment()
+        self.assertEqual(
+            self.render(environment),
+            self.render(jinja2.Environment(
+                loader=jinja2.DictLoader(TEMPLATES),
+                **dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG)))))
+
+    def test_statistics(self):
+        """Test the parts are counted with their output sizes."""
+        environment, profile = self.make_environment()
+        for _ in range(3):
+            self.render(environment)
+        rows = {row.label: row for row in profile.rows('label')}
+        self.assertEqual(sorted(rows),
+                         ['for:author@root.tex:2',
+                          'if@part.tex:1',
+                          'include:part.tex@root.tex:9',
+                          'macro:name@root.tex:1'])
+        self.assertEqual(rows['macro:name@root.tex:1'].calls, 6)
+        self.assertEqual(rows['macro:name@root.tex:1'].bytes, 3 * 13)
+        self.assertEqual(rows['include:part.tex@root.tex:9'].bytes, 3 * 5)
+        self.assertEqual([row.label for row in profile.rows('calls')][0],
+                         'macro:name@root.tex:1')
+
+    def test_folded_stacks(self):
+        """Test the nested parts are written as the folded stacks."""
+        environment, profile = self.make_environment()
+        self.render(environment)
+        output = io.StringIO()
+        profile.write_folded(output)
+        stacks = [line.rsplit(' ', 1)[0]
+                  for line in output.getvalue().splitlines()]
+        self.assertIn('for:author@root.tex:2;macro:name@root.tex:1', stacks)
+        self.assertIn('include:part.tex@root.tex:9;if@part.tex:1', stacks)
+
+    def test_theme(self):
+        """Test the example theme renders the same output."""
+        with open(os.path.join(THEME_PATH, 'en.tex'),
+                  encoding='utf-8') as file:
+            content = ''.join(line for line in file
+                              if not line.startswith(
+                                  config.YAML_LINE_PREFIX))
+        options = dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG))
+        variables = {'title': 'Title', 'authors': [{'name': 'A'}]}
+        expected = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(THEME_PATH),
+            **options).from_string(content).render(**variables)
+        environment = profiler.ProfilingEnvironment(
+            profiler.Profile(), loader=jinja2.FileSystemLoader(THEME_PATH),
+            **options)
+        self.assertEqual(
+            environment.from_string(content).render(**variables), expected)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
@@ -0,0 +1,119 @@
+"""Testing the on-disk render cache."""
+import os
+import tempfile
+import time
+import unittest
+from coculatex import (
+    config,
+    templates)
+from coculatex.cache import RenderCache
+from helpers import THEME_PATH
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    """Test Case for the class `RenderCache`."""
+
+    def setUp(self):
+        """Prepare the theme and the cache directories."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.theme_path = os.path.join(self.temp_dir.name, 'theme')
+        os.makedirs(self.theme_path)
+        self.root_path = os.path.join(self.theme_path, 'root.tex')
+        with open(self.root_path, 'w', encoding='utf-8') as file:
+            file.write(r'\VAR{title}')
+        self.cache = RenderCache(os.path.join(self.temp_dir.name, 'cache'))
+        self.jinja2_config = {'trim_blocks': True}
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_key_depends_on_inputs(self):
+        """Test the key changes with variables and the root template."""
+        key = self.cache.make_key(self.root_path, self.jinja2_config,
+                                  {'title': 'A', 'list': [1, 2]})
+        self.assertEqual(key, self.cache.make_key(
+            self.root_path, self.jinja2_config,
+            {'list': [1, 2], 'title': 'A'}))
+        self.assertNotEqual(key, self.cache.make_key(
+            self.root_path, self.jinja2_config, {'title': 'B'}))
+        self.assertNotEqual(key, self.cache.make_key(
+            self.root_path, {'trim_blocks': False},
+            {'title': 'A', 'list': [1, 2]}))
+        with open(self.root_path, 'w', encoding='utf-8') as file:
+            file.write(r'\VAR{title}!')
+        self.assertNotEqual(key, self.cache.make_key(
+            self.root_path, self.jinja2_config,
+            {'title': 'A', 'list': [1, 2]}))
+
+    def test_get_put(self):
+        """Test storing and loading of the entries."""
+        key = self.cache.make_key(self.root_path, self.jinja2_config, {})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, 'Привет')
+        self.assertEqual(self.cache.get(key), 'Привет')
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+    def test_changed_dependency(self):
+        """Test the entry is invalid if the loaded template changed."""
+        base_path = os.path.join(self.theme_path, 'base.tex')
+        with open(base_path, 'w', encoding='utf-8') as file:
+            file.write('base')
+        key = self.cache.make_key(self.root_path, self.jinja2_config, {})
+        self.cache.put(key, 'data', [base_path])
+        self.assertEqual(self.cache.get(key), 'data')
+        with open(base_path, 'w', encoding='utf-8') as file:
+            file.write('changed base')
+        self.assertIsNone(self.cache.get(key))
+
+    def test_prune(self):
+        """Test the eviction by the age and by the size."""
+        old_time = time.time() - 1000
+        for index in range(4):
+            key = '{:064x}'.format(index)
+            self.cache.put(key, 'x' * 10)
+            os.utime(self.cache._entry_path(key),
+                     (old_time + index, old_time + index))
+        entry_size = self.cache.stats()['size'] // 4
+        self.assertEqual(self.cache.prune(max_size=entry_size * 5 // 2,
+                                          max_age=10000), 2)
+        self.assertIsNone(self.cache.get('{:064x}'.format(0)))
+        self.assertIsNotNone(self.cache.get('{:064x}'.format(3)))
+        self.assertEqual(self.cache.prune(max_size=1000, max_age=100), 1)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+    def test_referenced_variables(self):
+        """Test the variables of the extended templates are found."""
+        root_path = os.path.join(THEME_PATH, 'en.tex')
+        with open(root_path, encoding='utf-8') as file:
+            _, content = templates.extract_variables(file)
+        names, dependencies = templates.referenced_variables(
+            root_path, content,
+            dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG)))
+        self.assertTrue({'title', 'authors', 'tex_main'} <= names)
+        self.assertNotIn('author', names)
+        self.assertEqual(dependencies,
+                         {os.path.join(THEME_PATH, 'base.tex')})
+
+    def test_dynamic_template_name(self):
+        """Test the variables are unknown for the dynamic template names."""
+        names, _ = templates.referenced_variables(
+            self.root_path, r'\BLOCK{include name}', {
+                'block_start_string': r'\BLOCK{',
+                'block_end_string': '}'})
+        self.assertIsNone(names)
+
+    def test_usage_entry(self):
+        """Test the names are cached until the template changes."""
+        key = self.cache.make_usage_key(self.root_path, self.jinja2_config)
+        self.cache.put(key, ['title'], [self.root_path])
+        self.assertEqual(self.cache.get(key), ['title'])
+        self.assertNotEqual(key, self.cache.make_key(
+            self.root_path, self.jinja2_config, {}))
+        with open(self.root_path, 'w', encoding='utf-8') as file:
+            file.write(r'\VAR{title}\VAR{name}')
+        self.assertIsNone(self.cache.get(key))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
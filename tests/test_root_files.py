@@ -0,0 +1,73 @@
+"""Testing the themes with several root files."""
+import os
+import shutil
+import tempfile
+import unittest
+from helpers import (
+    THEMES_PATH,
+    run_coculatex)
+
+
+SLIDES = ('%% extends "base.tex"\n'
+          '\\BLOCK{block title}\\title{Slides: \\VAR{title}}'
+          '\\BLOCK{endblock}\n')
+
+
+class RootFilesTestCase(unittest.TestCase):
+    """Test Case for the additional root files of the theme."""
+
+    def setUp(self):
+        """Prepare the theme with the slides and the project."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.themes_path = os.path.join(self.temp_dir.name, 'themes')
+        shutil.copytree(THEMES_PATH, self.themes_path)
+        theme_path = os.path.join(self.themes_path, 'dmarticle')
+        with open(os.path.join(theme_path, 'slides.tex'), 'w',
+                  encoding='utf-8') as file:
+            file.write(SLIDES)
+        with open(os.path.join(theme_path, 'en.yaml'), 'a',
+                  encoding='utf-8') as file:
+            file.write("root_files:\n"
+                       "  '{project-name}.slides.tex': 'slides.tex'\n")
+        self.project_path = os.path.join(self.temp_dir.name, 'project')
+        os.makedirs(self.project_path)
+        self.config_path = os.path.join(self.project_path, 'paper.yaml')
+        with open(self.config_path, 'w', encoding='utf-8') as file:
+            file.write('theme: dmarticle.en\nproject-name: paper\n'
+                       'title: Roots\n')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def apply(self):
+        """Run the action `apply` for the project."""
+        run_coculatex(['--no-cache', 'apply', '-c', self.config_path],
+                      themes_path=self.themes_path)
+
+    def read(self, name):
+        """Return the content of the file of the project."""
+        with open(os.path.join(self.project_path, name),
+                  encoding='utf-8') as file:
+            return file.read()
+
+    def test_all_roots(self):
+        """Test all the root files are rendered from the same values."""
+        self.apply()
+        self.assertIn('\\title{Roots}', self.read('paper.tex'))
+        slides = self.read('paper.slides.tex')
+        self.assertTrue(slides.startswith('%!TEX options=-shell-escape\n'))
+        self.assertIn('\\title{Slides: Roots}', slides)
+        self.assertIn('\\input{paper.source.tex}', slides)
+
+    def test_unchanged_is_not_written(self):
+        """Test the unchanged root files keep their modification time."""
+        self.apply()
+        path = os.path.join(self.project_path, 'paper.slides.tex')
+        os.utime(path, (1000, 1000))
+        self.apply()
+        self.assertEqual(os.path.getmtime(path), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
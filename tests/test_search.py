@@ -0,0 +1,99 @@
+"""Testing the full-text search over the themes."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from coculatex import search
+from helpers import (
+    THEMES_PATH,
+    run_coculatex)
+
+
+MEMO_CONFIG = ('description: A memo for the office\n'
+               'root_file: memo.tex\n'
+               'parameters:\n'
+               '  recipient: nobody\n')
+
+
+class SearchIndexTestCase(unittest.TestCase):
+    """Test Case for the inverted index of the themes."""
+
+    def setUp(self):
+        """Prepare the themes and the path of the index."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.themes_path = os.path.join(self.temp_dir.name, 'themes')
+        shutil.copytree(THEMES_PATH, self.themes_path)
+        self.memo_path = os.path.join(self.themes_path, 'memo')
+        os.makedirs(self.memo_path)
+        with open(os.path.join(self.memo_path, 'config.yaml'), 'w',
+                  encoding='utf-8') as file:
+            file.write(MEMO_CONFIG)
+        with open(os.path.join(self.memo_path, 'memo.tex'), 'w',
+                  encoding='utf-8') as file:
+            file.write('\\documentclass{letter}\\VAR{recipient}\n')
+        self.index_path = os.path.join(self.temp_dir.name, 'index.json')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def make_index(self):
+        """Return the loaded and updated index."""
+        index = search.SearchIndex(self.themes_path, self.index_path)
+        index.load()
+        if index.update():
+            index.save()
+        return index
+
+    def names(self, index, *terms):
+        """Return the names of the results of `terms`."""
+        return [result.name for result in index.search(terms)]
+
+    def test_fields(self):
+        """Test the names, descriptions, parameters and roots are found."""
+        index = self.make_index()
+        self.assertEqual(self.names(index, 'memo'), ['memo'])
+        self.assertEqual(self.names(index, 'office'), ['memo'])
+        self.assertEqual(self.names(index, 'recipient'), ['memo'])
+        self.assertEqual(self.names(index, 'letter'), ['memo'])
+        self.assertIn('dmarticle.ru', self.names(index, 'ru'))
+        self.assertEqual(self.names(index, 'absent'), [])
+
+    def test_ranking(self):
+        """Test the name outweighs the root file content."""
+        with open(os.path.join(self.memo_path, 'memo.tex'), 'a',
+                  encoding='utf-8') as file:
+            file.write('dmarticle\n')
+        names = self.names(self.make_index(), 'dmarticle')
+        self.assertEqual(names[-1], 'memo')
+
+    def test_incremental_update(self):
+        """Test only the changed themes are indexed again."""
+        self.make_index()
+        index = search.SearchIndex(self.themes_path, self.index_path)
+        index.load()
+        self.assertFalse(index.update())
+        with open(os.path.join(self.memo_path, 'memo.tex'), 'a',
+                  encoding='utf-8') as file:
+            file.write('\\signature{postscriptum}\n')
+        os.utime(os.path.join(self.memo_path, 'memo.tex'), (1, 1))
+        self.assertTrue(index.update())
+        self.assertEqual(self.names(index, 'postscriptum'), ['memo'])
+        shutil.rmtree(self.memo_path)
+        self.assertTrue(index.update())
+        self.assertEqual(self.names(index, 'memo'), [])
+
+    def test_json_output(self):
+        """Test the command prints the results as JSON."""
+        process = run_coculatex(
+            ['--cache-path', self.temp_dir.name, 'search', '--json',
+             'office'], themes_path=self.themes_path)
+        results = json.loads(process.stdout.decode('utf-8'))
+        self.assertEqual([result['name'] for result in results], ['memo'])
+        self.assertEqual(results[0]['description'], 'A memo for the office')
+        self.assertEqual(results[0]['terms'], ['office'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
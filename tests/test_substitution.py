@@ -0,0 +1,75 @@
+"""Testing the rendering of the substitution-only templates."""
+import unittest
+import jinja2
+from coculatex import (
+    config,
+    templates)
+
+
+OPTIONS = dict(config.config_iter(config.JINJA2_DEFAULT_CONFIG))
+
+VARIABLES = {'title': 'Memo', 'count': 3, 'empty': None}
+
+SUBSTITUTIONS = (
+    '',
+    '\n',
+    'plain text\n\n',
+    '\\title{\\VAR{title}}\n',
+    '\\VAR{ title }-\\VAR{count}-\\VAR{empty}-\\VAR{missing}',
+    '{\\VAR{\n  title\n}}}\n',
+)
+
+JINJA2_ONLY = (
+    '\\BLOCK{if title}\\VAR{title}\\BLOCK{endif}',
+    '%% if title\n\\VAR{title}\n%% endif\n',
+    '\\#{comment}\\VAR{title}',
+    '\\VAR{title}%# comment\n',
+    '\\VAR{title|upper}',
+    '\\VAR{-title}',
+    '\\VAR{true}',
+    '\\VAR{range}',
+    'line\r\n\\VAR{title}',
+)
+
+
+class SubstitutionTemplateTestCase(unittest.TestCase):
+    """Test Case for the templates rendered without Jinja2."""
+
+    def render_jinja2(self, content, options=OPTIONS):
+        """Return `content` rendered by Jinja2."""
+        return jinja2.Environment(**options).from_string(content).render(
+            **VARIABLES)
+
+    def test_same_output(self):
+        """Test the output is the same as the output of Jinja2."""
+        for content in SUBSTITUTIONS:
+            with self.subTest(content=content):
+                template = templates.SubstitutionTemplate.compile(content,
+                                                                  OPTIONS)
+                self.assertIsNotNone(template)
+                self.assertEqual(template.render(VARIABLES),
+                                 self.render_jinja2(content))
+
+    def test_fallback(self):
+        """Test the templates with anything else need Jinja2."""
+        for content in JINJA2_ONLY:
+            with self.subTest(content=content):
+                self.assertIsNone(templates.SubstitutionTemplate.compile(
+                    content, OPTIONS))
+        options = dict(OPTIONS, autoescape=True)
+        self.assertIsNone(templates.SubstitutionTemplate.compile(
+            '\\VAR{title}', options))
+
+    def test_configured_delimiters(self):
+        """Test the delimiters are taken from the options."""
+        options = dict(OPTIONS, variable_start_string='<<',
+                       variable_end_string='>>')
+        template = templates.SubstitutionTemplate.compile('<<title>> \\VAR{',
+                                                          options)
+        self.assertEqual(template.names, ('title',))
+        self.assertEqual(template.render(VARIABLES),
+                         self.render_jinja2('<<title>> \\VAR{', options))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)
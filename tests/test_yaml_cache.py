@@ -0,0 +1,61 @@
+"""Testing the cache of the parsed YAML data."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+import yaml
+from coculatex.cache import YamlCache
+
+
+class YamlCacheTestCase(unittest.TestCase):
+    """Test Case for the class `YamlCache`."""
+
+    def setUp(self):
+        """Prepare the config file and the cache directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, 'config.yaml')
+        with open(self.config_path, 'w', encoding='utf-8') as file:
+            file.write('version: 2.0\nparameters:\n  title: Title\n')
+        self.cache_path = os.path.join(self.temp_dir.name, 'cache')
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+
+    def test_file_is_parsed_once(self):
+        """Test the unchanged file is not parsed again."""
+        values = {'version': 2.0, 'parameters': {'title': 'Title'}}
+        first = YamlCache(self.cache_path)
+        self.assertEqual(first.load_file(self.config_path, yaml.SafeLoader),
+                         values)
+        with mock.patch('yaml.load', side_effect=AssertionError):
+            second = YamlCache(self.cache_path)
+            loaded = second.load_file(self.config_path, yaml.SafeLoader)
+            self.assertEqual(loaded, values)
+            loaded['parameters'].pop('title')
+            self.assertEqual(
+                second.load_file(self.config_path, yaml.SafeLoader), values)
+
+    def test_changed_file_is_parsed(self):
+        """Test the changed file is parsed again."""
+        yaml_cache = YamlCache(self.cache_path)
+        yaml_cache.load_file(self.config_path, yaml.SafeLoader)
+        with open(self.config_path, 'w', encoding='utf-8') as file:
+            file.write('version: 3.0\n')
+        os.utime(self.config_path, ns=(0, 0))
+        self.assertEqual(yaml_cache.load_file(self.config_path,
+                                              yaml.SafeLoader),
+                         {'version': 3.0})
+
+    def test_string(self):
+        """Test the strings are keyed by their content."""
+        yaml_cache = YamlCache(self.cache_path)
+        self.assertEqual(yaml_cache.load_string('a: 1', yaml.SafeLoader),
+                         {'a': 1})
+        self.assertEqual(yaml_cache.load_string('a: 2', yaml.SafeLoader),
+                         {'a': 2})
+        self.assertEqual(yaml_cache.stats()['entries'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=0)